@@ -1,6 +1,8 @@
 """Support for bundles of related tasks."""
 
 import secrets
+import time
+from contextlib import nullcontext
 
 from pydantic import BaseModel
 
@@ -8,10 +10,14 @@ from hipercow import ui
 from hipercow.root import OptionalRoot, open_root
 from hipercow.task import (
     TaskStatus,
+    TaskTimes,
     check_task_exists,
     check_task_id,
-    task_status,
+    task_cancel_many,
+    task_status_many,
+    task_times_many,
 )
+from hipercow.util import percentile, tabulate
 
 
 class Bundle(BaseModel):
@@ -141,7 +147,9 @@ def bundle_delete(name: str, root: OptionalRoot = None) -> None:
     ui.alert_success("Deleted bundle '{name}'")
 
 
-def bundle_status(name: str, root: OptionalRoot = None) -> list[TaskStatus]:
+def bundle_status(
+    name: str, root: OptionalRoot = None, *, workers: int | None = None
+) -> list[TaskStatus]:
     """Get the statuses of tasks in a bundle.
 
     Depending on the context, `bundle_status_reduce()` may be more
@@ -151,27 +159,330 @@ def bundle_status(name: str, root: OptionalRoot = None) -> list[TaskStatus]:
     Args:
         name: The name of the bundle to get the statuses for.
         root: The root, or if not given search from the current directory.
+        workers: The maximum number of threads used to read statuses;
+            see `hipercow.task.task_status_many` for details.
 
     Returns:
         A list of statuses, one per task.  These are stored in
         the same order as the original bundle.
 
     """
+    root = open_root(root)
     bundle = bundle_load(name, root=root)
-    return [task_status(i, root=root) for i in bundle.task_ids]
+    return task_status_many(bundle.task_ids, root, workers=workers)
 
 
-def bundle_status_reduce(name: str, root: OptionalRoot = None) -> TaskStatus:
+def bundle_status_reduce(
+    name: str, root: OptionalRoot = None, *, workers: int | None = None
+) -> TaskStatus:
     """Get the overall status from a bundle.
 
     Args:
         name: The name of the bundle to get the statuses for.
         root: The root, or if not given search from the current directory.
+        workers: The maximum number of threads used to read statuses;
+            see `hipercow.task.task_status_many` for details.
 
     Returns:
         The overall bundle status.
     """
-    return _status_reduce(bundle_status(name, root))
+    return _status_reduce(bundle_status(name, root, workers=workers))
+
+
+def bundle_cancel(name: str, root: OptionalRoot = None) -> list[bool]:
+    """Cancel the tasks in a bundle.
+
+    Tasks are cancelled together, as with
+    `hipercow.task.task_cancel_many`; only tasks that are `SUBMITTED`
+    or `RUNNING` will be cancelled.
+
+    Args:
+        name: The name of the bundle to cancel.
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        For each task in the bundle, `True` if it was cancelled,
+        otherwise `False`.
+
+    """
+    root = open_root(root)
+    bundle = bundle_load(name, root=root)
+    res = task_cancel_many(bundle.task_ids, root)
+    n = sum(res)
+    ui.alert_info(f"Cancelled {n}/{len(res)} tasks in bundle '{name}'")
+    return res
+
+
+def bundle_wait(
+    name: str,
+    *,
+    root: OptionalRoot = None,
+    allow_created: bool = False,
+    fail_early: bool = True,
+    poll: float = 1,
+    timeout: float | None = None,
+    progress: bool = True,
+) -> bool:
+    """Wait for the tasks in a bundle to complete.
+
+    All tasks are tracked in a single loop; on each check we only read
+    the status of tasks that have not yet finished, so the cost of
+    waiting falls as tasks complete.
+
+    Args:
+        name: The name of the bundle to wait on.
+        root: The root, or if not given search from the current directory.
+        allow_created: Allow waiting on a bundle containing tasks with
+            status `CREATED`; see `hipercow.task.task_wait`.
+        fail_early: Stop waiting as soon as any task fails (or is
+            cancelled, or is missing).  Other tasks will carry on
+            running.
+        poll: Time to wait between checks, in seconds.
+        timeout: Time to wait for the bundle before failing, in seconds.
+        progress: Show a progress spinner with status counts while
+            waiting?
+
+    Returns:
+        `True` if all tasks complete successfully, otherwise `False`.
+        A timeout will throw an error.
+
+    """
+    root = open_root(root)
+    task_ids = bundle_load(name, root=root).task_ids
+    n = len(task_ids)
+    status = task_status_many(task_ids, root)
+    n_created = status.count(TaskStatus.CREATED)
+    if n_created and not allow_created:
+        msg = (
+            f"Cannot wait on bundle '{name}', which contains {n_created} "
+            "tasks that have not been submitted"
+        )
+        raise Exception(msg)
+
+    pending = task_ids
+    n_success = n_failed = 0
+    time_end = None if timeout is None else time.monotonic() + timeout
+    spinner = ui.console.status("") if progress else nullcontext()
+    with spinner as sp:
+        while True:
+            still_pending = []
+            for i, s in zip(pending, status, strict=False):
+                if s == TaskStatus.SUCCESS:
+                    n_success += 1
+                elif s.is_terminal() or s == TaskStatus.MISSING:
+                    # A missing task will never finish, so count it
+                    # as failed rather than wait forever.
+                    n_failed += 1
+                else:
+                    still_pending.append(i)
+            pending = still_pending
+            if sp is not None:
+                n_running = status.count(TaskStatus.RUNNING)
+                sp.update(
+                    f"Waiting on bundle '{name}': {n_success} succeeded, "
+                    f"{n_failed} failed, {n_running} running, "
+                    f"{len(pending) - n_running} waiting"
+                )
+            if not pending or (fail_early and n_failed):
+                break
+            if time_end is not None and time.monotonic() > time_end:
+                msg = f"Timed out waiting for bundle '{name}'"
+                raise TimeoutError(msg)
+            time.sleep(poll)
+            status = task_status_many(pending, root)
+
+    if n_success == n:
+        ui.alert_success(f"All {n} tasks in bundle '{name}' succeeded")
+    else:
+        ui.alert_danger(f"{n_failed}/{n} tasks in bundle '{name}' failed")
+    return n_success == n
+
+
+class TimeSummary(BaseModel):
+    """Summary of a set of times, all in seconds.
+
+    Attributes:
+        n: The number of times.
+        mean: The mean time.
+        p50: The median time.
+        p95: The 95th percentile of the times.
+        max: The longest time.
+    """
+
+    n: int
+    mean: float
+    p50: float
+    p95: float
+    max: float
+
+    @staticmethod
+    def from_times(times: list[float]) -> "TimeSummary | None":
+        if not times:
+            return None
+        times = sorted(times)
+        return TimeSummary(
+            n=len(times),
+            mean=sum(times) / len(times),
+            p50=percentile(times, 0.5),
+            p95=percentile(times, 0.95),
+            max=times[-1],
+        )
+
+
+class BundleThroughput(BaseModel):
+    """The number of tasks that finished within an interval.
+
+    Attributes:
+        start: The start of the interval, in seconds after the first
+            task in the bundle was created.
+        end: The end of the interval, in seconds after the first task
+            in the bundle was created.
+        finished: The number of tasks that finished in the interval.
+    """
+
+    start: float
+    end: float
+    finished: int
+
+
+class BundleStraggler(BaseModel):
+    """A task that took much longer to run than is typical.
+
+    Attributes:
+        task_id: The task identifier.
+        status: The status of the task; this will be `running` if the
+            task has not yet finished.
+        run_time: The time taken to run the task so far, in seconds.
+    """
+
+    task_id: str
+    status: str
+    run_time: float
+
+
+class BundleReport(BaseModel):
+    """Report on the performance of the tasks in a bundle.
+
+    Attributes:
+        name: The name of the bundle.
+        tasks: The number of tasks in the bundle.
+        status: The number of tasks with each status.
+        failure_rate: The fraction of completed tasks that failed
+            (`None` if no task has completed yet).
+        queue_wait: The time tasks waited between creation and
+            starting to run.
+        run_time: The time completed tasks took to run.
+        throughput: The number of tasks finishing over time.
+        stragglers: Tasks that took (or are taking) much longer than
+            the median run time, longest first.
+    """
+
+    name: str
+    tasks: int
+    status: dict[str, int]
+    failure_rate: float | None
+    queue_wait: TimeSummary | None
+    run_time: TimeSummary | None
+    throughput: list[BundleThroughput]
+    stragglers: list[BundleStraggler]
+
+
+def bundle_report(
+    name: str,
+    root: OptionalRoot = None,
+    *,
+    workers: int | None = None,
+    intervals: int = 10,
+    straggler: float = 2,
+) -> BundleReport:
+    """Report on the performance of the tasks in a bundle.
+
+    We use the times recorded for each task to summarise how long
+    tasks waited in the queue before running, how long they took to
+    run, how quickly they finished, and which tasks are lagging
+    behind the rest.  This is useful for deciding how to split work
+    into tasks, and what resources to ask for.
+
+    Args:
+        name: The name of the bundle to report on.
+        root: The root, or if not given search from the current directory.
+        workers: The maximum number of threads used to read statuses
+            and times; see `hipercow.task.task_status_many` for details.
+        intervals: The number of intervals to split the time from the
+            first task's creation to the last task's completion into,
+            when computing throughput.
+        straggler: Tasks that take longer than this multiple of the
+            median run time are reported as stragglers.
+
+    Returns:
+        The report.
+    """
+    if intervals < 1:
+        msg = f"'intervals' must be at least 1, but was {intervals}"
+        raise Exception(msg)
+    root = open_root(root)
+    task_ids = bundle_load(name, root=root).task_ids
+    status = task_status_many(task_ids, root, workers=workers)
+    times = task_times_many(task_ids, root, workers=workers)
+    now = time.time()
+
+    n_success = status.count(TaskStatus.SUCCESS)
+    n_failure = status.count(TaskStatus.FAILURE)
+    n_complete = n_success + n_failure
+    failure_rate = n_failure / n_complete if n_complete else None
+
+    queue_wait = [t.started - t.created for t in times if t.started is not None]
+    run_time = {
+        i: t.finished - t.started
+        for i, t in zip(task_ids, times, strict=False)
+        if t.started is not None and t.finished is not None
+    }
+    summary_run_time = TimeSummary.from_times(list(run_time.values()))
+
+    stragglers = []
+    if summary_run_time is not None:
+        limit = straggler * summary_run_time.p50
+        for i, s, t in zip(task_ids, status, times, strict=False):
+            if i in run_time:
+                elapsed = run_time[i]
+            elif s == TaskStatus.RUNNING and t.started is not None:
+                elapsed = now - t.started
+            else:
+                continue
+            if elapsed > limit:
+                stragglers.append(
+                    BundleStraggler(task_id=i, status=str(s), run_time=elapsed)
+                )
+        stragglers.sort(key=lambda x: x.run_time, reverse=True)
+
+    return BundleReport(
+        name=name,
+        tasks=len(task_ids),
+        status=tabulate([str(s) for s in status]),
+        failure_rate=failure_rate,
+        queue_wait=TimeSummary.from_times(queue_wait),
+        run_time=summary_run_time,
+        throughput=_throughput(times, intervals),
+        stragglers=stragglers,
+    )
+
+
+def _throughput(
+    times: list[TaskTimes], intervals: int
+) -> list[BundleThroughput]:
+    finished = [t.finished for t in times if t.finished is not None]
+    if not finished:
+        return []
+    start = min(t.created for t in times)
+    width = (max(finished) - start) / intervals
+    counts = [0] * intervals
+    for t in finished:
+        k = int((t - start) / width) if width > 0 else 0
+        counts[min(k, intervals - 1)] += 1
+    return [
+        BundleThroughput(start=k * width, end=(k + 1) * width, finished=n)
+        for k, n in enumerate(counts)
+    ]
 
 
 def _status_reduce(status: list[TaskStatus]) -> TaskStatus:
@@ -186,4 +497,4 @@ def _status_reduce(status: list[TaskStatus]) -> TaskStatus:
     return order[min(order.index(i) for i in status)]
 
 
-# Not implemented - result, cancel, wait, logs, retry
+# Not implemented - result, logs, retry
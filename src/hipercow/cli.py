@@ -1,37 +1,27 @@
+# This module is imported every time 'hipercow' is run, including
+# once for every task run on the cluster (via 'hipercow task eval'),
+# so we import here only what is needed to build the commands, and
+# leave importing everything else to the commands that use it.  Some
+# imports (e.g., the DIDE support, which needs keyring and requests)
+# are very slow.
 import re
 import sys
 from functools import reduce
 from operator import ior
+from typing import TYPE_CHECKING
 
 import click
-from click_repl import repl  # type: ignore
-from prompt_toolkit.history import FileHistory
 from rich.console import Console
 from typing_extensions import Never  # 3.10 does not have this in typing
 
 from hipercow import root, ui
-from hipercow.bundle import (
-    bundle_delete,
-    bundle_list,
-    bundle_load,
-    bundle_status,
-    bundle_status_reduce,
-)
-from hipercow.configure import configure, unconfigure
-from hipercow.dide import auth as dide_auth
-from hipercow.dide.bootstrap import bootstrap as dide_bootstrap
-from hipercow.dide.check import dide_check
 from hipercow.driver import list_drivers, show_configuration
-from hipercow.environment import (
-    environment_delete,
-    environment_list,
-    environment_new,
-)
-from hipercow.example import ExampleDriver  # noqa: F401 (forces registration)
-from hipercow.provision import provision, provision_run
+from hipercow.poll import PollPolicy, parse_poll
 from hipercow.resources import TaskResources
 from hipercow.task import (
     TaskStatus,
+    task_cancel_many,
+    task_index_rebuild,
     task_last,
     task_list,
     task_log,
@@ -40,14 +30,16 @@ from hipercow.task import (
     task_status,
     task_wait,
 )
-from hipercow.task_create import task_create_shell
-from hipercow.task_create_bulk import (
-    BulkDataInput,
-    bulk_create_shell,
-    bulk_create_shell_commands,
+from hipercow.util import (
+    loop_while,
+    read_csv_rows,
+    read_csv_to_dict,
+    tabulate,
+    truthy_envvar,
 )
-from hipercow.task_eval import task_eval
-from hipercow.util import loop_while, read_csv_to_dict, tabulate, truthy_envvar
+
+if TYPE_CHECKING:
+    from hipercow.task_create_bulk import BulkDataInput
 
 # This is how the 'rich' docs drive things:
 console = Console()
@@ -140,6 +132,8 @@ def cli_repl(ctx):
 
 
 def _repl_history():
+    from prompt_toolkit.history import FileHistory
+
     try:
         r = root.open_root()
         return FileHistory(r.path_repl_history())
@@ -148,6 +142,8 @@ def _repl_history():
 
 
 def _repl_call(ctx, prompt_kwargs) -> bool:
+    from click_repl import repl  # type: ignore
+
     try:
         repl(ctx, prompt_kwargs=prompt_kwargs)
         return False
@@ -174,11 +170,16 @@ def cli_driver_configure(name: str, python_version: str | None):
 
         hipercow driver configure dide-windows
 
+    There is also a `local` driver, which runs tasks in the background
+    on this machine, using all of its cores.
+
     If you provide the `--python-version` flag you can specify the Python
     version to use, if you want a version that is different to the
     version of Python that you are using locally.
 
     """
+    from hipercow.configure import configure
+
     configure(name, python_version=python_version)
 
 
@@ -186,6 +187,8 @@ def cli_driver_configure(name: str, python_version: str | None):
 @click.argument("name")
 def cli_driver_unconfigure(name: str):
     """Unconfigure (remove) a driver."""
+    from hipercow.configure import unconfigure
+
     unconfigure(name)
 
 
@@ -281,15 +284,42 @@ def cli_task_recent(limit: int, *, rebuild: bool):
         click.echo(i)
 
 
+@task.group("index", cls=NaturalOrderGroup)
+def task_index():
+    """Manage the task index."""
+    pass  # pragma: no cover
+
+
+@task_index.command("rebuild")
+def cli_task_index_rebuild():
+    """Rebuild the task index.
+
+    The index is used to list tasks quickly, without searching the
+    whole task directory.  It is updated as tasks are created and
+    change status, but you will need to rebuild it for roots created
+    with older versions of hipercow, or if it becomes corrupt.
+
+    """
+    task_index_rebuild()
+
+
 @task.command("create")
 @click.argument("cmd", nargs=-1)
 @click.option(
     "--environment", type=str, help="The environment in which to run the task"
 )
 @click.option("--queue", help="Queue to submit the task to")
+@click.option(
+    "--worker", is_flag=True, help="Queue the task to be run by a worker"
+)
 @click.option("--wait", is_flag=True, help="Wait for the task to complete")
 def cli_task_create(
-    cmd: tuple[str], environment: str | None, *, queue: str | None, wait: bool
+    cmd: tuple[str],
+    environment: str | None,
+    *,
+    queue: str | None,
+    worker: bool,
+    wait: bool,
 ):
     """Create a task.
 
@@ -318,10 +348,19 @@ def cli_task_create(
     blocking task create-and-run type loop, but be aware you might
     wait for a very long time if the cluster is busy.
 
+    If you use `--worker` then rather than submitting the task to the
+    cluster as its own job, we add it to a queue from which workers
+    started with `hipercow worker start` will run it.
+
     """
+    from hipercow.task_create import task_create_shell
+
     resources = None if queue is None else TaskResources(queue=queue)
     task_id = task_create_shell(
-        _clean_cmd(cmd), environment=environment, resources=resources
+        _clean_cmd(cmd),
+        environment=environment,
+        resources=resources,
+        worker=worker,
     )
     click.echo(task_id)
     if wait:
@@ -332,16 +371,28 @@ def cli_task_create(
 @click.argument("task_id")
 @click.option("--capture/--no-capture", default=False)
 def cli_task_eval(task_id: str, *, capture: bool):
+    from hipercow.task_eval import task_eval
+
     task_eval(task_id, capture=capture)
 
 
+def _cli_parse_poll(_ctx, _param, value: str) -> PollPolicy:
+    try:
+        return parse_poll(value)
+    except Exception as e:
+        raise click.BadParameter(str(e)) from None
+
+
 @task.command("wait")
 @click.argument("task_id")
 @click.option(
     "--poll",
-    default=1,
-    type=float,
-    help="Time to wait between checking on task (in seconds)",
+    default="1",
+    callback=_cli_parse_poll,
+    help=(
+        "Time to wait between checking on task (in seconds), or "
+        "'adaptive' to check less often while the task is queued"
+    ),
 )
 @click.option(
     "--timeout", type=float, help="Time to wait for task before failing"
@@ -356,24 +407,60 @@ def cli_task_eval(task_id: str, *, capture: bool):
     default=True,
     help="Show a progress spinner while waiting?",
 )
+@click.option(
+    "--watch/--no-watch",
+    default=True,
+    help="Watch for changes in status between polls?",
+)
 def cli_task_wait(
     task_id: str,
     *,
-    poll: float,
+    poll: PollPolicy,
     timeout: float,
     show_log: bool,
     progress: bool,
+    watch: bool,
 ):
-    """Wait for a task to complete."""
+    """Wait for a task to complete.
+
+    By default we watch the task for changes in status, and notice
+    these as soon as they happen, so `--poll` just sets the maximum
+    time between checks (and updates to the log).  On network
+    filesystems, changes made by the cluster can't be watched and we
+    check every `--poll` seconds.
+
+    With `--poll adaptive` we start by checking every second, and
+    then check less and less often (up to once a minute) while the
+    task is queued, returning to checking every second once it starts
+    running.
+
+    """
     task_wait(
         task_id,
         poll=poll,
         timeout=timeout,
         show_log=show_log,
         progress=progress,
+        watch=watch,
     )
 
 
+@task.command("cancel")
+@click.argument("task_ids", nargs=-1, required=True)
+def cli_task_cancel(task_ids: tuple[str]):
+    """Cancel tasks.
+
+    Only tasks that are `submitted` or `running` can be cancelled.
+    All tasks given are cancelled together, which is much faster than
+    cancelling them one at a time.  We print, for each task, whether
+    it was cancelled.
+
+    """
+    res = task_cancel_many(list(task_ids))
+    for task_id, ok in zip(task_ids, res, strict=False):
+        click.echo(f"{task_id}: {'cancelled' if ok else 'not cancelled'}")
+
+
 def _process_with_status(with_status: list[str]):
     if not with_status:
         return None
@@ -389,6 +476,8 @@ def environment():
 @environment.command("list")
 def cli_environment_list():
     """List environments."""
+    from hipercow.environment import environment_list
+
     envs = environment_list(root.open_root())
     click.echo("\n".join(envs))
 
@@ -397,6 +486,8 @@ def cli_environment_list():
 @click.option("--name")
 def cli_environment_delete(name: str):
     """Delete an environment."""
+    from hipercow.environment import environment_delete
+
     r = root.open_root()
     environment_delete(name, r)
 
@@ -416,6 +507,8 @@ def cli_environment_new(name: str, engine: str):
     to do that, after creation.
 
     """
+    from hipercow.environment import environment_new
+
     r = root.open_root()
     environment_new(name, engine, r)
 
@@ -436,6 +529,8 @@ def cli_environment_provision(name: str, cmd: tuple[str]):
     environment description.
 
     """
+    from hipercow.provision import provision
+
     r = root.open_root()
     provision(name, _clean_cmd(cmd), root=r)
 
@@ -444,6 +539,8 @@ def cli_environment_provision(name: str, cmd: tuple[str]):
 @click.argument("name")
 @click.argument("id")
 def cli_environment_provision_run(name: str, id: str):
+    from hipercow.provision import provision_run
+
     r = root.open_root()
     provision_run(name, id, r)
 
@@ -457,6 +554,8 @@ def bundle():
 @bundle.command("list")
 def cli_bundle_list():
     """List bundles."""
+    from hipercow.bundle import bundle_list
+
     r = root.open_root()
     for el in bundle_list(r):
         click.echo(el)
@@ -472,10 +571,27 @@ def cli_bundle_delete(name: str):
     manage the ensemble of jobs together, but you will be able to work
     with the tasks by their individual ids, using `hipercow task`.
     """
+    from hipercow.bundle import bundle_delete
+
     r = root.open_root()
     bundle_delete(name, root=r)
 
 
+@bundle.command("cancel")
+@click.argument("name")
+def cli_bundle_cancel(name: str):
+    """Cancel the tasks in a bundle.
+
+    Only tasks that are `submitted` or `running` can be cancelled;
+    other tasks in the bundle are left alone.
+
+    """
+    from hipercow.bundle import bundle_cancel
+
+    r = root.open_root()
+    bundle_cancel(name, root=r)
+
+
 @bundle.command("status")
 @click.argument("name")
 @click.option(
@@ -484,7 +600,12 @@ def cli_bundle_delete(name: str):
     default="none",
     help="Summarise the statuses",
 )
-def cli_bundle_status(name: str, summary: str):
+@click.option(
+    "--workers",
+    type=int,
+    help="Number of threads used to read statuses",
+)
+def cli_bundle_status(name: str, summary: str, workers: int | None):
     """Get the status of a bundle.
 
     This can offer three levels of summary; and we might redesign the
@@ -495,12 +616,22 @@ def cli_bundle_status(name: str, summary: str):
     what sort of format you might like it in, as we can easily add
     something like a JSON format output.
 
+    Statuses are read concurrently; use `--workers` (or set the
+    environment variable `HIPERCOW_STATUS_WORKERS`) to control the
+    number of threads used.
+
     """
+    from hipercow.bundle import (
+        bundle_load,
+        bundle_status,
+        bundle_status_reduce,
+    )
+
     r = root.open_root()
     if summary == "single":
-        click.echo(bundle_status_reduce(name, root=r))
+        click.echo(bundle_status_reduce(name, root=r, workers=workers))
     else:
-        res = bundle_status(name, root=r)
+        res = bundle_status(name, root=r, workers=workers)
         if summary == "none":
             task_ids = bundle_load(name, root=r).task_ids
             for task_id, status in zip(task_ids, res, strict=False):
@@ -512,6 +643,119 @@ def cli_bundle_status(name: str, summary: str):
                 click.echo(f"{status_str}: {n}")
 
 
+@bundle.command("wait")
+@click.argument("name")
+@click.option(
+    "--poll",
+    default=1,
+    type=float,
+    help="Time to wait between checking on tasks (in seconds)",
+)
+@click.option(
+    "--timeout", type=float, help="Time to wait for tasks before failing"
+)
+@click.option(
+    "--fail-early/--no-fail-early",
+    default=True,
+    help="Stop waiting as soon as any task fails?",
+)
+@click.option(
+    "--progress/--no-progress",
+    default=True,
+    help="Show a progress spinner while waiting?",
+)
+def cli_bundle_wait(
+    name: str,
+    *,
+    poll: float,
+    timeout: float,
+    fail_early: bool,
+    progress: bool,
+):
+    """Wait for the tasks in a bundle to complete."""
+    from hipercow.bundle import bundle_wait
+
+    r = root.open_root()
+    bundle_wait(
+        name,
+        root=r,
+        poll=poll,
+        timeout=timeout,
+        fail_early=fail_early,
+        progress=progress,
+    )
+
+
+@bundle.command("report")
+@click.argument("name")
+@click.option(
+    "--json", "as_json", is_flag=True, help="Print the report as JSON"
+)
+@click.option(
+    "--workers",
+    type=int,
+    help="Number of threads used to read statuses and times",
+)
+def cli_bundle_report(name: str, *, as_json: bool, workers: int | None):
+    """Report on the performance of the tasks in a bundle.
+
+    This summarises how long tasks waited in the queue and took to
+    run, how many tasks finished over time, the fraction of tasks
+    that failed, and any tasks that took (or are taking) much longer
+    than the others.  Use this to decide how to split up work and
+    what resources to ask for.
+
+    """
+    from hipercow.bundle import bundle_report
+
+    r = root.open_root()
+    report = bundle_report(name, root=r, workers=workers)
+    if as_json:
+        click.echo(report.model_dump_json(indent=2))
+        return
+    click.echo(f"Bundle '{report.name}': {report.tasks} tasks")
+    for status_str, n in report.status.items():
+        click.echo(f"  {status_str}: {n}")
+    if report.failure_rate is not None:
+        click.echo(f"Failure rate: {100 * report.failure_rate:.1f}%")
+    summaries = [
+        (label, x)
+        for label, x in [
+            ("queue wait", report.queue_wait),
+            ("run time", report.run_time),
+        ]
+        if x is not None
+    ]
+    if summaries:
+        header = "".join(f"{x:>10}" for x in ("mean", "p50", "p95", "max"))
+        click.echo(f"{'':<12}{'n':>8}{header}")
+    for label, x in summaries:
+        values = "".join(
+            f"{_format_seconds(v):>10}" for v in (x.mean, x.p50, x.p95, x.max)
+        )
+        click.echo(f"{label:<12}{x.n:>8}{values}")
+    if report.throughput:
+        click.echo("Tasks finished, by time since the first was created:")
+        for el in report.throughput:
+            start = _format_seconds(el.start)
+            end = _format_seconds(el.end)
+            click.echo(f"  {start} - {end}: {el.finished}")
+    if report.stragglers:
+        click.echo("Stragglers:")
+        for straggler in report.stragglers:
+            run_time = _format_seconds(straggler.run_time)
+            click.echo(
+                f"  {straggler.task_id}: {run_time} ({straggler.status})"
+            )
+
+
+def _format_seconds(t: float) -> str:
+    for unit, size in (("h", 3600), ("m", 60)):
+        if t >= size:
+            return f"{t / size:.1f}{unit}"
+    return f"{t:.1f}s"
+
+
 # The names are a bit of a mess here, something that largely follows
 # hipercow-r:
 #
@@ -540,11 +784,19 @@ def create():
 )
 @click.option("--queue", help="The queue to submit the task to")
 @click.option("--name", help="An optional name for the bundle")
+@click.option(
+    "--worker", is_flag=True, help="Queue the tasks to be run by workers"
+)
 @click.option(
     "--preview",
     help="Show preview of tasks that would be created, but don't create any",
     is_flag=True,
 )
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue creating a bundle from a csv file, after an interruption",
+)
 def cli_create_bulk(
     cmd: tuple[str],
     *,
@@ -553,6 +805,8 @@ def cli_create_bulk(
     data: tuple[str],
     queue: str | None,
     name: str | None,
+    worker: bool,
+    resume: bool,
 ):
     """Bulk create tasks by substituting into a template.
 
@@ -583,12 +837,43 @@ def cli_create_bulk(
       - in both cases we will compute the outer product of all
         `--data` arguments and submit all combinations of arguments.
 
+    We read `csv` files a row at a time, creating and submitting tasks
+    a chunk at a time, so that very large files don't need to fit in
+    memory.  If this is interrupted, you can run the same command
+    again with `--resume` (and the bundle name given by `--name`, or
+    printed when starting) to continue where it stopped.
+
     """
-    template_data = _cli_bulk_create_data(data)
+    from hipercow.task_create_bulk import (
+        bulk_create_shell,
+        bulk_create_shell_commands,
+        bulk_create_shell_stream,
+    )
+
+    path_csv = _cli_bulk_csv_path(data)
+    if resume and (preview or path_csv is None):
+        msg = "'--resume' can only be used when creating tasks from a csv file"
+        raise Exception(msg)
     if preview:
+        template_data = _cli_bulk_create_data(data)
         cmds = bulk_create_shell_commands(_clean_cmd(cmd), template_data)
         _cli_bulk_preview_commands(cmds, 3)
+    elif path_csv is not None:
+        r = root.open_root()
+        resources = None if queue is None else TaskResources(queue=queue)
+        name = bulk_create_shell_stream(
+            _clean_cmd(cmd),
+            read_csv_rows(path_csv),
+            name=name,
+            resume=resume,
+            environment=environment,
+            resources=resources,
+            worker=worker,
+            root=r,
+        )
+        click.echo(name)
     else:
+        template_data = _cli_bulk_create_data(data)
         r = root.open_root()
         resources = None if queue is None else TaskResources(queue=queue)
 
@@ -607,22 +892,29 @@ def cli_create_bulk(
             name=name,
             environment=environment,
             resources=resources,
+            worker=worker,
             root=r,
         )
         click.echo(name)
 
 
-def _cli_bulk_create_data(data: tuple[str]) -> BulkDataInput:
+def _cli_bulk_create_data(data: tuple[str]) -> "BulkDataInput":
     if not data:
         msg = "Expected at least one '--data' argument"
         raise Exception(msg)
 
-    if len(data) == 1 and re.search("\\.csv$", data[0], re.IGNORECASE):
-        return read_csv_to_dict(data[0])
+    if path_csv := _cli_bulk_csv_path(data):
+        return read_csv_to_dict(path_csv)
 
     return dict(_cli_bulk_parse_data_argument(el) for el in data)
 
 
+def _cli_bulk_csv_path(data: tuple[str]) -> str | None:
+    if len(data) == 1 and re.search("\\.csv$", data[0], re.IGNORECASE):
+        return data[0]
+    return None
+
+
 def _cli_bulk_parse_data_argument(x: str) -> tuple[str, list[str]]:
     m = re.match("^([_a-z][_a-z0-9]*)\\s*=\\s*([^=]+)$", x, re.IGNORECASE)
     if not m:
@@ -650,6 +942,40 @@ def _cli_bulk_preview_commands(cmds: list[list[str]], preview: int) -> None:
             click.echo(f"   : ... {skip} commands omitted")
 
 
+@cli.group(cls=NaturalOrderGroup)
+def worker():
+    """Commands for running tasks with workers."""
+    pass  # pragma: no cover
+
+
+@worker.command("start")
+@click.option("--n", type=int, default=1, help="The number of workers")
+@click.option("--queue", help="The queue to submit the workers to")
+def cli_worker_start(n: int, queue: str | None):
+    """Start workers.
+
+    Workers are long-running cluster jobs that run tasks created with
+    `--worker` (e.g., `hipercow task create --worker`), one after
+    another, until there are no more left to run.  If you have many
+    short tasks, this is much faster than running each as its own
+    cluster job, as you only wait for the cluster to start `n` jobs.
+
+    """
+    from hipercow.worker import worker_start
+
+    resources = None if queue is None else TaskResources(queue=queue)
+    for worker_id in worker_start(n, resources=resources):
+        click.echo(worker_id)
+
+
+@worker.command("run", hidden=True)
+@click.argument("worker_id")
+def cli_worker_run(worker_id: str):
+    from hipercow.worker import worker_run
+
+    worker_run(worker_id)
+
+
 @cli.group(cls=NaturalOrderGroup)
 def dide():
     """Commands for interacting with the DIDE cluster."""
@@ -670,6 +996,8 @@ def cli_dide_authenticate(action: str):
     * `clear`: Clear any stored credentials
 
     """
+    from hipercow.dide import auth as dide_auth
+
     if action == "set":
         dide_auth.authenticate()
     elif action == "check":
@@ -684,6 +1012,8 @@ def cli_dide_authenticate(action: str):
 @dide.command("check")
 def cli_dide_check():
     """Check everything is good to use hipercow on the DIDE cluster."""
+    from hipercow.dide.check import dide_check
+
     dide_check()
 
 
@@ -730,6 +1060,8 @@ def cli_dide_bootstrap(
     https://mrc-ide.github.io/hipercow-py/administration/
 
     """
+    from hipercow.dide.bootstrap import bootstrap as dide_bootstrap
+
     dide_bootstrap(
         target,
         force=force,
@@ -5,6 +5,7 @@ import keyring
 
 from hipercow import ui
 from hipercow.dide.web import Credentials, check_access
+from hipercow.profile import span
 
 ## We follow hipercow in storing the username *as* a password, because
 ## it's largely a computer-specific things.
@@ -62,8 +63,10 @@ If this fails we can always try again."""
 
     keyring.set_password("hipercow/dide/username", "", username)
     keyring.set_password("hipercow/dide/password", username, password)
+    _forget_web_client()
 
 
+@span("dide.fetch_credentials")
 def fetch_credentials() -> Credentials:
     username = keyring.get_password("hipercow/dide/username", "") or ""
     password = keyring.get_password("hipercow/dide/password", username)
@@ -94,6 +97,16 @@ def clear():
         ui.alert_warning(f"Deleting credentials for '{username}'")
         _delete_password_silently("hipercow/dide/username", "")
         _delete_password_silently("hipercow/dide/password", username)
+        _forget_web_client()
+
+
+# The DIDE driver keeps a logged-in client for the lifetime of the
+# process (e.g., in the REPL); drop it so that it is created again
+# with the new credentials.
+def _forget_web_client():
+    from hipercow.dide.driver import _web_client  # noqa: PLC0415
+
+    _web_client.cache_clear()
 
 
 def _delete_password_silently(key: str, username: str):
@@ -3,16 +3,17 @@ import platform
 from pathlib import Path
 from string import Template
 
-from taskwait import taskwait
-
 from hipercow import ui
 from hipercow.__about__ import __version__ as version
 from hipercow.dide.configuration import DideConfiguration
 from hipercow.dide.mounts import PathMap, _forward_slash
 from hipercow.dide.provision import ProvisionWaitWrapper
 from hipercow.dide.web import DideWebClient
+from hipercow.poll import AdaptivePoll, taskwait_poll
+from hipercow.profile import span
 from hipercow.resources import TaskResources
 from hipercow.root import Root
+from hipercow.util import file_write_atomic, runner_id
 
 TASK_RUN_SH = Template(
     r"""#!/bin/bash
@@ -36,14 +37,15 @@ export HIPERCOW_NO_DRIVERS=1
 export HIPERCOW_CORES=$$CCP_NUMCPUS
 export REDIS_URL=10.0.2.254
 
-echo this is a single task
+TASK_ID=$$1
+echo running task: $$TASK_ID
 
-/mnt/cluster/Hipercow/bootstrap-py-linux/python-${python_version}/bin/hipercow task eval --capture ${task_id}
+/mnt/cluster/Hipercow/bootstrap-py-linux/python-${python_version}/bin/hipercow task eval --capture $$TASK_ID
 
 ErrorCode=$$?
 
 # We could use hipercow here, I think
-if [ -f hipercow/py/tasks/${task_id_1}/${task_id_2}/status-success ]; then
+if [ -f hipercow/py/tasks/$${TASK_ID:0:2}/$${TASK_ID:2}/status-success ]; then
   TaskStatus=0
 else
   TaskStatus=1
@@ -69,6 +71,46 @@ fi
 )
 
 
+WORKER_RUN_SH = Template(
+    r"""#!/bin/bash
+# automatically generated
+
+echo generated on host: ${hostname}
+echo generated on date: ${date}
+echo hipercow-py version: ${hipercow_version}
+echo running on: $$(hostname -f)
+
+source /etc/profile
+
+module use /modules/modules/all
+
+module load Python/${python_version}
+
+cd ${hipercow_root_path}
+echo working directory: $$(pwd)
+
+export HIPERCOW_NO_DRIVERS=1
+export HIPERCOW_CORES=$$CCP_NUMCPUS
+export REDIS_URL=10.0.2.254
+
+echo this is a worker
+
+/mnt/cluster/Hipercow/bootstrap-py-linux/python-${python_version}/bin/hipercow worker run ${worker_id}
+
+ErrorCode=$$?
+
+echo ERRORLEVEL was $$ErrorCode
+
+if [ $$ErrorCode -ne 0 ]; then
+  echo Worker failed
+  exit $$ErrorCode
+fi
+
+echo Quitting
+"""  # noqa: E501
+)
+
+
 PROVISION_SH = Template(
     r"""#!/bin/bash
 # automatically generated
@@ -105,15 +147,41 @@ echo Quitting
 )
 
 
+# The script written here runs any task, given its id as the first
+# argument, and depends only on the driver configuration.  So we
+# write it once per configuration, in a directory named by a hash of
+# its contents, and every later submission reuses it.
+@span("dide.write_batch_task_run")
 def write_batch_task_run_linux(
-    task_id: str, config: DideConfiguration, root: Root
+    config: DideConfiguration,
+    root: Root,
+    *,
+    core: dict[str, str] | None = None,
+) -> str:
+    data = _template_data_task_run_linux(config, core)
+    path = root.path_runner(runner_id(data), relative=True) / "task_run.sh"
+    if not (root.path / path).exists():
+        # Another process may be writing this at the same time, and a
+        # job may already be reading it.
+        (root.path / path).parent.mkdir(parents=True, exist_ok=True)
+        contents = TASK_RUN_SH.substitute(data)
+        file_write_atomic(root.path / path, contents, newline="\n")
+    return data["hipercow_root_path"] + _forward_slash(str(path))
+
+
+def write_batch_worker_run_linux(
+    worker_id: str,
+    config: DideConfiguration,
+    root: Root,
+    *,
+    core: dict[str, str] | None = None,
 ) -> str:
-    data = _template_data_task_run_linux(task_id, config)
-    path = root.path_task(task_id, relative=True)
+    data = _template_data_worker_run_linux(worker_id, config, core)
+    path = root.path_worker(worker_id, relative=True)
     (root.path / path).mkdir(parents=True, exist_ok=True)
-    path = path / "task_run.sh"
+    path = path / "worker_run.sh"
     with (root.path / path).open("w", newline="\n") as f:
-        f.write(TASK_RUN_SH.substitute(data))
+        f.write(WORKER_RUN_SH.substitute(data))
     return data["hipercow_root_path"] + _forward_slash(str(path))
 
 
@@ -140,14 +208,22 @@ def _template_data_core_linux(config: DideConfiguration) -> dict[str, str]:
     }
 
 
+# Drivers can pass in 'core', the result of _template_data_core_linux,
+# to avoid recomputing it (and so resolving the path on the cluster
+# again) for every script that they write.
 def _template_data_task_run_linux(
-    task_id, config: DideConfiguration
+    config: DideConfiguration, core: dict[str, str] | None = None
 ) -> dict[str, str]:
-    return _template_data_core_linux(config) | {
-        "task_id": task_id,
-        "task_id_1": task_id[:2],
-        "task_id_2": task_id[2:],
-    }
+    return core or _template_data_core_linux(config)
+
+
+def _template_data_worker_run_linux(
+    worker_id: str,
+    config: DideConfiguration,
+    core: dict[str, str] | None = None,
+) -> dict[str, str]:
+    core = core or _template_data_core_linux(config)
+    return core | {"worker_id": worker_id}
 
 
 def _template_data_provision_linux(
@@ -291,7 +367,7 @@ def _dide_provision_linux(
     resources = TaskResources(queue="LinuxNodes")
     dide_id = cl.submit(unc, f"{name}/{id}", resources=resources)
     task = ProvisionWaitWrapper(root, name, id, cl, dide_id)
-    res = taskwait(task)
+    res = taskwait_poll(task, AdaptivePoll())
     dt = round(res.end - res.start, 2)
     if res.status == "failure":
         path_log = root.path_provision_log(name, id, relative=True)
@@ -4,16 +4,17 @@ import re
 from pathlib import Path
 from string import Template
 
-from taskwait import taskwait
-
 from hipercow import ui
 from hipercow.__about__ import __version__ as version
 from hipercow.dide.configuration import DideConfiguration
 from hipercow.dide.mounts import PathMap, _backward_slash, _forward_slash
 from hipercow.dide.provision import ProvisionWaitWrapper
 from hipercow.dide.web import DideWebClient
+from hipercow.poll import AdaptivePoll, taskwait_poll
+from hipercow.profile import span
 from hipercow.resources import TaskResources
 from hipercow.root import Root
+from hipercow.util import file_write_atomic, runner_id
 
 TASK_RUN_BAT = Template(
     r"""@echo off
@@ -37,15 +38,16 @@ set HIPERCOW_NO_DRIVERS=1
 set HIPERCOW_CORES=%CCP_NUMCPUS%
 set REDIS_URL=10.0.2.254
 
-ECHO this is a single task
+set TASK_ID=%1
+ECHO running task: %TASK_ID%
 
-I:\bootstrap-py-windows\python-${python_version}\bin\hipercow task eval --capture ${task_id}
+I:\bootstrap-py-windows\python-${python_version}\bin\hipercow task eval --capture %TASK_ID%
 
 @ECHO off
 set ErrorCode=%ERRORLEVEL%
 
 @REM We could use hipercow here, I think
-if exist hipercow\py\tasks\${task_id_1}\${task_id_2}\status-success (
+if exist hipercow\py\tasks\%TASK_ID:~0,2%\%TASK_ID:~2%\status-success (
   set TaskStatus=0
 ) else (
   set TaskStatus=1
@@ -74,6 +76,53 @@ if %TaskStatus% == 0 (
 )"""  # noqa: E501
 )
 
+WORKER_RUN_BAT = Template(
+    r"""@echo off
+REM automatically generated
+ECHO generated on host: ${hostname}
+ECHO generated on date: ${date}
+ECHO hipercow(py) version: ${hipercow_version}
+ECHO running on: %COMPUTERNAME%
+
+net use I: \\wpia-hn-app\hipercow /y
+
+call setGit.bat
+
+${network_shares_create}
+
+${hipercow_root_drive}
+cd ${hipercow_root_path}
+ECHO working directory: %CD%
+
+set HIPERCOW_NO_DRIVERS=1
+set HIPERCOW_CORES=%CCP_NUMCPUS%
+set REDIS_URL=10.0.2.254
+
+ECHO this is a worker
+
+I:\bootstrap-py-windows\python-${python_version}\bin\hipercow worker run ${worker_id}
+
+@ECHO off
+set ErrorCode=%ERRORLEVEL%
+
+ECHO ERRORLEVEL was %ErrorCode%
+
+ECHO Cleaning up
+%SystemDrive%
+
+${network_shares_delete}
+
+net use I: /delete /y
+
+if %ErrorCode% neq 0 (
+  ECHO Worker failed
+  EXIT /b %ErrorCode%
+)
+
+@ECHO Quitting
+"""  # noqa: E501
+)
+
 PROVISION_BAT = Template(
     r"""@echo off
 REM automatically generated
@@ -130,15 +179,41 @@ if %ERRORLEVEL% neq 0 (
 # needf the relative path and the absolute path to the task directory
 # and we build the unc base path twice (once with slash normalisation,
 # the other without).
+#
+# The script runs any task, given its id as the first argument, and
+# depends only on the driver configuration, so we write it once per
+# configuration (see batch_linux for details) and reuse it.
+@span("dide.write_batch_task_run")
 def write_batch_task_run_win(
-    task_id: str, config: DideConfiguration, root: Root
+    config: DideConfiguration,
+    root: Root,
+    *,
+    core: dict[str, str] | None = None,
 ) -> str:
-    data = _template_data_task_run_win(task_id, config)
+    data = _template_data_task_run_win(config, core)
     path_map = config.path_map
-    path = root.path_task(task_id, relative=True) / "task_run.bat"
+    path = root.path_runner(runner_id(data), relative=True) / "task_run.bat"
     unc = _unc_path(path_map, path)
-    with (root.path / path).open("w") as f:
-        f.write(TASK_RUN_BAT.substitute(data))
+    if not (root.path / path).exists():
+        (root.path / path).parent.mkdir(parents=True, exist_ok=True)
+        file_write_atomic(root.path / path, TASK_RUN_BAT.substitute(data))
+    return unc
+
+
+def write_batch_worker_run_win(
+    worker_id: str,
+    config: DideConfiguration,
+    root: Root,
+    *,
+    core: dict[str, str] | None = None,
+) -> str:
+    data = _template_data_worker_run_win(worker_id, config, core)
+    path = root.path_worker(worker_id, relative=True) / "worker_run.bat"
+    unc = _unc_path(config.path_map, path)
+    path_abs = root.path / path
+    path_abs.parent.mkdir(parents=True, exist_ok=True)
+    with path_abs.open("w") as f:
+        f.write(WORKER_RUN_BAT.substitute(data))
     return unc
 
 
@@ -179,14 +254,21 @@ def _template_data_core_win(config: DideConfiguration) -> dict[str, str]:
     }
 
 
+# Drivers can pass in 'core', the result of _template_data_core_win,
+# to avoid recomputing it for every script that they write.
 def _template_data_task_run_win(
-    task_id, config: DideConfiguration
+    config: DideConfiguration, core: dict[str, str] | None = None
 ) -> dict[str, str]:
-    return _template_data_core_win(config) | {
-        "task_id": task_id,
-        "task_id_1": task_id[:2],
-        "task_id_2": task_id[2:],
-    }
+    return core or _template_data_core_win(config)
+
+
+def _template_data_worker_run_win(
+    worker_id: str,
+    config: DideConfiguration,
+    core: dict[str, str] | None = None,
+) -> dict[str, str]:
+    core = core or _template_data_core_win(config)
+    return core | {"worker_id": worker_id}
 
 
 def _template_data_provision_win(
@@ -218,7 +300,7 @@ def _dide_provision_win(
     resources = TaskResources(queue="BuildQueue")
     dide_id = cl.submit(unc, f"{name}/{id}", resources=resources)
     task = ProvisionWaitWrapper(root, name, id, cl, dide_id)
-    res = taskwait(task)
+    res = taskwait_poll(task, AdaptivePoll())
     dt = round(res.end - res.start, 2)
     if res.status == "failure":
         path_log = root.path_provision_log(name, id, relative=True)
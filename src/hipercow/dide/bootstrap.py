@@ -1,15 +1,17 @@
 import secrets
 import shutil
+import time
 from pathlib import Path
 
-from taskwait import Task, taskwait
+from taskwait import Task
 
 from hipercow import ui
 from hipercow.dide.bootstrap_linux import bootstrap_linux_submit
 from hipercow.dide.bootstrap_windows import bootstrap_windows_submit
 from hipercow.dide.driver import _web_client
 from hipercow.dide.mounts import Mount, _backward_slash, detect_mounts
-from hipercow.dide.web import DideWebClient
+from hipercow.dide.web import DideStatusPoller, DideWebClient
+from hipercow.poll import AdaptivePoll
 from hipercow.util import read_file_if_exists
 
 
@@ -35,9 +37,15 @@ def bootstrap(
 
     target = _bootstrap_target(target, mount, bootstrap_id)
     args = _bootstrap_args(force=force, verbose=verbose)
+    # Listing all of the user's jobs only pays off when there are
+    # several to check; a single task asks about its own job.
+    n = len(python_versions) * len(platforms)
+    poller = DideStatusPoller(client) if n > 1 else None
 
     tasks = [
-        _bootstrap_submit(client, mount, bootstrap_id, v, p, target, args)
+        _bootstrap_submit(
+            client, mount, bootstrap_id, v, p, target, args, poller=poller
+        )
         for v in python_versions
         for p in platforms
     ]
@@ -56,9 +64,12 @@ class BootstrapTask(Task):
         dide_id: str,
         version: str,
         platform: str,
+        *,
+        poller: DideStatusPoller | None = None,
     ):
         self.client = client
         self.dide_id = dide_id
+        self.poller = poller
         self.version = version
         self.platform = platform
         self.status_waiting = {"created", "submitted"}
@@ -71,7 +82,9 @@ class BootstrapTask(Task):
         pass
 
     def status(self) -> str:
-        return str(self.client.status_job(self.dide_id))
+        if self.poller is None:
+            return str(self.client.status_job(self.dide_id))
+        return str(self.poller.status(self.dide_id))
 
     def has_log(self) -> bool:
         return False
@@ -85,6 +98,8 @@ def _bootstrap_submit(
     platform: str,
     target: str,
     args: str,
+    *,
+    poller: DideStatusPoller | None = None,
 ) -> BootstrapTask:
     name = f"bootstrap/{bootstrap_id}/{version}"
 
@@ -98,7 +113,7 @@ def _bootstrap_submit(
         )
 
     return BootstrapTask(
-        mount, bootstrap_id, client, dide_id, version, platform
+        mount, bootstrap_id, client, dide_id, version, platform, poller=poller
     )
 
 
@@ -130,30 +145,63 @@ def _bootstrap_mount(mounts: list[Mount] | None = None) -> Mount:
     raise Exception(msg)
 
 
-def _bootstrap_wait(tasks: list[BootstrapTask]) -> None:
+# We check on all tasks in a single loop, refreshing any shared
+# poller once per check, so that each check is a single request to
+# the portal for all tasks.
+def _bootstrap_wait(
+    tasks: list[BootstrapTask], poll: AdaptivePoll | None = None
+) -> None:
     ui.alert_info(f"Waiting on {len(tasks)} tasks")
+    poll = poll or AdaptivePoll()
+    interval = poll.initial
+    pending = tasks
+    prev: dict[str, str] = {}
     fail = 0
-    for t in tasks:
-        res = taskwait(t)
-        result_str = f"{t.version}: {res.status}"
-        if res.status == "success":
-            ui.alert_success(result_str)
+    while True:
+        pollers = {id(t.poller): t.poller for t in pending if t.poller}
+        for poller in pollers.values():
+            poller.refresh()
+        status: dict[str, str] = {}
+        for t in pending:
+            s = t.status()
+            if s in t.status_waiting or s in t.status_running:
+                status[t.dide_id] = s
+            elif not _bootstrap_report(t, s):
+                fail += 1
+        pending = [t for t in pending if t.dide_id in status]
+        if not pending:
+            break
+        # As for AdaptivePoll with a single task, back off while all
+        # tasks are waiting in the queue and nothing changes.
+        waiting = all(status[t.dide_id] in t.status_waiting for t in pending)
+        if status == prev and waiting:
+            interval = min(interval * poll.factor, poll.maximum)
         else:
-            ui.alert_danger(result_str)
-        ui.logs("Logs from pipx:", read_file_if_exists(t.path_log), indent=4)
-        if res.status != "success":
-            ui.logs(
-                f"Additional logs from cluster for task '{t.dide_id}':",
-                t.client.log(t.dide_id),
-                indent=4,
-            )
-            fail += 1
+            interval = poll.initial
+        prev = status
+        time.sleep(interval)
 
     if fail:
         msg = f"{fail}/{len(tasks)} bootstrap tasks failed - see logs above"
         raise Exception(msg)
 
 
+def _bootstrap_report(t: BootstrapTask, status: str) -> bool:
+    result_str = f"{t.version}: {status}"
+    if status == "success":
+        ui.alert_success(result_str)
+    else:
+        ui.alert_danger(result_str)
+    ui.logs("Logs from pipx:", read_file_if_exists(t.path_log), indent=4)
+    if status != "success":
+        ui.logs(
+            f"Additional logs from cluster for task '{t.dide_id}':",
+            t.client.log(t.dide_id),
+            indent=4,
+        )
+    return status == "success"
+
+
 def _bootstrap_unc(path: Path):
     path_str = _backward_slash(str(path))
     return f"\\\\wpia-hn\\hipercow\\{path_str}"
@@ -89,7 +89,8 @@ def _dide_check_connection() -> Result:
 
 def _dide_check_path(path: Path) -> Result:
     ui.alert_arrow("Checking paths")
-    mounts = detect_mounts()
+    # Look afresh, as this is used to diagnose problems with mounts
+    mounts = detect_mounts(refresh=True)
     try:
         map = remap_path(path, mounts)
         ui.alert_success("Path looks like it is on a network share", indent=4)
@@ -1,14 +1,23 @@
+import time
+from collections.abc import Callable
+from functools import cache, cached_property
 from pathlib import Path
 
+from pydantic import BaseModel
+
 from hipercow import ui
 from hipercow.dide.auth import fetch_credentials
 from hipercow.dide.batch_linux import (
     _dide_provision_linux,
+    _template_data_core_linux,
     write_batch_task_run_linux,
+    write_batch_worker_run_linux,
 )
 from hipercow.dide.batch_windows import (
     _dide_provision_win,
+    _template_data_core_win,
     write_batch_task_run_win,
+    write_batch_worker_run_win,
 )
 from hipercow.dide.configuration import DideConfiguration, dide_configuration
 from hipercow.dide.mounts import detect_mounts
@@ -16,6 +25,7 @@ from hipercow.dide.web import DideWebClient
 from hipercow.driver import HipercowDriver, hipercow_driver
 from hipercow.resources import ClusterResources, Queues, TaskResources
 from hipercow.root import Root
+from hipercow.util import read_file_if_exists
 
 
 @hipercow_driver
@@ -51,30 +61,69 @@ class DideWindowsDriver(HipercowDriver):
 
     def submit(
         self, task_id: str, resources: TaskResources | None, root: Root
+    ) -> None:
+        self.submit_many([task_id], resources, root)
+
+    def submit_many(
+        self,
+        task_ids: list[str],
+        resources: TaskResources | None,
+        root: Root,
+        *,
+        on_submit: Callable[[str], None] | None = None,
+    ) -> None:
+        cl = _web_client()
+        if not resources:
+            resources = self.resources(root).validate_resources(TaskResources())
+        unc = write_batch_task_run_win(
+            self.config, root, core=self._template_data
+        )
+        for task_id in task_ids:
+            dide_id = cl.submit(
+                unc, task_id, resources=resources, args=[task_id]
+            )
+            with self._path_dide_id(task_id, root).open("w") as f:
+                f.write(dide_id)
+            if on_submit:
+                on_submit(task_id)
+
+    def cancel(self, task_ids: list[str], root: Root) -> list[bool]:
+        return _dide_cancel([self._path_dide_id(i, root) for i in task_ids])
+
+    def submit_workers(
+        self,
+        worker_ids: list[str],
+        resources: TaskResources | None,
+        root: Root,
     ) -> None:
         cl = _web_client()
-        unc = write_batch_task_run_win(task_id, self.config, root)
         if not resources:
-            resources = self.resources().validate_resources(TaskResources())
-        dide_id = cl.submit(unc, task_id, resources=resources)
-        with self._path_dide_id(task_id, root).open("w") as f:
-            f.write(dide_id)
+            resources = self.resources(root).validate_resources(TaskResources())
+        for worker_id in worker_ids:
+            unc = write_batch_worker_run_win(
+                worker_id, self.config, root, core=self._template_data
+            )
+            dide_id = cl.submit(unc, f"worker-{worker_id}", resources=resources)
+            with (root.path_worker(worker_id) / "dide_id").open("w") as f:
+                f.write(dide_id)
 
     def provision(self, name: str, id: str, root: Root) -> None:
         _dide_provision_win(name, id, self.config, _web_client(), root)
 
-    def resources(self) -> ClusterResources:
-        # We should get this from the cluster itself but with caching
-        # not yet configured this seems unwise as we'll hit the
-        # cluster an additional time for every job submission rather
-        # than just once a session.
+    def resources(self, root: Root) -> ClusterResources:
+        # The portal does not report queues or memory, so these are
+        # fixed, but we look up the largest node (see
+        # _dide_max_cores).
         queues = Queues(
             {"AllNodes", "BuildQueue", "Testing"},
             default="AllNodes",
             test="Testing",
             build="BuildQueue",
         )
-        return ClusterResources(queues=queues, max_cores=32, max_memory=512)
+        max_cores = _dide_max_cores(self.name, root)
+        return ClusterResources(
+            queues=queues, max_cores=max_cores, max_memory=512
+        )
 
     def task_log(
         self, task_id: str, *, outer: bool = False, root: Root
@@ -89,6 +138,13 @@ class DideWindowsDriver(HipercowDriver):
     def _path_dide_id(self, task_id: str, root: Root) -> Path:
         return root.path_task(task_id) / "dide_id"
 
+    # The parts of the batch scripts that are the same for every
+    # script; we compute these once per driver as this involves
+    # resolving the path to the root on the cluster.
+    @cached_property
+    def _template_data(self) -> dict[str, str]:
+        return _template_data_core_win(self.config)
+
 
 @hipercow_driver
 class LinuxWindowsDriver(HipercowDriver):
@@ -123,30 +179,71 @@ class LinuxWindowsDriver(HipercowDriver):
 
     def submit(
         self, task_id: str, resources: TaskResources | None, root: Root
+    ) -> None:
+        self.submit_many([task_id], resources, root)
+
+    def submit_many(
+        self,
+        task_ids: list[str],
+        resources: TaskResources | None,
+        root: Root,
+        *,
+        on_submit: Callable[[str], None] | None = None,
+    ) -> None:
+        cl = _web_client()
+        if not resources:
+            resources = self.resources(root).validate_resources(TaskResources())
+        linux_path = write_batch_task_run_linux(
+            self.config, root, core=self._template_data
+        )
+        for task_id in task_ids:
+            dide_id = cl.submit(
+                linux_path, task_id, resources=resources, args=[task_id]
+            )
+            with self._path_dide_id(task_id, root).open("w") as f:
+                f.write(dide_id)
+            if on_submit:
+                on_submit(task_id)
+
+    def cancel(self, task_ids: list[str], root: Root) -> list[bool]:
+        return _dide_cancel([self._path_dide_id(i, root) for i in task_ids])
+
+    def submit_workers(
+        self,
+        worker_ids: list[str],
+        resources: TaskResources | None,
+        root: Root,
     ) -> None:
         cl = _web_client()
-        linux_path = write_batch_task_run_linux(task_id, self.config, root)
         if not resources:
-            resources = self.resources().validate_resources(TaskResources())
-        dide_id = cl.submit(linux_path, task_id, resources=resources)
-        with self._path_dide_id(task_id, root).open("w") as f:
-            f.write(dide_id)
+            resources = self.resources(root).validate_resources(TaskResources())
+        for worker_id in worker_ids:
+            linux_path = write_batch_worker_run_linux(
+                worker_id, self.config, root, core=self._template_data
+            )
+            dide_id = cl.submit(
+                linux_path, f"worker-{worker_id}", resources=resources
+            )
+            with (root.path_worker(worker_id) / "dide_id").open("w") as f:
+                f.write(dide_id)
 
     def provision(self, name: str, id: str, root: Root) -> None:
         _dide_provision_linux(name, id, self.config, _web_client(), root)
 
-    def resources(self) -> ClusterResources:
-        # We should get this from the cluster itself but with caching
-        # not yet configured this seems unwise as we'll hit the
-        # cluster an additional time for every job submission rather
-        # than just once a session.
+    def resources(self, root: Root) -> ClusterResources:  # noqa: ARG002
+        # The portal does not report queues or memory, so these are
+        # fixed.  Its list of nodes does not say which are the Linux
+        # nodes either, so unlike on Windows we can't look up the
+        # largest of these and keep a fixed limit on cores too.
         queues = Queues(
             {"LinuxNodes"},
             default="LinuxNodes",
             test="LinuxNodes",
             build="LinuxNodes",
         )
-        return ClusterResources(queues=queues, max_cores=32, max_memory=512)
+        return ClusterResources(
+            queues=queues, max_cores=_DEFAULT_MAX_CORES, max_memory=512
+        )
 
     def task_log(
         self, task_id: str, *, outer: bool = False, root: Root
@@ -161,9 +258,83 @@ class LinuxWindowsDriver(HipercowDriver):
     def _path_dide_id(self, task_id: str, root: Root) -> Path:
         return root.path_task(task_id) / "dide_id"
 
+    # The parts of the batch scripts that are the same for every
+    # script; we compute these once per driver as this involves
+    # resolving the path to the root on the cluster.
+    @cached_property
+    def _template_data(self) -> dict[str, str]:
+        return _template_data_core_linux(self.config)
 
+
+# We keep one logged-in client for the lifetime of the process, so
+# that repeated operations (in the REPL, or when submitting many
+# tasks) don't each need to look up credentials in the keyring and
+# log in again.  The client logs in again by itself if the session
+# expires, fetching credentials afresh as it does so, which picks up
+# a changed password.  'hipercow dide authenticate' discards the
+# client, so that a change of user takes effect immediately.
+@cache
 def _web_client() -> DideWebClient:
-    credentials = fetch_credentials()
-    cl = DideWebClient(credentials)
+    cl = DideWebClient(fetch_credentials(), fetch_credentials=fetch_credentials)
     cl.login()
     return cl
+
+
+# We ask the portal how many cores the largest node has, but only
+# once a day, as this needs to be known every time a task is
+# submitted.  The answer is saved alongside the driver configuration.
+# If we can't reach the portal (e.g., while offline), we fall back on
+# the last known answer, or a typical node size, and save that
+# instead, so that we don't try the portal again on every submission
+# until the day is up.
+_RESOURCES_TTL = 24 * 60 * 60
+
+_DEFAULT_MAX_CORES = 32
+
+
+class DideResourcesCache(BaseModel):
+    time: float
+    max_cores: int
+
+
+def _dide_max_cores(name: str, root: Root) -> int:
+    path = root.path_configuration_cache(f"{name}-resources")
+    prev = None
+    if path.exists():
+        with path.open() as f:
+            prev = DideResourcesCache.model_validate_json(f.read())
+        if 0 <= time.time() - prev.time < _RESOURCES_TTL:
+            return prev.max_cores
+    try:
+        nodes = _web_client().load_nodes()
+    except Exception:
+        nodes = []
+    max_cores = max((x.total for x in nodes), default=0)
+    if max_cores < 1:
+        max_cores = prev.max_cores if prev else _DEFAULT_MAX_CORES
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as f:
+        f.write(
+            DideResourcesCache(
+                time=time.time(), max_cores=max_cores
+            ).model_dump_json()
+        )
+    return max_cores
+
+
+# The portal will cancel many jobs in a single request; we send them
+# in chunks so that no one request grows too large.
+_CANCEL_CHUNK_SIZE = 100
+
+
+def _dide_cancel(paths: list[Path]) -> list[bool]:
+    dide_ids = [(read_file_if_exists(p) or "").strip() for p in paths]
+    todo = [i for i in dide_ids if i]
+    result: dict[str, str] = {}
+    if todo:
+        cl = _web_client()
+        for i in range(0, len(todo), _CANCEL_CHUNK_SIZE):
+            result.update(cl.cancel(todo[i : i + _CANCEL_CHUNK_SIZE]))
+    # The portal reports 'OK' for jobs that it cancelled, and
+    # something else (e.g., 'WRONG_STATE') for jobs that it did not.
+    return [result.get(i) == "OK" for i in dide_ids]
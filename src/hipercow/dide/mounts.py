@@ -2,9 +2,12 @@ import csv
 import platform
 import re
 import subprocess
+import time
 from pathlib import Path
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+from hipercow.util import user_cache_dir
 
 
 # We use 'str' here and not 'Path' because we are interested in
@@ -51,6 +54,10 @@ class PathMap(BaseModel):
 
 def remap_path(path: Path, mounts: list[Mount]) -> PathMap:
     pos = [m for m in mounts if path.is_relative_to(m.local)]
+    if len(pos) != 1:
+        # The mounts may well have come from the cache, and be out of
+        # date, so make sure that we look again next time.
+        detect_mounts_clear()
     if len(pos) > 1:
         msg = "More than one plausible mount for local directory"
         raise Exception(msg)
@@ -71,12 +78,116 @@ def remap_path(path: Path, mounts: list[Mount]) -> PathMap:
     return PathMap(path=path, mount=mount, remote=remote, relative=relative_str)
 
 
-def detect_mounts() -> list[Mount]:
+def detect_mounts(*, refresh: bool = False) -> list[Mount]:
     system = platform.system()
+    key = _mounts_cache_key()
+    if not refresh:
+        mounts = _mounts_cache_get(key)
+        if mounts is not None:
+            return mounts
     if system == "Windows":
-        return _detect_mounts_windows()
+        mounts = _detect_mounts_windows()
+    elif system == "Linux":
+        mounts = _detect_mounts_linux()
     else:
-        return _detect_mounts_unix(system)
+        mounts = _detect_mounts_unix(system)
+    _mounts_cache_set(key, mounts)
+    return mounts
+
+
+def detect_mounts_clear() -> None:
+    _MOUNTS_CACHE.clear()
+    _path_mounts_cache(_mounts_cache_key()).unlink(missing_ok=True)
+
+
+# Finding mounts can be slow (on Windows we must start PowerShell,
+# which can take a few seconds) and we need them for most commands
+# that use the DIDE cluster, so we keep them for a short time, both
+# within this process and on disk for subsequent commands.  Several
+# machines may share a home directory (and so a cache directory), so
+# the cache is per machine as well as per platform.
+_MOUNTS_TTL = 60
+
+
+class _MountsCache(BaseModel):
+    time: float
+    mounts: list[Mount]
+
+
+_MOUNTS_CACHE: dict[str, _MountsCache] = {}
+
+
+def _mounts_cache_key() -> str:
+    key = f"{platform.system()}-{platform.node()}".lower()
+    return re.sub("[^a-z0-9._-]", "_", key)
+
+
+def _mounts_cache_get(key: str) -> list[Mount] | None:
+    now = time.time()
+    prev = _MOUNTS_CACHE.get(key)
+    if prev is None:
+        try:
+            with _path_mounts_cache(key).open() as f:
+                prev = _MountsCache.model_validate_json(f.read())
+        except (OSError, ValidationError):
+            return None
+        _MOUNTS_CACHE[key] = prev
+    if not 0 <= now - prev.time < _MOUNTS_TTL:
+        return None
+    return prev.mounts
+
+
+def _mounts_cache_set(key: str, mounts: list[Mount]) -> None:
+    data = _MountsCache(time=time.time(), mounts=mounts)
+    _MOUNTS_CACHE[key] = data
+    path = _path_mounts_cache(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as f:
+            f.write(data.model_dump_json())
+    except OSError:
+        pass
+
+
+def _path_mounts_cache(key: str) -> Path:
+    return user_cache_dir() / f"mounts-{key}.json"
+
+
+# On Linux we can read the mount table directly, which is much faster
+# than running 'mount'.
+def _detect_mounts_linux() -> list[Mount]:
+    try:
+        with Path("/proc/self/mountinfo").open() as f:
+            txt = f.read()
+    except OSError:
+        return _detect_mounts_unix("Linux")
+    return _parse_linux_mountinfo(txt)
+
+
+def _parse_linux_mountinfo(txt: str) -> list[Mount]:
+    ret = []
+    for line in txt.splitlines():
+        # Each line has a variable number of fields, then ' - ', then
+        # the filesystem type and the source; see proc(5)
+        fields, _, rest = line.partition(" - ")
+        fields_split = fields.split()
+        rest_split = rest.split()
+        if len(fields_split) < 5 or len(rest_split) < 2:  # noqa: PLR2004
+            continue
+        fstype, source = rest_split[:2]
+        m = re.match("^//([^@/]*@)?([^/]+)/(.+)$", _unescape_octal(source))
+        if fstype != "cifs" or not m:
+            continue
+        _, host, remote = m.groups()
+        local = Path(_unescape_octal(fields_split[4]))
+        ret.append(
+            Mount(host=_clean_dide_hostname(host), remote=remote, local=local)
+        )
+    return ret
+
+
+def _unescape_octal(x: str) -> str:
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m[1], 8)), x)
 
 
 def _detect_mounts_unix(system: str) -> list[Mount]:
@@ -1,6 +1,6 @@
 from taskwait import Task
 
-from hipercow.dide.web import DideWebClient
+from hipercow.dide.web import DideStatusPoller, DideWebClient
 from hipercow.root import Root
 
 
@@ -12,17 +12,25 @@ class ProvisionWaitWrapper(Task):
         provision_id: str,
         client: DideWebClient,
         dide_id: str,
+        *,
+        poller: DideStatusPoller | None = None,
     ):
         self.root = root
         self.name = name
         self.provision_id = provision_id
         self.client = client
         self.dide_id = dide_id
+        self.poller = poller
         self.status_waiting = {"created", "submitted"}
         self.status_running = {"running"}
 
+    # For a single job, asking about that job is cheaper than listing
+    # all the user's jobs, so we only use a poller if given one to
+    # share with other waits.
     def status(self) -> str:
-        return str(self.client.status_job(self.dide_id))
+        if self.poller is None:
+            return str(self.client.status_job(self.dide_id))
+        return str(self.poller.status(self.dide_id))
 
     def log(self) -> list[str] | None:
         path = self.root.path_provision_log(self.name, self.provision_id)
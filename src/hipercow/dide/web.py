@@ -1,17 +1,24 @@
 import base64
 import datetime
 import math
+import os
 import re
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
+from pathlib import Path
 from subprocess import list2cmdline
 from urllib.parse import urljoin
 
 import requests
 from defusedxml import ElementTree
+from pydantic import BaseModel
 
 from hipercow.__about__ import __version__ as hipercow_version
+from hipercow.profile import span
 from hipercow.resources import TaskResources
 from hipercow.task import TaskStatus
+from hipercow.util import truthy_envvar, user_cache_dir
 
 
 def encode64(x: str) -> str:
@@ -22,6 +29,10 @@ def decode64(x: str) -> str:
     return base64.b64decode(x).decode("utf-8")
 
 
+# Status codes returned by the portal when a session is no longer valid
+_SESSION_EXPIRED_STATUS = {401, 403}
+
+
 @dataclass
 class Credentials:
     username: str
@@ -50,30 +61,80 @@ class DideTaskStatus:
         return DideTaskStatus(*els)
 
 
+@dataclass
+class DideNodeLoad:
+    name: str
+    free: int
+    used: int
+    total: int
+
+    @staticmethod
+    def from_string(entry):
+        name, *cores = entry.strip().split("\t")
+        return DideNodeLoad(name, *[int(x) for x in cores])
+
+
 class DideHTTPClient(requests.Session):
     _has_logged_in = False
     _credentials: Credentials
+    _session_cache: Path | None
 
-    def __init__(self, credentials: Credentials):
+    def __init__(
+        self,
+        credentials: Credentials,
+        *,
+        session_cache: bool = True,
+        fetch_credentials: Callable[[], Credentials] | None = None,
+    ):
         super().__init__()
         self._credentials = credentials
+        self._fetch_credentials = fetch_credentials
+        self._session_cache = (
+            _session_cache_path(credentials.username) if session_cache else None
+        )
 
     def request(self, method, path, *args, public=False, **kwargs):
         if not public and not self._has_logged_in:
             self.login()
-        base_url = "https://mrcdata.dide.ic.ac.uk/hpc/"
-        url = urljoin(base_url, path)
-        headers = {"Accept": "text/plain"} if method == "POST" else {}
-        response = super().request(
-            method, url, *args, headers=headers, **kwargs
-        )
+        response = self._request(method, path, *args, **kwargs)
+        if not public and response.status_code in _SESSION_EXPIRED_STATUS:
+            # Our session cookie has expired (or been revoked) since
+            # we logged in, so log in again and retry, once.
+            self._session_discard()
+            self._refresh_credentials()
+            self.login()
+            response = self._request(method, path, *args, **kwargs)
         # To debug requests, you can do:
         # from requests_toolbelt.utils import dump
         # print(dump.dump_all(response).decode("utf-8"))
         response.raise_for_status()
         return response
 
+    # The password may have changed since we were created, so fetch
+    # credentials again (if we can) before logging in again.
+    def _refresh_credentials(self) -> None:
+        if self._fetch_credentials is None:
+            return
+        self._credentials = self._fetch_credentials()
+        if self._session_cache is not None:
+            self._session_cache = _session_cache_path(
+                self._credentials.username
+            )
+
+    def _request(self, method, path, *args, **kwargs):
+        base_url = "https://mrcdata.dide.ic.ac.uk/hpc/"
+        url = urljoin(base_url, path)
+        headers = {"Accept": "text/plain"} if method == "POST" else {}
+        with span(f"dide.request {path}"):
+            return super().request(
+                method, url, *args, headers=headers, **kwargs
+            )
+
+    @span("dide.login")
     def login(self) -> None:
+        if self._session_restore():
+            self._has_logged_in = True
+            return
         data = {
             "us": encode64(self._credentials.username),
             "pw": encode64(self._credentials.password),
@@ -85,10 +146,12 @@ class DideHTTPClient(requests.Session):
             msg = "You do not have HPC access - please contact Wes"
             raise Exception(msg)
         self._has_logged_in = True
+        self._session_save()
 
     def logout(self) -> None:
         self.request("GET", "logout.php", public=True)
         self._has_logged_in = False
+        self._session_discard()
 
     def username(self) -> str:
         return self._credentials.username
@@ -96,10 +159,90 @@ class DideHTTPClient(requests.Session):
     def logged_in(self) -> bool:
         return self._has_logged_in
 
+    # The session cache stores our cookies on disk, so that separate
+    # processes can share a session rather than each logging in.  The
+    # file is per-user, and we store nothing derived from the
+    # password; if the password has changed (or the session expired)
+    # the portal rejects the session and we log in again.
+    def _session_restore(self) -> bool:
+        if self._session_cache is None or not self._session_cache.exists():
+            return False
+        try:
+            with self._session_cache.open() as f:
+                session = DideSession.model_validate_json(f.read())
+        except Exception:
+            return False
+        now = time.time()
+        cookies = [
+            c for c in session.cookies if c.expires is None or c.expires > now
+        ]
+        if not cookies:
+            return False
+        for c in cookies:
+            self.cookies.set(
+                c.name,
+                c.value,
+                domain=c.domain,
+                path=c.path,
+                expires=c.expires,
+                secure=c.secure,
+            )
+        return True
+
+    def _session_save(self) -> None:
+        if self._session_cache is None:
+            return
+        cookies = [
+            DideSessionCookie(
+                name=c.name,
+                value=c.value or "",
+                domain=c.domain,
+                path=c.path,
+                expires=c.expires,
+                secure=c.secure,
+            )
+            for c in self.cookies
+        ]
+        session = DideSession(cookies=cookies)
+        path = self._session_cache
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(session.model_dump_json())
+
+    def _session_discard(self) -> None:
+        if self._session_cache is not None:
+            self._session_cache.unlink(missing_ok=True)
+
+
+class DideSessionCookie(BaseModel):
+    name: str
+    value: str
+    domain: str
+    path: str
+    expires: int | None
+    secure: bool
+
+
+class DideSession(BaseModel):
+    cookies: list[DideSessionCookie]
+
+
+def _session_cache_path(username: str) -> Path | None:
+    if not truthy_envvar("HIPERCOW_DIDE_SESSION_CACHE"):
+        return None
+    return user_cache_dir() / f"dide-session-{username}.json"
+
 
 class DideWebClient:
-    def __init__(self, credentials):
-        self._client = DideHTTPClient(credentials)
+    def __init__(
+        self, credentials, *, session_cache=True, fetch_credentials=None
+    ):
+        self._client = DideHTTPClient(
+            credentials,
+            session_cache=session_cache,
+            fetch_credentials=fetch_credentials,
+        )
         self._cluster = "wpia-hn"
 
     def login(self):
@@ -126,14 +269,20 @@ class DideWebClient:
         resources: TaskResources,
         *,
         workdir: str | None = None,
+        args: list[str] | None = None,
     ) -> str:
         data = _client_body_submit(
-            path, name, self._cluster, resources=resources, workdir=workdir
+            path,
+            name,
+            self._cluster,
+            resources=resources,
+            workdir=workdir,
+            args=args,
         )
         response = self._client.request("POST", "submit_1.php", data=data)
         return _client_parse_submit(response.text)
 
-    def cancel(self, dide_id: str) -> bool:
+    def cancel(self, dide_id: str | list[str]) -> dict[str, str]:
         data = _client_body_cancel(dide_id, self._cluster)
         response = self._client.request("POST", "cancel.php", data=data)
         return _client_parse_cancel(response.text)
@@ -143,6 +292,11 @@ class DideWebClient:
         response = self._client.request("POST", "showjobfail.php", data=data)
         return _client_parse_log(response.text)
 
+    def load_nodes(self) -> list[DideNodeLoad]:
+        data = _client_body_load_nodes(self._cluster)
+        response = self._client.request("POST", "shownodes.php", data=data)
+        return _client_parse_load_nodes(response.text)
+
     def status_user(self, state="*") -> list[DideTaskStatus]:
         data = _client_body_status_user(
             state, self._client.username(), self._cluster
@@ -162,9 +316,45 @@ class DideWebClient:
         return _client_parse_software(response.json())
 
 
+class DideStatusPoller:
+    """Shared status lookup for many cluster jobs.
+
+    Rather than asking the portal about each job separately, this
+    fetches the status of all of the user's jobs with a single call to
+    `DideWebClient.status_user`, at most once per `interval` seconds,
+    and answers queries about individual jobs from that listing.  Jobs
+    that are not (yet) in the listing fall back to
+    `DideWebClient.status_job`.
+
+    Args:
+        client: The client to fetch statuses with.
+        interval: The minimum time, in seconds, between refreshes.
+    """
+
+    def __init__(self, client: DideWebClient, interval: float = 1):
+        self.client = client
+        self.interval = interval
+        self._status: dict[str, TaskStatus] = {}
+        self._updated = -math.inf
+
+    def refresh(self) -> None:
+        self._status = {x.dide_id: x.status for x in self.client.status_user()}
+        self._updated = time.monotonic()
+
+    def status(self, dide_id: str) -> TaskStatus:
+        if time.monotonic() - self._updated >= self.interval:
+            self.refresh()
+        status = self._status.get(dide_id)
+        if status is None:
+            status = self.client.status_job(dide_id)
+        return status
+
+
 def check_access(credentials: Credentials) -> None:
     try:
-        DideWebClient(credentials).check_access()
+        # Never use a saved session here, so that we really check the
+        # credentials against the portal.
+        DideWebClient(credentials, session_cache=False).check_access()
     except Exception as e:
         msg = "login failed"
         raise Exception(msg) from e
@@ -190,14 +380,15 @@ def _client_body_submit(
     *,
     resources: TaskResources,
     workdir: str | None,
+    args: list[str] | None = None,
 ) -> dict:
     # The str here keeps mypy happy, this will be a string by this
     # point.
     template = str(resources.queue)
     if template == "LinuxNodes":
-        job_to_run = _call_quote_batch_path(path, "bash")
+        job_to_run = _call_quote_batch_path(path, "bash", args)
     else:
-        job_to_run = _call_quote_batch_path(path, "call")
+        job_to_run = _call_quote_batch_path(path, "call", args)
     data = {
         "cluster": encode64(cluster),
         "template": encode64(template),
@@ -261,6 +452,10 @@ def _client_body_status_user(state: str, username: str, cluster: str) -> dict:
     }
 
 
+def _client_body_load_nodes(cluster: str) -> dict:
+    return {"c": encode64(cluster), "h": "1"}
+
+
 def _client_query_status_job(dide_id: str, cluster: str) -> dict:
     return {"scheduler": cluster, "jobid": dide_id}
 
@@ -278,7 +473,7 @@ def _client_parse_submit(txt: str) -> str:
     return m.group(1)
 
 
-def _client_parse_cancel(txt: str):
+def _client_parse_cancel(txt: str) -> dict[str, str]:
     return dict([x.split("\t") for x in txt.strip().split("\n")])
 
 
@@ -290,7 +485,23 @@ def _client_parse_log(txt: str) -> str:
 
 
 def _client_parse_status_user(txt: str) -> list[DideTaskStatus]:
-    return [DideTaskStatus.from_string(x) for x in txt.strip().split("\n")]
+    lines = txt.strip().splitlines()
+    return [DideTaskStatus.from_string(x) for x in lines if x]
+
+
+# One line per node, with the node name and its free, used and total
+# cores, separated by tabs; we skip anything else (e.g., headers).
+# The head node is listed too, but we can't run anything there.
+def _client_parse_load_nodes(txt: str) -> list[DideNodeLoad]:
+    nodes = []
+    for x in txt.strip().splitlines():
+        try:
+            node = DideNodeLoad.from_string(x)
+        except (TypeError, ValueError):
+            continue
+        if not node.name.upper().endswith("-HN"):
+            nodes.append(node)
+    return nodes
 
 
 def _client_parse_status_job(txt: str) -> TaskStatus:
@@ -335,7 +546,9 @@ def _parse_dide_timestamp(time: str) -> datetime.datetime:
     )
 
 
-def _call_quote_batch_path(path: str, prefix: str) -> str:
+def _call_quote_batch_path(
+    path: str, prefix: str, args: list[str] | None = None
+) -> str:
     # NOTE: list2cmdline is undocumented but needed.
     # not documented https://github.com/conan-io/conan/pull/11553/
-    return f"{prefix} {list2cmdline([path])}"
+    return f"{prefix} {list2cmdline([path, *(args or [])])}"
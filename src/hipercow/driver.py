@@ -1,4 +1,6 @@
+import importlib
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 
 from pydantic import BaseModel
 
@@ -39,12 +41,45 @@ class HipercowDriver(ABC):
     ) -> None:
         pass  # pragma: no cover
 
+    # Drivers call 'on_submit' with each task id as soon as that task
+    # is submitted, so that if submission fails part way through we
+    # still know which tasks made it.
+    def submit_many(
+        self,
+        task_ids: list[str],
+        resources: TaskResources | None,
+        root: Root,
+        *,
+        on_submit: Callable[[str], None] | None = None,
+    ) -> None:
+        for task_id in task_ids:
+            self.submit(task_id, resources, root)
+            if on_submit:
+                on_submit(task_id)
+
+    def cancel(
+        self,
+        task_ids: list[str],  # noqa: ARG002
+        root: Root,  # noqa: ARG002
+    ) -> list[bool]:
+        msg = f"Driver '{self.name}' does not support cancelling tasks"
+        raise Exception(msg)
+
+    def submit_workers(
+        self,
+        worker_ids: list[str],  # noqa: ARG002
+        resources: TaskResources | None,  # noqa: ARG002
+        root: Root,  # noqa: ARG002
+    ) -> None:
+        msg = f"Driver '{self.name}' does not support workers"
+        raise Exception(msg)
+
     @abstractmethod
     def provision(self, name: str, id: str, root: Root) -> None:
         pass  # pragma: no cover
 
     @abstractmethod
-    def resources(self) -> ClusterResources:
+    def resources(self, root: Root) -> ClusterResources:
         pass  # pragma: no cover
 
     def task_log(
@@ -82,8 +117,22 @@ def hipercow_driver(cls: type[HipercowDriver]) -> type[HipercowDriver]:
 _DRIVERS: dict[str, type[HipercowDriver]] = {}
 
 
+# The drivers that come with hipercow, and the modules that register
+# them.  We import these only once a driver is used, because the DIDE
+# drivers pull in a lot (keyring, requests, etc.) that most commands,
+# and all tasks running on the cluster, never need.
+_DRIVER_MODULES = {
+    "dide-linux": "hipercow.dide.driver",
+    "dide-windows": "hipercow.dide.driver",
+    "example": "hipercow.example",
+    "local": "hipercow.local",
+}
+
+
 # TODO: this needs a better name as we will use it internally
 def _get_driver(name: str) -> type[HipercowDriver]:
+    if name not in _DRIVERS and name in _DRIVER_MODULES:
+        importlib.import_module(_DRIVER_MODULES[name])
     try:
         return _DRIVERS[name]
     except KeyError:
@@ -93,7 +142,7 @@ def _get_driver(name: str) -> type[HipercowDriver]:
 
 def list_drivers(root) -> list[str]:
     path = root.path_configuration(None)
-    return [x.name for x in path.glob("*")]
+    return [x.name for x in path.glob("*") if x.is_file()]
 
 
 def load_driver(driver: str | None, root: Root) -> HipercowDriver:
@@ -59,10 +59,20 @@ class ExampleDriver(HipercowDriver):
     ) -> None:
         ui.alert_info(f"submitting '{task_id}'")
 
+    def cancel(
+        self,
+        task_ids: list[str],
+        root: Root,  # noqa: ARG002
+    ) -> list[bool]:
+        # Nothing is actually running, so there is nothing to stop.
+        for task_id in task_ids:
+            ui.alert_info(f"cancelling '{task_id}'")
+        return [True for _ in task_ids]
+
     def provision(self, name: str, id: str, root: Root) -> None:
         provision_run(name, id, root)
 
-    def resources(self) -> ClusterResources:
+    def resources(self, root: Root) -> ClusterResources:  # noqa: ARG002
         return ClusterResources(
             queues=Queues.simple("default"),
             max_cores=1,
@@ -0,0 +1,309 @@
+"""A driver that runs tasks on this machine.
+
+Tasks submitted with this driver are queued within the root, and run
+in the background by a single runner process that evaluates them on
+a bounded pool of worker processes.  The runner is started on
+submission if it is not already running, and exits once the queue
+is empty, so tasks from separate submissions share the same cores.
+Each task takes as many of the available cores as it requests (via
+`TaskResources.cores`), and we start tasks, in order of submission,
+whenever there are enough free cores.  This is useful for trying
+things out without a cluster, and as a realistic stand-in when
+measuring throughput.
+"""
+
+import math
+import os
+import secrets
+import subprocess
+import sys
+import time
+import traceback
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor
+from concurrent.futures import wait as futures_wait
+from pathlib import Path
+from typing import IO
+
+from pydantic import BaseModel
+
+from hipercow import ui
+from hipercow.driver import HipercowDriver, hipercow_driver
+from hipercow.provision import provision_run
+from hipercow.resources import ClusterResources, Queues, TaskResources
+from hipercow.root import Root, open_root
+from hipercow.task import (
+    TaskStatus,
+    task_data_read,
+    task_status,
+    task_status_many,
+)
+from hipercow.task_eval import task_eval
+from hipercow.util import check_python_version, file_write_atomic
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class LocalDriverConfiguration(BaseModel):
+    """Configuration for the local driver.
+
+    Attributes:
+        cores: The number of cores to run tasks on.
+    """
+
+    cores: int
+
+
+def local_configuration(**kwargs) -> LocalDriverConfiguration:
+    version = kwargs.get("python_version")
+    if isinstance(version, str):
+        requested = check_python_version(version)
+        local = check_python_version(None)
+        if local != requested:
+            msg = (
+                f"Requested python version {version} "
+                f"is not the same as the local version {local}"
+            )
+            raise Exception(msg)
+    cores = kwargs.get("cores") or os.cpu_count() or 1
+    if cores < 1:
+        msg = f"'cores' must be at least 1, but was {cores}"
+        raise Exception(msg)
+    return LocalDriverConfiguration(cores=cores)
+
+
+@hipercow_driver
+class LocalDriver(HipercowDriver):
+    name = "local"
+    config: LocalDriverConfiguration
+
+    def __init__(self, config: LocalDriverConfiguration):
+        self.config = config
+
+    @staticmethod
+    def configure(
+        root: Root,  # noqa: ARG004
+        **kwargs,
+    ) -> LocalDriverConfiguration:
+        return local_configuration(**kwargs)
+
+    @staticmethod
+    def parse_configuration(data: str) -> LocalDriverConfiguration:
+        return LocalDriverConfiguration.model_validate_json(data)
+
+    def configuration(self) -> LocalDriverConfiguration:
+        return self.config
+
+    def show_configuration(self) -> None:
+        ui.li(f"[bold]Cores[/bold]: {self.config.cores}")
+
+    def submit(
+        self, task_id: str, resources: TaskResources | None, root: Root
+    ) -> None:
+        self.submit_many([task_id], resources, root)
+
+    def submit_many(
+        self,
+        task_ids: list[str],
+        resources: TaskResources | None,  # noqa: ARG002
+        root: Root,
+        *,
+        on_submit: Callable[[str], None] | None = None,
+    ) -> None:
+        # Mark tasks as submitted before queuing them, so that
+        # this can't race with the runner updating their status.
+        if on_submit:
+            for task_id in task_ids:
+                on_submit(task_id)
+        _local_submit(task_ids, self.config.cores, root)
+
+    def cancel(self, task_ids: list[str], root: Root) -> list[bool]:
+        # Tasks that have not yet started will be dropped by the
+        # runner once marked as cancelled, but we can't stop tasks
+        # that are already running.
+        status = task_status_many(task_ids, root)
+        return [s == TaskStatus.SUBMITTED for s in status]
+
+    def submit_workers(
+        self,
+        worker_ids: list[str],
+        resources: TaskResources | None,  # noqa: ARG002
+        root: Root,
+    ) -> None:
+        for worker_id in worker_ids:
+            path_log = root.path_worker(worker_id) / "log"
+            cmd = [sys.executable, "-m", "hipercow.worker"]
+            with path_log.open("a") as log:
+                subprocess.Popen(
+                    [*cmd, str(root.path), worker_id],
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=log,
+                    start_new_session=True,
+                )
+
+    def provision(self, name: str, id: str, root: Root) -> None:
+        provision_run(name, id, root)
+
+    def resources(self, root: Root) -> ClusterResources:  # noqa: ARG002
+        return ClusterResources(
+            queues=Queues.simple("local"),
+            max_cores=self.config.cores,
+            max_memory=_local_memory(),
+        )
+
+
+def _local_submit(task_ids: list[str], cores: int, root: Root) -> None:
+    _local_queue_add(task_ids, root)
+    # Start a runner unless one is already running.  The runner
+    # checks the queue again before exiting, so if it is about to
+    # exit it will still pick up these tasks.
+    lock = _local_lock(root)
+    if lock is not None:
+        _local_unlock(lock)
+        _local_runner_start(cores, root)
+
+
+def _local_runner_start(cores: int, root: Root) -> None:
+    path_log = _path_local(root) / "log"
+    cmd = [sys.executable, "-m", "hipercow.local", str(root.path), str(cores)]
+    with path_log.open("a") as log:
+        subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+# Runs tasks from the queue until it is empty and no tasks are
+# running.  Only one runner runs at a time for each root, so that
+# separate submissions share the same cores; any other runner exits
+# straight away.
+def _local_run(cores: int, root: Root, *, poll: float = 0.1) -> None:
+    lock = _local_lock(root)
+    if lock is None:
+        return
+    need: dict[str, int] = {}
+    pending: list[str] = []
+    running: dict[Future, str] = {}
+    free = cores
+    with ProcessPoolExecutor(max_workers=cores) as pool:
+        while True:
+            for i in _local_queue_take(root):
+                need[i] = _local_task_cores(i, cores, root)
+                pending.append(i)
+            if not pending and not running:
+                # Release the lock before we look at the queue for
+                # the last time, so that anything queued after this
+                # either is seen here or starts a new runner.
+                _local_unlock(lock)
+                if not _local_queue_list(root):
+                    break
+                lock = _local_lock(root)
+                if lock is None:
+                    break
+                continue
+            # Start every task that fits, in order, letting smaller
+            # tasks fill any gaps left by larger ones.  Tasks that
+            # were cancelled while queued are dropped.
+            waiting = []
+            for i in pending:
+                if need[i] > free:
+                    waiting.append(i)
+                elif task_status(i, root).is_runnable():
+                    free -= need[i]
+                    running[pool.submit(_local_eval, i, root.path)] = i
+                else:
+                    need.pop(i)
+            pending = waiting
+            done, _ = futures_wait(
+                running, timeout=poll, return_when=FIRST_COMPLETED
+            )
+            for f in done:
+                free += need.pop(running.pop(f))
+
+
+def _local_eval(task_id: str, path: Path) -> None:
+    try:
+        task_eval(task_id, capture=True, root=path)
+    except Exception:
+        print(f"Error running task '{task_id}'", file=sys.stderr)
+        traceback.print_exc()
+
+
+def _local_task_cores(task_id: str, cores: int, root: Root) -> int:
+    resources = task_data_read(task_id, root).resources
+    n = resources.cores if resources else 1
+    return cores if n == math.inf else min(int(n), cores)
+
+
+def _local_memory() -> int:
+    try:
+        size = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 32
+    return max(size // 1024**3, 1)
+
+
+def _path_local(root: Root) -> Path:
+    return root.path_base() / "local"
+
+
+# Each submission is queued as a file listing its tasks, named so
+# that sorting the queue gives the order of submission.
+def _local_queue_add(task_ids: list[str], root: Root) -> None:
+    path = _path_local(root) / "queue"
+    path.mkdir(parents=True, exist_ok=True)
+    name = f"{time.time_ns():020d}-{secrets.token_hex(4)}"
+    file_write_atomic(path / name, "".join(f"{i}\n" for i in task_ids))
+
+
+def _local_queue_list(root: Root) -> list[Path]:
+    path = _path_local(root) / "queue"
+    if not path.exists():
+        return []
+    return sorted(p for p in path.iterdir() if p.suffix != ".tmp")
+
+
+def _local_queue_take(root: Root) -> list[str]:
+    task_ids = []
+    for p in _local_queue_list(root):
+        with p.open() as f:
+            task_ids.extend(f.read().split())
+        p.unlink()
+    return task_ids
+
+
+# The runner holds an exclusive lock on this file while it runs.  The
+# operating system releases the lock if the runner dies, so unlike a
+# pid file this can never be left stale.
+def _local_lock(root: Root) -> IO | None:
+    path = _path_local(root) / "lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = path.open("w")
+    try:
+        if sys.platform == "win32":
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _local_unlock(f: IO) -> None:
+    if sys.platform == "win32":
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    f.close()
+
+
+if __name__ == "__main__":
+    _local_run(int(sys.argv[2]), open_root(sys.argv[1]))
@@ -0,0 +1,124 @@
+"""Control how often we check on tasks while waiting for them."""
+
+import time
+from dataclasses import dataclass
+from typing import TypeAlias
+
+import taskwait
+
+from hipercow.watch import DirectoryWatcher
+
+
+@dataclass(frozen=True)
+class AdaptivePoll:
+    """Adaptive polling interval.
+
+    Tasks can sit in a queue for hours before starting, and checking
+    on them every second over that time is wasteful (each check is a
+    trip to a network share, or to the cluster portal).  With this
+    policy we start by polling quickly, then back off geometrically
+    while the task's status remains unchanged and waiting (e.g.,
+    `submitted`), up to a ceiling.  As soon as the status changes
+    (e.g., to `running`) we return to polling quickly.
+
+    Attributes:
+        initial: The initial interval, in seconds.
+        factor: The factor to increase the interval by at each check.
+        maximum: The longest interval, in seconds.
+    """
+
+    initial: float = 1
+    factor: float = 1.5
+    maximum: float = 60
+
+
+PollPolicy: TypeAlias = float | AdaptivePoll
+"""How often to poll; either a fixed interval in seconds or an
+[`AdaptivePoll`][hipercow.poll.AdaptivePoll]."""
+
+
+def parse_poll(value: str | float) -> PollPolicy:
+    """Parse a polling policy, e.g., from the command line.
+
+    Args:
+        value: Either a number of seconds, or the string `adaptive`.
+
+    Returns:
+        The polling policy.
+    """
+    if value == "adaptive":
+        return AdaptivePoll()
+    try:
+        return float(value)
+    except ValueError:
+        msg = f"Expected a number or 'adaptive' for 'poll', but was '{value}'"
+        raise Exception(msg) from None
+
+
+def taskwait_poll(
+    task: taskwait.Task,
+    poll: PollPolicy = 1,
+    *,
+    watcher: DirectoryWatcher | None = None,
+    **kwargs,
+) -> taskwait.Result:
+    """Wait for a task, with control over the time between checks.
+
+    This is a replacement for `taskwait.taskwait` that supports
+    adaptive polling and waking early when a watched directory
+    changes.
+
+    Args:
+        task: The task to wait on.
+        poll: The polling policy.
+        watcher: Optionally, a watcher for the directory where the
+            task's status is written; we check the status as soon as
+            a new file appears there.
+        **kwargs (Any): Additional arguments to `taskwait.taskwait`.
+
+    Returns:
+        The result of waiting.
+    """
+    wrapped = _PollingTask(task, poll, watcher)
+    return taskwait.taskwait(wrapped, poll=0, **kwargs)
+
+
+# We do all the waiting between checks here, rather than in taskwait,
+# which only supports a fixed interval.
+class _PollingTask(taskwait.Task):
+    def __init__(
+        self,
+        task: taskwait.Task,
+        poll: PollPolicy,
+        watcher: DirectoryWatcher | None,
+    ):
+        self.task = task
+        self.poll = poll
+        self.watcher = watcher
+        self.status_waiting = task.status_waiting
+        self.status_running = task.status_running
+        self.interval = poll.initial if isinstance(poll, AdaptivePoll) else poll
+        self._status: str | None = None
+
+    def status(self) -> str:
+        if self._status is not None:
+            if self.watcher is None:
+                time.sleep(self.interval)
+            else:
+                self.watcher.wait(self.interval)
+        status = self.task.status()
+        if isinstance(self.poll, AdaptivePoll):
+            if status == self._status and status in self.status_waiting:
+                self.interval = min(
+                    self.interval * self.poll.factor, self.poll.maximum
+                )
+            else:
+                self.interval = self.poll.initial
+        self._status = status
+        return status
+
+    def log(self) -> list[str] | None:
+        return self.task.log()
+
+    def has_log(self) -> bool:
+        return self.task.has_log()
@@ -0,0 +1,137 @@
+"""Time the phases of slow operations.
+
+When something is slow (e.g., submitting a bundle of tasks), it is
+hard to tell from outside where the time goes: reading credentials,
+logging in, writing scripts, or talking to the cluster portal.  Set
+the environment variable `HIPERCOW_PROFILE=1` and we will time each of
+these phases, and print a summary of the times to stderr as
+`hipercow` exits.
+
+With profiling off (the default), timing a span costs no more than
+checking the environment variable.
+"""
+
+import atexit
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TextIO
+
+from hipercow.util import percentile, truthy_envvar
+
+_SPANS: dict[str, list[float]] = {}
+_REPORT_REGISTERED = False
+
+
+@dataclass
+class SpanSummary:
+    """Summary of the times taken by a span.
+
+    Attributes:
+        name: The name of the span.
+        count: The number of times the span was run.
+        total: The total time taken, in seconds.
+        p50: The median time taken, in seconds.
+        p95: The 95th percentile of the time taken, in seconds.
+    """
+
+    name: str
+    count: int
+    total: float
+    p50: float
+    p95: float
+
+    @staticmethod
+    def from_times(name: str, times: list[float]) -> "SpanSummary":
+        times = sorted(times)
+        return SpanSummary(
+            name=name,
+            count=len(times),
+            total=sum(times),
+            p50=percentile(times, 0.5),
+            p95=percentile(times, 0.95),
+        )
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block of code, if profiling.
+
+    Use this as a context manager around a phase of work:
+
+    ```python
+    with span("task_create.submit"):
+        dr.submit_many(task_ids, resources, root)
+    ```
+
+    Times for spans of the same name are pooled, so use names that
+    describe the phase rather than the particular call.
+
+    Args:
+        name: The name of the span.
+    """
+    if not truthy_envvar("HIPERCOW_PROFILE"):
+        yield
+        return
+    _register_report()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _SPANS.setdefault(name, []).append(time.perf_counter() - t0)
+
+
+# We register the report when the first span starts, rather than on
+# import, but only once; spans can be nested so we can't tell from
+# '_SPANS' whether this has been done.
+def _register_report() -> None:
+    global _REPORT_REGISTERED  # noqa: PLW0603
+    if not _REPORT_REGISTERED:
+        atexit.register(profile_report)
+        _REPORT_REGISTERED = True
+
+
+def profile_summary() -> list[SpanSummary]:
+    """Summarise the times recorded so far.
+
+    Returns:
+        A summary per span, in the order that the spans were first
+        run.
+    """
+    return [SpanSummary.from_times(k, v) for k, v in _SPANS.items()]
+
+
+def profile_report(file: TextIO | None = None) -> None:
+    """Print a summary of the times recorded so far.
+
+    This is called automatically at exit when profiling.
+
+    Args:
+        file: Where to print the report; the default is stderr, so
+            that the report does not mix with the output of commands.
+
+    Returns:
+        Nothing, called for side effects only.
+    """
+    summary = profile_summary()
+    if not summary:
+        return
+    file = file or sys.stderr
+    width = max(len("span"), *(len(x.name) for x in summary))
+    cols = ("count", "total", "p50", "p95")
+    print(f"{'span':<{width}}" + "".join(f"{x:>10}" for x in cols), file=file)
+    for x in summary:
+        times = (x.total, x.p50, x.p95)
+        print(
+            f"{x.name:<{width}}{x.count:>10}"
+            + "".join(f"{_format_time(t):>10}" for t in times),
+            file=file,
+        )
+
+
+def _format_time(t: float) -> str:
+    if t < 1:
+        return f"{1000 * t:.1f}ms"
+    return f"{t:.2f}s"
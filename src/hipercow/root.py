@@ -5,7 +5,7 @@ from pathlib import Path
 from typing import TypeAlias
 
 from hipercow import ui
-from hipercow.util import find_file_descend
+from hipercow.util import file_create, find_file_descend
 
 
 def init(path: str | Path) -> None:
@@ -46,6 +46,9 @@ def init(path: str | Path) -> None:
         raise Exception(msg)
 
     dest.mkdir(parents=True)
+    # An empty index marks the root as indexed from the start; roots
+    # created by older versions have no index until it is rebuilt.
+    file_create(dest / "index")
     _add_gitignore(dest.parent)
     ui.alert_success(f"Initialised hipercow at '{path.resolve()}'")
 
@@ -81,13 +84,22 @@ class Root:
     def path_task_log(self, task_id: str) -> Path:
         return self.path_task(task_id) / "log"
 
+    def path_task_claim(self, task_id: str) -> Path:
+        return self.path_task(task_id) / "claim"
+
     def path_recent(self) -> Path:
         return self.path_base() / "recent"
 
+    def path_task_index(self) -> Path:
+        return self.path_base() / "index"
+
     def path_configuration(self, name: str | None) -> Path:
         hostname = platform.node()
         return self.path_base() / "config" / hostname / (name or ".")
 
+    def path_configuration_cache(self, name: str) -> Path:
+        return self.path_configuration(None) / ".cache" / name
+
     def path_environment(
         self, name: str | None, *, relative: bool = False
     ) -> Path:
@@ -128,6 +140,24 @@ class Root:
     def path_bundle(self, name: str | None) -> Path:
         return self.path_base() / "bundles" / (name or ".")
 
+    def path_bundle_partial(self, name: str) -> Path:
+        return self.path_base() / "bundles-partial" / name
+
+    def path_runner(self, runner_id: str, *, relative: bool = False) -> Path:
+        return self.path_base(relative=relative) / "runners" / runner_id
+
+    def path_worker_queue(self) -> Path:
+        return self.path_base() / "queue"
+
+    def path_worker(
+        self, worker_id: str | None, *, relative: bool = False
+    ) -> Path:
+        base = self.path_base(relative=relative)
+        return base / "workers" / (worker_id or ".")
+
+    def path_worker_claimed(self, worker_id: str) -> Path:
+        return self.path_worker(worker_id) / "claimed"
+
 
 OptionalRoot: TypeAlias = None | str | Path | Root
 """Optional root type, for user-facing functions.
@@ -1,15 +1,22 @@
 """Functions for interacting with tasks."""
 
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from enum import Flag, auto
+from pathlib import Path
 
 import taskwait
 from pydantic import BaseModel
 
+from hipercow import ui
 from hipercow.driver import load_driver
+from hipercow.poll import PollPolicy, taskwait_poll
 from hipercow.resources import TaskResources
 from hipercow.root import OptionalRoot, Root, open_root
+from hipercow.usage import TaskUsage
 from hipercow.util import file_create, read_file_if_exists
+from hipercow.watch import directory_watcher
 
 
 class TaskStatus(Flag):
@@ -63,6 +70,7 @@ class TaskTimes(BaseModel):
     created: float
     started: float | None
     finished: float | None
+    usage: TaskUsage | None = None
 
 
 def _read_task_times(task_id: str, root: Root):
@@ -112,15 +120,142 @@ def task_status(task_id: str, root: OptionalRoot = None) -> TaskStatus:
     """
     check_task_id(task_id)
     root = open_root(root)
-    path = root.path_task(task_id)
-    if not path.exists():
+    return _task_status_read(task_id, root)
+
+
+def task_status_many(
+    task_ids: list[str],
+    root: OptionalRoot = None,
+    *,
+    workers: int | None = None,
+) -> list[TaskStatus]:
+    """Read the status of several tasks.
+
+    This is equivalent to calling `task_status` on each task, but
+    opens the root only once and reads statuses concurrently, which
+    is much faster on high-latency (network) filesystems.
+
+    Args:
+        task_ids: The task identifiers to check.
+        root: The root, or if not given search from the current directory.
+        workers: The maximum number of threads to use when reading
+            statuses from disk.  If not given, we use the value of the
+            environment variable `HIPERCOW_STATUS_WORKERS`, falling
+            back on 8.  Use `workers=1` to read statuses serially.
+
+    Returns:
+        The status of each task, in the same order as `task_ids`.
+    """
+    for i in task_ids:
+        check_task_id(i)
+    root = open_root(root)
+    workers = _status_workers(workers)
+    cache = _terminal_status_cache(root)
+    if root.path not in _TERMINAL_STATUS_LOADED and any(
+        i not in cache for i in task_ids
+    ):
+        _terminal_status_cache_load(root, _task_index_read(root))
+
+    ret = [cache.get(i) for i in task_ids]
+    todo = [task_ids[k] for k, s in enumerate(ret) if s is None]
+    if len(todo) > 1 and workers > 1:
+        with ThreadPoolExecutor(min(workers, len(todo))) as pool:
+            found = list(pool.map(lambda i: _task_status_read(i, root), todo))
+    else:
+        found = [_task_status_read(i, root) for i in todo]
+    # Record terminal statuses that we found on disk in the index, so
+    # that the next process can seed its cache from there rather than
+    # reading them again.
+    _task_index_append_many(
+        [(i, s) for i, s in zip(todo, found, strict=True) if s.is_terminal()],
+        root,
+    )
+    it = iter(found)
+    return [s if s is not None else next(it) for s in ret]
+
+
+def task_times_many(
+    task_ids: list[str],
+    root: OptionalRoot = None,
+    *,
+    workers: int | None = None,
+) -> list[TaskTimes]:
+    """Read the times of several tasks.
+
+    Times are read concurrently, as for
+    [`task_status_many`][hipercow.task.task_status_many].
+
+    Args:
+        task_ids: The task identifiers to read times for.
+        root: The root, or if not given search from the current directory.
+        workers: The maximum number of threads to use when reading
+            times from disk; see `task_status_many` for details.
+
+    Returns:
+        The times of each task, in the same order as `task_ids`.
+    """
+    for i in task_ids:
+        check_task_id(i)
+    root = open_root(root)
+    workers = _status_workers(workers)
+    if len(task_ids) > 1 and workers > 1:
+        with ThreadPoolExecutor(min(workers, len(task_ids))) as pool:
+            return list(pool.map(lambda i: _read_task_times(i, root), task_ids))
+    return [_read_task_times(i, root) for i in task_ids]
+
+
+def _status_workers(workers: int | None) -> int:
+    if workers is None:
+        workers = int(os.environ.get("HIPERCOW_STATUS_WORKERS", "8"))
+    if workers < 1:
+        msg = f"'workers' must be at least 1, but was {workers}"
+        raise Exception(msg)
+    return workers
+
+
+# We read the status with a single directory listing, rather than
+# testing for each status file in turn, because each test is a round
+# trip to the server on a network filesystem.
+def _task_status_read(task_id: str, root: Root) -> TaskStatus:
+    cache = _terminal_status_cache(root)
+    if task_id in cache:
+        return cache[task_id]
+    try:
+        contents = set(os.listdir(root.path_task(task_id)))
+    except FileNotFoundError:
         return TaskStatus.MISSING
     for v, p in STATUS_FILE_MAP.items():
-        if (path / p).exists():
+        if p in contents:
+            if v.is_terminal():
+                cache[task_id] = v
             return v
     return TaskStatus.CREATED
 
 
+# Once a task reaches a terminal status it can never change, so we
+# remember these for the lifetime of the process, per root.  When
+# reading statuses in bulk we also seed this from the task index (once
+# per process), and record any terminal statuses found on disk there,
+# so that finished tasks cost nothing to look up even in a fresh
+# process.
+_TERMINAL_STATUS_CACHE: dict[Path, dict[str, TaskStatus]] = {}
+_TERMINAL_STATUS_LOADED: set[Path] = set()
+
+
+def _terminal_status_cache(root: Root) -> dict[str, TaskStatus]:
+    return _TERMINAL_STATUS_CACHE.setdefault(root.path, {})
+
+
+def _terminal_status_cache_load(
+    root: Root, index: dict[str, TaskStatus] | None
+) -> None:
+    if index is not None:
+        _terminal_status_cache(root).update(
+            (k, v) for k, v in index.items() if v.is_terminal()
+        )
+    _TERMINAL_STATUS_LOADED.add(root.path)
+
+
 def task_log(
     task_id: str, *, outer: bool = False, root: OptionalRoot = None
 ) -> str | None:
@@ -160,8 +295,16 @@ def task_log(
     return dr.task_log(task_id, outer=outer, root=root)
 
 
+# Only the submitting side (creating, submitting and cancelling
+# tasks) records status changes in the task index, with 'index=True';
+# changes made while running tasks on the cluster are read from disk.
 def set_task_status(
-    task_id: str, status: TaskStatus, value: str | None, root: Root
+    task_id: str,
+    status: TaskStatus,
+    value: str | None,
+    root: Root,
+    *,
+    index: bool = False,
 ):
     path = root.path_task(task_id) / STATUS_FILE_MAP[status]
     if value is None:
@@ -169,6 +312,10 @@ def set_task_status(
     else:
         with path.open("w") as f:
             f.write(value)
+    if status.is_terminal():
+        _terminal_status_cache(root)[task_id] = status
+    if index:
+        _task_index_append(task_id, status, root)
 
 
 class TaskData(BaseModel):
@@ -181,12 +328,16 @@ class TaskData(BaseModel):
     envvars: dict[str, str]
 
 
-def task_data_write(data: TaskData, root: Root) -> None:
+# Pass 'index=False' when creating many tasks, and record them in the
+# index together afterwards with '_task_index_append_many'.
+def task_data_write(data: TaskData, root: Root, *, index: bool = True) -> None:
     task_id = data.task_id
     path_task_dir = root.path_task(task_id)
     path_task_dir.mkdir(parents=True, exist_ok=True)
     with root.path_task_data(task_id).open("w") as f:
         f.write(data.model_dump_json())
+    if index:
+        _task_index_append(task_id, TaskStatus.CREATED, root)
 
 
 def task_data_read(task_id: str, root: Root) -> TaskData:
@@ -217,12 +368,16 @@ def task_list(
 ) -> list[str]:
     """List known tasks.
 
+    If the root has a task index (see `task_index_rebuild`), tasks
+    are listed from that, in order of creation.  Otherwise we fall
+    back on searching the filesystem for tasks.
+
     Warning:
-      This function could take a long time to execute on large
-      projects with many tasks, particularly on large file systems.
-      Because the tasks are just returned as a list of strings, it may
-      not be terribly useful either.  Think before building a workflow
-      around this.
+      Without an index, this function could take a long time to
+      execute on large projects with many tasks, particularly on
+      large file systems.  Because the tasks are just returned as a
+      list of strings, it may not be terribly useful either.  Think
+      before building a workflow around this.
 
     Args:
       root: The root to search from.
@@ -233,11 +388,141 @@ def task_list(
 
     """
     root = open_root(root)
+    index = _task_index_read(root)
+    if index is None:
+        ids = _task_list_scan(root)
+        if with_status is not None:
+            status = task_status_many(ids, root)
+            ids = [
+                i for i, s in zip(ids, status, strict=False) if s & with_status
+            ]
+        return ids
+    if with_status is None:
+        return list(index.keys())
+    _terminal_status_cache_load(root, index)
+    # Terminal statuses recorded in the index can't change, so we can
+    # trust them; anything else might have moved on without the index
+    # hearing about it (tasks running on the cluster don't write to
+    # the index), so we check these on disk.
+    check = [i for i, s in index.items() if not s.is_terminal()]
+    index.update(zip(check, task_status_many(check, root), strict=False))
+    return [i for i, s in index.items() if s & with_status]
+
+
+def _task_list_scan(root: Root) -> list[str]:
     contents = root.path_task(None).rglob("data")
-    ids = ["".join(el.parts[-3:-1]) for el in contents if el.is_file()]
-    if with_status is not None:
-        ids = [i for i in ids if task_status(i, root) & with_status]
-    return ids
+    return ["".join(el.parts[-3:-1]) for el in contents if el.is_file()]
+
+
+# The index is an append-only file with one line per status change,
+# each of the form '<task_id> <status>'.  Tasks appear in the order
+# that they were created.  We only ever append to an index that
+# already exists (created by 'init' or 'task_index_rebuild'), so that
+# an index is never silently incomplete for roots that predate it.
+#
+# Appends are not atomic between clients of a network share, so we
+# only append from the machine that creates and submits tasks, never
+# from tasks running on the cluster, which would be thousands of
+# concurrent writers.  The index therefore knows about tasks and
+# their submission (and cancellation), and about terminal statuses
+# once 'task_status_many' has read them from disk; other statuses
+# reached while running need to be read from disk.
+# 'task_index_rebuild' records the current status of every task.
+# Even so, we skip lines that we can't parse when reading.
+_TASK_INDEX_ORDER = {
+    TaskStatus.CREATED: 0,
+    TaskStatus.SUBMITTED: 1,
+    TaskStatus.RUNNING: 2,
+    TaskStatus.SUCCESS: 3,
+    TaskStatus.FAILURE: 3,
+    TaskStatus.CANCELLED: 3,
+}
+
+
+def _task_index_append(task_id: str, status: TaskStatus, root: Root) -> None:
+    _task_index_append_many([(task_id, status)], root)
+
+
+# Several entries are written with a single append, which is one
+# round trip to the server however many tasks there are.
+def _task_index_append_many(
+    entries: list[tuple[str, TaskStatus]], root: Root
+) -> None:
+    if not entries:
+        return
+    try:
+        fd = os.open(root.path_task_index(), os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        return
+    try:
+        os.write(fd, "".join(f"{i} {s}\n" for i, s in entries).encode())
+    finally:
+        os.close(fd)
+
+
+def _task_index_read(root: Root) -> dict[str, TaskStatus] | None:
+    path = root.path_task_index()
+    if not path.exists():
+        return None
+    ret: dict[str, TaskStatus] = {}
+    with path.open() as f:
+        for line in f:
+            entry = _task_index_parse(line)
+            if entry is None:
+                continue
+            task_id, status = entry
+            prev = ret.get(task_id)
+            # Status changes can be recorded out of order (e.g., a
+            # task that starts before the submission is recorded), so
+            # keep the most advanced status seen.
+            if (
+                prev is None
+                or _TASK_INDEX_ORDER[status] > _TASK_INDEX_ORDER[prev]
+            ):
+                ret[task_id] = status
+    return ret
+
+
+def _task_index_parse(line: str) -> tuple[str, TaskStatus] | None:
+    task_id, _, status = line.strip().partition(" ")
+    if not is_valid_task_id(task_id):
+        return None
+    try:
+        return task_id, TaskStatus[status.upper()]
+    except KeyError:
+        return None
+
+
+def task_index_rebuild(root: OptionalRoot = None) -> None:
+    """Rebuild the task index.
+
+    The task index lets us list tasks without searching through the
+    whole task directory, which can be very slow on network
+    filesystems with many tasks.  It is kept up to date as tasks are
+    created and change status, but you may need to rebuild it if it
+    becomes corrupt, or to create one for a root initialised by an
+    older version of hipercow.
+
+    Args:
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        Nothing, called for side effects only.
+
+    """
+    root = open_root(root)
+    ids = _task_list_scan(root)
+    time = [root.path_task_data(i).stat().st_ctime for i in ids]
+    ids = [i for _, i in sorted(zip(time, ids, strict=False))]
+
+    path = root.path_task_index()
+    status = task_status_many(ids, root)
+    path_tmp = path.with_name(f"{path.name}.tmp")
+    with path_tmp.open("w") as f:
+        for i, s in zip(ids, status, strict=False):
+            f.write(f"{i} {s}\n")
+    path_tmp.replace(path)
+    ui.alert_success(f"Rebuilt task index with {len(ids)} tasks")
 
 
 class TaskWaitWrapper(taskwait.Task):
@@ -263,6 +548,8 @@ def task_wait(
     *,
     root: OptionalRoot = None,
     allow_created: bool = False,
+    poll: PollPolicy = 1,
+    watch: bool = True,
     **kwargs,
 ) -> bool:
     """Wait for a task to complete.
@@ -275,6 +562,14 @@ def task_wait(
             that is `CREATED` (and not `SUBMITTED`) will not start; if
             you pass `allow_created=True` it is expected that you are
             also manually evaluating this task!
+        poll: Time to wait between checks on the task, in seconds,
+            or an [`AdaptivePoll`][hipercow.poll.AdaptivePoll] to
+            back off while the task is queued.
+        watch: Watch the task directory for changes in status, so
+            that we notice a change as soon as it happens, rather
+            than at the next poll.  See `hipercow.watch` for details;
+            on network filesystems this falls back to polling.  With
+            a watcher, `poll` is the longest time between checks.
         **kwargs (Any): Additional arguments to `taskwait.taskwait`.
 
     Returns:
@@ -286,8 +581,6 @@ def task_wait(
     """
     check_task_id(task_id)
     root = open_root(root)
-    task = TaskWaitWrapper(task_id, root)
-
     status = task_status(task_id, root)
 
     if status == TaskStatus.CREATED and not allow_created:
@@ -297,12 +590,107 @@ def task_wait(
     if status.is_terminal():
         return status == TaskStatus.SUCCESS
 
-    result = taskwait.taskwait(task, **kwargs)
+    task = TaskWaitWrapper(task_id, root)
+    w = directory_watcher(root.path_task(task_id), "status-") if watch else None
+    if w is None:
+        result = taskwait_poll(task, poll, **kwargs)
+    else:
+        with w:
+            result = taskwait_poll(task, poll, watcher=w, **kwargs)
     status = TaskStatus[result.status.upper()]
 
     return status == TaskStatus.SUCCESS
 
 
+def task_cancel(task_id: str, root: OptionalRoot = None) -> bool:
+    """Cancel a task.
+
+    Only tasks that are `SUBMITTED` or `RUNNING` can be cancelled;
+    tasks in any other state are left alone.
+
+    Args:
+        task_id: The task to cancel.
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        `True` if the task was cancelled, otherwise `False`.
+
+    """
+    return task_cancel_many([task_id], root)[0]
+
+
+def task_cancel_many(
+    task_ids: list[str], root: OptionalRoot = None
+) -> list[bool]:
+    """Cancel several tasks.
+
+    This is equivalent to calling `task_cancel` on each task, but
+    tasks are passed to their driver together so that they can be
+    cancelled at once (for the DIDE cluster this is a single request
+    to the portal per chunk of tasks).  Cancelled tasks are marked as
+    `CANCELLED`.
+
+    Args:
+        task_ids: The tasks to cancel.
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        For each task, in the same order as `task_ids`, `True` if the
+        task was cancelled, otherwise `False`.
+
+    """
+    for i in task_ids:
+        check_task_id(i)
+    root = open_root(root)
+    status = task_status_many(task_ids, root)
+    by_driver: dict[str, list[str]] = {}
+    queued = []
+    for i, s in zip(task_ids, status, strict=False):
+        if not s & _CANCELLABLE:
+            continue
+        driver = task_driver(i, root)
+        if driver:
+            by_driver.setdefault(driver, []).append(i)
+        elif s == TaskStatus.SUBMITTED:
+            # Tasks waiting in the worker queue have no driver
+            queued.append(i)
+
+    cancelled = set()
+    for i in queued:
+        # We can cancel these as long as no worker has claimed them yet.
+        if _task_queue_remove(i, root):
+            set_task_status(i, TaskStatus.CANCELLED, None, root, index=True)
+            cancelled.add(i)
+    for driver, ids in by_driver.items():
+        dr = load_driver(driver, root)
+        for i, ok in zip(ids, dr.cancel(ids, root), strict=False):
+            if ok:
+                set_task_status(i, TaskStatus.CANCELLED, None, root, index=True)
+                cancelled.add(i)
+    return [i in cancelled for i in task_ids]
+
+
+_CANCELLABLE = TaskStatus.SUBMITTED | TaskStatus.RUNNING
+
+
+# Tasks to be run by workers are queued by creating an empty file,
+# named after the task, in the queue directory.  Workers claim tasks
+# by renaming these files away (see hipercow.worker).
+def _task_queue_add(task_ids: list[str], root: Root) -> None:
+    path = root.path_worker_queue()
+    path.mkdir(parents=True, exist_ok=True)
+    for task_id in task_ids:
+        file_create(path / task_id)
+
+
+def _task_queue_remove(task_id: str, root: Root) -> bool:
+    try:
+        (root.path_worker_queue() / task_id).unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
 def task_recent_rebuild(
     *, root: OptionalRoot = None, limit: int | None = None
 ) -> None:
@@ -324,9 +712,13 @@ def task_recent_rebuild(
             path.unlink()
         return
 
-    ids = task_list(root=root)
-    time = [root.path_task_data(i).stat().st_ctime for i in ids]
-    ids = [i for _, i in sorted(zip(time, ids, strict=False))]
+    index = _task_index_read(root)
+    if index is None:
+        ids = task_list(root=root)
+        time = [root.path_task_data(i).stat().st_ctime for i in ids]
+        ids = [i for _, i in sorted(zip(time, ids, strict=False))]
+    else:
+        ids = list(index.keys())
 
     if limit is not None and limit < len(ids):
         ids = ids[-limit:]
@@ -1,10 +1,19 @@
 import secrets
+from collections.abc import Callable
 
-from hipercow.driver import load_driver_optional
+from hipercow.driver import HipercowDriver, load_driver_optional
 from hipercow.environment import environment_check
+from hipercow.profile import span
 from hipercow.resources import TaskResources
 from hipercow.root import OptionalRoot, Root, open_root
-from hipercow.task import TaskData, TaskStatus, set_task_status, task_data_write
+from hipercow.task import (
+    TaskData,
+    TaskStatus,
+    _task_index_append_many,
+    _task_queue_add,
+    set_task_status,
+    task_data_write,
+)
 from hipercow.util import relative_workdir
 
 
@@ -15,6 +24,7 @@ def task_create_shell(
     envvars: dict[str, str] | None = None,
     resources: TaskResources | None = None,
     driver: str | None = None,
+    worker: bool = False,
     root: OptionalRoot = None,
 ) -> str:
     """Create a shell command task.
@@ -45,6 +55,13 @@ def task_create_shell(
             not needed as we expect most people to have a single
             driver set.
 
+        worker: Queue the task to be run by a worker (see
+            [`worker_start`][hipercow.worker.worker_start]) rather than
+            submitting it to the cluster as its own job.  This is much
+            faster for short tasks.  The resources available to the
+            task are those of the worker, so `resources` cannot be
+            given.
+
         root: The root, or if not given search from the current directory.
 
     Returns:
@@ -63,6 +80,7 @@ def task_create_shell(
         data=data,
         resources=resources,
         envvars=envvars or {},
+        worker=worker,
     )
     return task_id
 
@@ -76,32 +94,122 @@ def _task_create(
     data: dict,
     resources: TaskResources | None,
     envvars: dict[str, str],
+    worker: bool = False,
 ) -> str:
-    path = relative_workdir(root.path)
-    task_id = _new_task_id()
-    environment = environment_check(environment, root)
-    dr = load_driver_optional(driver, root)
-    if resources:
-        if not dr:
-            msg = "Can't specify resources, as driver is not given"
-            raise Exception(msg)
-        resources = dr.resources().validate_resources(resources)
-    task_data = TaskData(
-        task_id=task_id,
+    return _task_create_many(
+        root=root,
         method=method,
-        data=data,
-        path=str(path),
         environment=environment,
+        driver=driver,
+        data=[data],
         resources=resources,
         envvars=envvars,
-    )
-    task_data_write(task_data, root)
+        worker=worker,
+    )[0]
+
+
+# Creates a set of tasks that differ only in their data.  We resolve
+# the environment, driver and resources once, and then submit all
+# tasks together so that drivers can share work (e.g., logging in to
+# the cluster) between them.  If given, 'on_create' is called with
+# the new task ids once they are written, before they are submitted.
+def _task_create_many(
+    *,
+    root: Root,
+    method: str,
+    environment: str | None,
+    driver: str | None,
+    data: list[dict],
+    resources: TaskResources | None,
+    envvars: dict[str, str],
+    worker: bool = False,
+    on_create: Callable[[list[str]], None] | None = None,
+) -> list[str]:
+    path = relative_workdir(root.path)
+    with span("task_create.environment_check"):
+        environment = environment_check(environment, root)
+    dr, resources = _task_create_driver(driver, resources, root, worker=worker)
+    task_ids = []
+    for d in data:
+        task_id = _new_task_id()
+        task_data = TaskData(
+            task_id=task_id,
+            method=method,
+            data=d,
+            path=str(path),
+            environment=environment,
+            resources=resources,
+            envvars=envvars,
+        )
+        with span("task_create.write"):
+            task_data_write(task_data, root, index=False)
+        task_ids.append(task_id)
+    _task_index_append_many([(i, TaskStatus.CREATED) for i in task_ids], root)
     with root.path_recent().open("a") as f:
-        f.write(f"{task_id}\n")
-    if dr:
-        dr.submit(task_id, resources, root)
-        set_task_status(task_id, TaskStatus.SUBMITTED, dr.name, root)
-    return task_id
+        f.write("".join(f"{i}\n" for i in task_ids))
+    if on_create:
+        on_create(task_ids)
+    _task_submit_many(task_ids, dr, resources, root, worker=worker)
+    return task_ids
+
+
+def _task_create_driver(
+    driver: str | None,
+    resources: TaskResources | None,
+    root: Root,
+    *,
+    worker: bool,
+) -> tuple[HipercowDriver | None, TaskResources | None]:
+    if worker:
+        if resources:
+            msg = "Can't specify resources for tasks run by workers"
+            raise Exception(msg)
+        dr = None
+    else:
+        dr = load_driver_optional(driver, root)
+    if resources:
+        if not dr:
+            msg = "Can't specify resources, as driver is not given"
+            raise Exception(msg)
+        resources = dr.resources(root).validate_resources(resources)
+    return dr, resources
+
+
+def _task_submit_many(
+    task_ids: list[str],
+    dr: HipercowDriver | None,
+    resources: TaskResources | None,
+    root: Root,
+    *,
+    worker: bool,
+) -> None:
+    # We record submission in the index once for all tasks, rather
+    # than once per task.
+    if worker:
+        # Mark tasks as submitted before queuing them, so that a
+        # worker can't start a task before we update its status.
+        for task_id in task_ids:
+            set_task_status(task_id, TaskStatus.SUBMITTED, None, root)
+        _task_index_append_many(
+            [(i, TaskStatus.SUBMITTED) for i in task_ids], root
+        )
+        _task_queue_add(task_ids, root)
+    elif dr:
+        # Mark each task as submitted as soon as the driver has done
+        # so, so that if submission fails part way through, the tasks
+        # that were submitted can still be waited on or cancelled.
+        name = dr.name
+        submitted = []
+
+        def on_submit(task_id: str) -> None:
+            set_task_status(task_id, TaskStatus.SUBMITTED, name, root)
+            submitted.append((task_id, TaskStatus.SUBMITTED))
+
+        try:
+            with span("task_create.submit"):
+                dr.submit_many(task_ids, resources, root, on_submit=on_submit)
+        finally:
+            _task_index_append_many(submitted, root)
 
 
 def _new_task_id() -> str:
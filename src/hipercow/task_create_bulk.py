@@ -1,9 +1,23 @@
+import secrets
+from collections.abc import Iterable
+from contextlib import nullcontext
+from itertools import islice
+from pathlib import Path
 from string import Template
 from typing import TypeAlias
 
+from pydantic import BaseModel, ConfigDict
+
+from hipercow import ui
 from hipercow.bundle import bundle_create
-from hipercow.root import OptionalRoot, open_root
-from hipercow.task_create import task_create_shell
+from hipercow.resources import TaskResources
+from hipercow.root import OptionalRoot, Root, open_root
+from hipercow.task import TaskStatus, task_status_many
+from hipercow.task_create import (
+    _task_create_driver,
+    _task_create_many,
+    _task_submit_many,
+)
 from hipercow.util import expand_grid
 
 
@@ -37,8 +51,12 @@ def bulk_create_shell(
     data: BulkDataInput,
     *,
     name: str | None = None,
+    environment: str | None = None,
+    envvars: dict[str, str] | None = None,
+    resources: TaskResources | None = None,
+    driver: str | None = None,
+    worker: bool = False,
     root: OptionalRoot = None,
-    **kwargs,
 ) -> str:
     """Create a group of tasks from a template and data.
 
@@ -69,11 +87,21 @@ def bulk_create_shell(
         name: Optional name for the created bundle.  If `None` (the
             default) then a random name will be created for the bundle.
 
-        root: The root, or if not given search from the current directory.
+        environment: The name of the environment to evaluate the
+            commands in; see `hipercow.task_create.task_create_shell`.
+
+        envvars: A dictionary of environment variables to set before
+            each task runs.
+
+        resources: Optional resources required by each task.
+
+        driver: The driver to launch the tasks with.
 
-        kwargs: Additional arguments passed through to
-            `hipercow.task_create.task_create_shell`.  This includes
-            `environment`, `envvars`, `resources` and `driver`.
+        worker: Queue the tasks to be run by workers, rather than
+            submitting each as its own job; see
+            `hipercow.task_create.task_create_shell`.
+
+        root: The root, or if not given search from the current directory.
 
     Returns: The name of the created bundle of tasks.  You can use
         `hipercow.bundle.task_bundle_load` to load this and methods in
@@ -81,8 +109,22 @@ def bulk_create_shell(
 
     """
     root = open_root(root)
+    if not cmd_template:
+        msg = "'cmd_template' cannot be empty"
+        raise Exception(msg)
     cmd = bulk_create_shell_commands(cmd_template, data)
-    task_ids = [task_create_shell(cmd_i, **kwargs) for cmd_i in cmd]
+    # All tasks are submitted together, so that the driver can share
+    # work (such as logging in to the cluster) between them.
+    task_ids = _task_create_many(
+        root=root,
+        method="shell",
+        environment=environment,
+        driver=driver,
+        data=[{"cmd": cmd_i} for cmd_i in cmd],
+        resources=resources,
+        envvars=envvars or {},
+        worker=worker,
+    )
     return bundle_create(task_ids, name=name, validate=False, root=root)
 
 
@@ -112,16 +154,246 @@ def bulk_create_shell_commands(
 
     """
     template = [_TemplateAt(el) for el in cmd_template]
+    data_list = _check_template_data(data)
+    _check_template_keys(template, set(data_list[0].keys()))
+    return [[i.substitute(d) for i in template] for d in data_list]
 
-    # Check that all elements in data are consumed by the template
 
+def bulk_create_shell_stream(
+    cmd_template: list[str],
+    data: Iterable[dict[str, str]],
+    *,
+    name: str | None = None,
+    chunk_size: int = 1000,
+    resume: bool = False,
+    progress: bool = True,
+    environment: str | None = None,
+    envvars: dict[str, str] | None = None,
+    resources: TaskResources | None = None,
+    driver: str | None = None,
+    worker: bool = False,
+    root: OptionalRoot = None,
+) -> str:
+    """Create a large group of tasks from a template and rows of data.
+
+    This is like `bulk_create_shell` with a list of `dict`s, except
+    that we read the rows of data only as we need them, and create
+    and submit tasks a chunk at a time.  Use this with very large
+    sets of data (e.g., the rows of a large csv file, read with
+    `hipercow.util.read_csv_rows`), which would take a lot of memory
+    to hold at once.
+
+    We record each chunk of tasks as soon as they are created, before
+    they are submitted, so if creation is interrupted you can continue
+    from where it stopped by calling this again with the same `name`,
+    data and options, and `resume=True`.  Tasks that were created but
+    not yet submitted at the time of the interruption are submitted
+    then, rather than created again.
+
+    Args:
+        cmd_template: A command template.  This should be a list of
+            strings, with some containing template placeholders.
+
+        data: The rows of data to substitute into the template; each
+            must have the same keys.
+
+        name: Optional name for the created bundle.  If `None` (the
+            default) then a random name will be created for the
+            bundle, but you will need to give a name to resume.
+
+        chunk_size: The number of tasks to create and submit at once.
+
+        resume: Continue creating a bundle that was interrupted.
+
+        progress: Show a progress spinner while creating tasks?
+
+        environment: The name of the environment to evaluate the
+            commands in; see `hipercow.task_create.task_create_shell`.
+
+        envvars: A dictionary of environment variables to set before
+            each task runs.
+
+        resources: Optional resources required by each task.
+
+        driver: The driver to launch the tasks with.
+
+        worker: Queue the tasks to be run by workers, rather than
+            submitting each as its own job; see
+            `hipercow.task_create.task_create_shell`.
+
+        root: The root, or if not given search from the current directory.
+
+    Returns: The name of the created bundle of tasks.
+
+    """
+    root = open_root(root)
+    if not cmd_template:
+        msg = "'cmd_template' cannot be empty"
+        raise Exception(msg)
+    if chunk_size < 1:
+        msg = f"'chunk_size' must be at least 1, but was {chunk_size}"
+        raise Exception(msg)
+    if name is None:
+        if resume:
+            msg = "Can't resume creating a bundle without its name"
+            raise Exception(msg)
+        name = secrets.token_hex(8)
+
+    path = root.path_bundle_partial(name)
+    options = _BulkPartial(
+        cmd_template=cmd_template,
+        environment=environment,
+        envvars=envvars or {},
+        resources=resources,
+        driver=driver,
+        worker=worker,
+    )
+    if resume:
+        task_ids = _bulk_partial_read(path, name, options)
+    elif path.exists():
+        msg = (
+            f"Bundle '{name}' was partially created; "
+            "use 'resume' to continue creating it"
+        )
+        raise Exception(msg)
+    else:
+        task_ids = []
+
+    rows = iter(data)
+    n_skipped = sum(1 for _ in islice(rows, len(task_ids)))
+    if n_skipped < len(task_ids):
+        msg = (
+            f"Can't resume bundle '{name}', as the data has fewer rows "
+            f"({n_skipped}) than tasks already created ({len(task_ids)})"
+        )
+        raise Exception(msg)
+
+    # We check the data against the template just once, using the
+    # first row, and after that only that each row has the same keys.
+    template = [_TemplateAt(el) for el in cmd_template]
+    chunk = list(islice(rows, chunk_size))
+    if not chunk and not task_ids:
+        msg = "No data provided"
+        raise Exception(msg)
+    keys = set(chunk[0].keys()) if chunk else set()
+    if chunk:
+        _check_template_keys(template, keys)
+
+    if resume:
+        _bulk_partial_submit(task_ids, options, root)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as f:
+            f.write(options.model_dump_json() + "\n")
+
+    ui.alert_info(f"Creating tasks for bundle '{name}'")
+    spinner = ui.console.status("") if progress else nullcontext()
+    with path.open("a") as f, spinner as sp:
+
+        def on_create(ids: list[str]) -> None:
+            f.write("".join(f"{i}\n" for i in ids))
+            f.flush()
+
+        while chunk:
+            if any(d.keys() != keys for d in chunk):
+                msg = "Inconsistent keys among data"
+                raise Exception(msg)
+            ids = _task_create_many(
+                root=root,
+                method="shell",
+                environment=environment,
+                driver=driver,
+                data=[
+                    {"cmd": [i.substitute(d) for i in template]} for d in chunk
+                ],
+                resources=resources,
+                envvars=envvars or {},
+                worker=worker,
+                on_create=on_create,
+            )
+            task_ids.extend(ids)
+            if sp is not None:
+                sp.update(f"Created {len(task_ids)} tasks")
+            chunk = list(islice(rows, chunk_size))
+
+    name = bundle_create(task_ids, name=name, validate=False, root=root)
+    path.unlink()
+    return name
+
+
+# The record of a bundle being created by bulk_create_shell_stream:
+# this header, holding the options used to create the tasks, is the
+# first line of the file, and the identifiers of the tasks created so
+# far follow, one per line.
+class _BulkPartial(BaseModel):
+    # Allow 'cores=math.inf' to survive a round trip through json
+    model_config = ConfigDict(ser_json_inf_nan="constants")
+
+    cmd_template: list[str]
+    environment: str | None
+    envvars: dict[str, str]
+    resources: TaskResources | None
+    driver: str | None
+    worker: bool
+
+
+def _bulk_partial_read(
+    path: Path, name: str, options: _BulkPartial
+) -> list[str]:
+    if not path.exists():
+        msg = f"No partially created bundle '{name}' to resume"
+        raise Exception(msg)
+    with path.open() as f:
+        header = _BulkPartial.model_validate_json(f.readline())
+        task_ids = [i.strip() for i in f]
+    if header.cmd_template != options.cmd_template:
+        msg = (
+            f"Can't resume bundle '{name}', which was started "
+            "with a different command"
+        )
+        raise Exception(msg)
+    if header != options:
+        differ = [
+            k
+            for k in _BulkPartial.model_fields
+            if getattr(header, k) != getattr(options, k)
+        ]
+        msg = (
+            f"Can't resume bundle '{name}', which was started with "
+            f"different options: {', '.join(differ)}"
+        )
+        raise Exception(msg)
+    return task_ids
+
+
+# Tasks from the chunk that was being created when we were
+# interrupted may not have been submitted (or only some of them), so
+# we submit any that are still waiting.
+def _bulk_partial_submit(
+    task_ids: list[str], options: _BulkPartial, root: Root
+) -> None:
+    status = task_status_many(task_ids, root)
+    todo = [
+        i
+        for i, s in zip(task_ids, status, strict=False)
+        if s == TaskStatus.CREATED
+    ]
+    if not todo:
+        return
+    dr, resources = _task_create_driver(
+        options.driver, options.resources, root, worker=options.worker
+    )
+    _task_submit_many(todo, dr, resources, root, worker=options.worker)
+
+
+def _check_template_keys(
+    template: list[_TemplateAt], keys_data: set[str]
+) -> None:
+    # Check that all elements in data are consumed by the template
     keys_template = set()
     for el in template:
         keys_template |= set(el.get_identifiers())
 
-    data_list = _check_template_data(data)
-    keys_data = set(data_list[0].keys())
-
     if extra := keys_template - keys_data:
         extra_str = ", ".join(extra)
         msg = f"Template variables not present in data: {extra_str}"
@@ -132,8 +404,6 @@ def bulk_create_shell_commands(
         msg = f"Data variables not present in template: {unused_str}"
         raise Exception(msg)
 
-    return [[i.substitute(d) for i in template] for d in data_list]
-
 
 def _check_template_data(data: BulkDataInput) -> list[dict[str, str]]:
     if not data:
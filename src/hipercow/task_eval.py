@@ -1,8 +1,11 @@
+import os
 import pickle
+import platform
 import time
 from dataclasses import dataclass
 
 from hipercow.environment import environment_engine
+from hipercow.profile import span
 from hipercow.root import OptionalRoot, Root, open_root
 from hipercow.task import (
     TaskData,
@@ -12,6 +15,7 @@ from hipercow.task import (
     task_data_read,
     task_status,
 )
+from hipercow.usage import TaskUsage, UsageMonitor, usage_interval
 
 
 @dataclass
@@ -19,6 +23,7 @@ class TaskResult:
     task_id: str
     success: bool
     data: object
+    usage: TaskUsage | None = None
 
 
 def task_eval(
@@ -31,10 +36,12 @@ def task_eval(
 
 def task_eval_data(data: TaskData, *, capture: bool, root: Root) -> None:
     task_id = data.task_id
-    status = task_status(task_id, root)
-    if not status.is_runnable():
-        msg = f"Can't run '{task_id}', which has status '{status}'"
-        raise Exception(msg)
+    with span("task_eval.claim"):
+        status = task_status(task_id, root)
+        if not status.is_runnable():
+            msg = f"Can't run '{task_id}', which has status '{status}'"
+            raise Exception(msg)
+        _task_claim(task_id, root)
 
     t_created = root.path_task_data(task_id).stat().st_ctime
     t_start = time.time()
@@ -47,14 +54,40 @@ def task_eval_data(data: TaskData, *, capture: bool, root: Root) -> None:
     t_end = time.time()
 
     status = TaskStatus.SUCCESS if res.success else TaskStatus.FAILURE
-    with root.path_task_result(task_id).open("wb") as f:
-        pickle.dump(res.data, f)
-
-    times = TaskTimes(created=t_created, started=t_start, finished=t_end)
-    with root.path_task_times(task_id).open("w") as f:
-        f.write(times.model_dump_json())
-
-    set_task_status(task_id, status, None, root)
+    with span("task_eval.finish"):
+        with root.path_task_result(task_id).open("wb") as f:
+            pickle.dump(res.data, f)
+
+        times = TaskTimes(
+            created=t_created,
+            started=t_start,
+            finished=t_end,
+            usage=res.usage,
+        )
+        with root.path_task_times(task_id).open("w") as f:
+            f.write(times.model_dump_json())
+
+        set_task_status(task_id, status, None, root)
+
+
+# Checking the status above is not enough to stop a task being run
+# twice, as two evaluators (e.g., a worker and a resubmitted job) can
+# both see it as runnable before either marks it as running.  So each
+# evaluator must first create the claim file; exclusive creation is
+# atomic, including on the network shares used by the cluster, so
+# exactly one evaluator succeeds.  We record who claimed the task to
+# help debug cases where it is never completed.
+def _task_claim(task_id: str, root: Root) -> None:
+    path = root.path_task_claim(task_id)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        with path.open() as f:
+            owner = f.read().strip()
+        msg = f"Can't run '{task_id}', which has been claimed by {owner}"
+        raise Exception(msg) from None
+    with os.fdopen(fd, "w") as f:
+        f.write(f"host {platform.node()} pid {os.getpid()}\n")
 
 
 def task_eval_shell(data: TaskData, *, capture: bool, root: Root) -> TaskResult:
@@ -62,8 +95,9 @@ def task_eval_shell(data: TaskData, *, capture: bool, root: Root) -> TaskResult:
     env = data.envvars
     path = root.path / data.path
     filename = root.path_task_log(data.task_id) if capture else None
-    res = environment_engine(data.environment, root).run(
-        cmd, check=False, env=env, cwd=path, filename=filename
-    )
+    with span("task_eval.run"), UsageMonitor(usage_interval()) as usage:
+        res = environment_engine(data.environment, root).run(
+            cmd, check=False, env=env, cwd=path, filename=filename
+        )
     success = res.returncode == 0
-    return TaskResult(data.task_id, success, None)
+    return TaskResult(data.task_id, success, None, usage.usage)
@@ -0,0 +1,192 @@
+"""Measure the resources used by tasks.
+
+We record the CPU time, memory and I/O used by each task, so that
+you can see which tasks ask for more (or fewer) cores or memory than
+they use.  Times and I/O come from the operating system's accounting
+of finished child processes (`getrusage`), which is not available on
+Windows.
+
+The operating system only tells us about the largest process that a
+task ran, and only if it was larger than any that ran before it in
+the same process (which matters for workers, which run many tasks).
+To measure the memory used by all of a task's processes together,
+set `HIPERCOW_USAGE_INTERVAL` to a number of seconds, and we will
+sample the memory used every so often while the task runs (Linux
+only).
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+from pydantic import BaseModel
+
+if sys.platform != "win32":
+    import resource
+
+
+class TaskUsage(BaseModel):
+    """Resources used by a task.
+
+    Attributes:
+        cpu_user: CPU time spent running the task's code, in seconds,
+            summed over all its processes.
+        cpu_system: CPU time spent in the operating system on behalf
+            of the task, in seconds.
+        max_rss: The peak memory used by the task's largest process,
+            in bytes, if known.
+        read_blocks: The number of blocks read from the filesystem.
+        write_blocks: The number of blocks written to the filesystem.
+        rss_sampled: The peak memory used by all the task's processes
+            together, in bytes, if we sampled it (see above).
+    """
+
+    cpu_user: float
+    cpu_system: float
+    max_rss: int | None
+    read_blocks: int
+    write_blocks: int
+    rss_sampled: int | None = None
+
+
+class UsageMonitor:
+    """Measure the resources used by child processes.
+
+    Use this as a context manager around running a task; once the
+    block exits, `usage` holds the resources used (or `None` if we
+    can't measure these on this platform).
+
+    Args:
+        interval: Optionally, the time in seconds between samples of
+            the memory used by child processes.
+
+    Attributes:
+        usage: The resources used within the block.
+    """
+
+    usage: TaskUsage | None = None
+
+    def __init__(self, interval: float | None = None):
+        self._interval = interval
+        self._before: tuple | None = None
+        self._sampler: _RssSampler | None = None
+
+    def __enter__(self) -> "UsageMonitor":
+        self._before = _rusage_children()
+        if self._interval and _PROC.exists():
+            self._sampler = _RssSampler(self._interval)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        rss_sampled = None
+        if self._sampler:
+            rss_sampled = self._sampler.stop()
+        after = _rusage_children()
+        if self._before is None or after is None:
+            return
+        user, system, maxrss, inblock, oublock = (
+            a - b for a, b in zip(after, self._before, strict=False)
+        )
+        # ru_maxrss is the maximum over all children, not a total, so
+        # it only tells us about this task if it went up.
+        max_rss = after[2] * _MAXRSS_UNIT if maxrss > 0 else None
+        self.usage = TaskUsage(
+            cpu_user=user,
+            cpu_system=system,
+            max_rss=max_rss,
+            read_blocks=inblock,
+            write_blocks=oublock,
+            rss_sampled=rss_sampled,
+        )
+
+
+def usage_interval() -> float | None:
+    """Read the sampling interval from `HIPERCOW_USAGE_INTERVAL`.
+
+    Returns:
+        The interval in seconds, or `None` if not sampling.
+    """
+    value = os.environ.get("HIPERCOW_USAGE_INTERVAL")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        msg = f"Expected a number for 'HIPERCOW_USAGE_INTERVAL': '{value}'"
+        raise Exception(msg) from None
+
+
+_PROC = Path("/proc")
+
+# ru_maxrss is in kilobytes, except on macOS where it is in bytes
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _rusage_children() -> tuple | None:
+    if sys.platform == "win32":
+        return None
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        ru.ru_utime,
+        ru.ru_stime,
+        ru.ru_maxrss,
+        ru.ru_inblock,
+        ru.ru_oublock,
+    )
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while True:
+            self.peak = max(self.peak, _rss_descendants(os.getpid()))
+            if self._done.wait(self.interval):
+                break
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def _rss_descendants(pid: int) -> int:
+    children: dict[int, list[int]] = {}
+    for p in _PROC.iterdir():
+        if p.name.isdigit():
+            ppid = _proc_ppid(p)
+            if ppid is not None:
+                children.setdefault(ppid, []).append(int(p.name))
+    total = 0
+    todo = list(children.get(pid, []))
+    while todo:
+        i = todo.pop()
+        total += _proc_rss(_PROC / str(i))
+        todo.extend(children.get(i, []))
+    return total
+
+
+# Processes may exit while we read these, so we treat anything we
+# can't read as gone.
+def _proc_ppid(path: Path) -> int | None:
+    try:
+        stat = (path / "stat").read_text()
+    except OSError:
+        return None
+    # The process name comes second, in parentheses, and may itself
+    # contain spaces or parentheses.
+    return int(stat.rsplit(")", 1)[1].split()[1])
+
+
+def _proc_rss(path: Path) -> int:
+    try:
+        statm = (path / "statm").read_text()
+    except OSError:
+        return 0
+    return int(statm.split()[1]) * os.sysconf("SC_PAGE_SIZE")
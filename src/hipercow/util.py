@@ -1,4 +1,6 @@
 import csv
+import hashlib
+import math
 import os
 import platform
 import re
@@ -117,6 +119,35 @@ def truthy_envvar(name: str) -> bool:
     return value is not None and (value.lower() in {"1", "true"})
 
 
+def user_cache_dir() -> Path:
+    if platform.system() == "Windows":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home())
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "hipercow"
+
+
+# Write a file so that readers see either the old contents or the
+# new, never a partial file, even if several processes write at once.
+def file_write_atomic(
+    path: Path, contents: str, *, newline: str | None = None
+) -> None:
+    path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with path_tmp.open("w", newline=newline) as f:
+        f.write(contents)
+    path_tmp.replace(path)
+
+
+# Scripts that run tasks are named after a hash of the data used to
+# fill in their templates, so that they can be reused by every task
+# submitted with the same configuration.  The date only records when
+# the script was written, so we leave it out, or we would never reuse
+# a script.
+def runner_id(data: dict[str, str]) -> str:
+    static = sorted((k, v) for k, v in data.items() if k != "date")
+    return hashlib.sha256(repr(static).encode("utf-8")).hexdigest()[:16]
+
+
 def read_file_if_exists(path: Path) -> str | None:
     if not path.exists():
         return None
@@ -159,6 +190,18 @@ def read_csv_to_dict(filename: str | Path) -> list[dict[str, Any]]:
         return list(csv.DictReader(f))
 
 
+# As above, but reading rows only as they are needed, for files too
+# large to hold in memory.
+def read_csv_rows(filename: str | Path) -> Iterator[dict[str, Any]]:
+    with Path(filename).open(newline="") as f:
+        yield from csv.DictReader(f)
+
+
+# Nearest rank percentile, on values already sorted
+def percentile(x: list[float], p: float) -> float:
+    return x[max(math.ceil(p * len(x)) - 1, 0)]
+
+
 # We could make this more generic, but this changes syntax at 3.12
 # https://mypy.readthedocs.io/en/stable/generics.html#generic-functions
 def tabulate(x: list[str]) -> dict[str, int]:
@@ -0,0 +1,217 @@
+"""Wait for files to appear in a directory.
+
+We use this when waiting on a task, so that we notice the task's
+status file as soon as it is written, rather than up to a poll
+interval later.  On Linux we use inotify (through ctypes, so without
+any additional dependency), and on other local filesystems we fall
+back on comparing directory listings.  On network filesystems,
+changes made by other machines do not raise events, and listing the
+directory is as slow as checking the status, so there we just poll.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+class DirectoryWatcher(ABC):
+    """Watch a directory for new files.
+
+    Attributes:
+        path: The directory being watched.
+        prefix: Only files whose names start with this are of interest.
+    """
+
+    path: Path
+    prefix: str
+
+    @abstractmethod
+    def wait(self, timeout: float) -> bool:
+        """Wait for a new file to appear.
+
+        Args:
+            timeout: The maximum time to wait, in seconds.
+
+        Returns:
+            `True` if a new file appeared, `False` if we timed out.
+        """
+        pass  # pragma: no cover
+
+    def close(self) -> None:
+        """Stop watching the directory."""
+        pass
+
+    def __enter__(self) -> "DirectoryWatcher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def directory_watcher(path: Path, prefix: str = "") -> DirectoryWatcher | None:
+    """Create a watcher for a directory.
+
+    We use inotify where we can be sure that it will work (local
+    filesystems on Linux), and otherwise, on local filesystems, fall
+    back on comparing directory listings.  On network filesystems, or
+    where we can't tell what sort of filesystem we are on, watching
+    would cost a directory listing on top of each check of the
+    status, so we don't watch at all.
+
+    Args:
+        path: The directory to watch.  This must already exist.
+        prefix: Only report files whose names start with this.
+
+    Returns:
+        A watcher, or `None` if the directory should be polled
+        instead; call `close()` on the watcher (or use it as a
+        context manager) once done.
+    """
+    fstype = _filesystem_type(path)
+    if fstype is None or fstype in _NETWORK_FILESYSTEMS:
+        return None
+    try:
+        return _InotifyWatcher(path, prefix)
+    except (OSError, AttributeError):
+        return _ScanWatcher(path, prefix, _SCAN_INTERVAL)
+
+
+# How often we list a directory on a local filesystem when inotify is
+# not available.
+_SCAN_INTERVAL = 0.05
+
+
+class _ScanWatcher(DirectoryWatcher):
+    def __init__(self, path: Path, prefix: str, interval: float):
+        self.path = path
+        self.prefix = prefix
+        self.interval = interval
+        self._seen = self._scan()
+
+    def wait(self, timeout: float) -> bool:
+        end = time.monotonic() + timeout
+        while True:
+            remaining = end - time.monotonic()
+            if remaining > 0:
+                time.sleep(min(self.interval, remaining))
+            found = self._scan()
+            new = found - self._seen
+            self._seen = found
+            if new:
+                return True
+            if time.monotonic() >= end:
+                return False
+
+    def _scan(self) -> set[str]:
+        try:
+            with os.scandir(self.path) as it:
+                return {x.name for x in it if x.name.startswith(self.prefix)}
+        except FileNotFoundError:
+            return set()
+
+
+# Constants from <sys/inotify.h>
+_IN_CREATE = 0x00000100
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _InotifyWatcher(DirectoryWatcher):
+    def __init__(self, path: Path, prefix: str):
+        self.path = path
+        self.prefix = prefix
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        mask = _IN_CREATE | _IN_MOVED_TO
+        if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, os.strerror(err), str(path))
+        self._fd: int | None = fd
+
+    def wait(self, timeout: float) -> bool:
+        if self._fd is None:
+            msg = "Watcher has been closed"
+            raise Exception(msg)
+        end = time.monotonic() + timeout
+        while True:
+            remaining = max(end - time.monotonic(), 0)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return False
+            if any(x.startswith(self.prefix) for x in self._read()):
+                return True
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _read(self) -> list[str]:
+        try:
+            data = os.read(self._fd, 65536)  # type: ignore[arg-type]
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            length = _IN_EVENT.unpack_from(data, offset)[3]
+            start = offset + _IN_EVENT.size
+            name = data[start : start + length].rstrip(b"\0")
+            names.append(os.fsdecode(name))
+            offset = start + length
+        return names
+
+
+# Filesystems where inotify will not see changes made on other
+# machines, which is exactly the case for tasks running on a cluster.
+_NETWORK_FILESYSTEMS = {
+    "9p",
+    "afs",
+    "ceph",
+    "cifs",
+    "fuse.sshfs",
+    "gpfs",
+    "lustre",
+    "nfs",
+    "nfs4",
+    "smb3",
+    "smbfs",
+}
+
+
+def _filesystem_type(path: Path) -> str | None:
+    try:
+        with Path("/proc/self/mounts").open() as f:
+            mounts = f.read()
+    except OSError:
+        return None
+    return _mount_fstype(str(Path(path).resolve()), mounts)
+
+
+def _mount_fstype(path: str, mounts: str) -> str | None:
+    best = None
+    fstype = None
+    for line in mounts.splitlines():
+        try:
+            _, point, kind = line.split()[:3]
+        except ValueError:
+            continue
+        # Spaces and friends are escaped as octal in the mount table
+        point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m[1], 8)), point)
+        inside = path == point or path.startswith(point.rstrip("/") + "/")
+        if inside and (best is None or len(point) >= len(best)):
+            best = point
+            fstype = kind
+    return fstype
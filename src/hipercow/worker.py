@@ -0,0 +1,158 @@
+"""Long-lived workers that run queued tasks.
+
+Submitting every task to the cluster as its own job is expensive when
+tasks are short: each one waits for the scheduler and then pays for
+starting Python on the node before doing any work.  Instead, tasks
+can be queued within the root (see the `worker` argument to
+[`task_create_shell`][hipercow.task_create.task_create_shell]), and
+a small number of long-running worker jobs will claim and run them,
+one after another, until the queue is empty.
+
+Workers claim a task by renaming its entry out of the queue and into
+the worker's own directory.  A rename either succeeds or fails as a
+whole, including on the network shares that the cluster uses, so two
+workers never claim the same task and we need no locks.
+"""
+
+import os
+import random
+import secrets
+import sys
+import time
+import traceback
+
+from hipercow import ui
+from hipercow.driver import load_driver
+from hipercow.resources import TaskResources
+from hipercow.root import OptionalRoot, Root, open_root
+from hipercow.task_eval import task_eval
+
+
+def worker_start(
+    n: int = 1,
+    *,
+    resources: TaskResources | None = None,
+    driver: str | None = None,
+    root: OptionalRoot = None,
+) -> list[str]:
+    """Start workers.
+
+    Each worker is submitted as a single job using your driver.  Once
+    running, a worker runs queued tasks until it finds the queue
+    empty for a while (see [`worker_run`][hipercow.worker.worker_run]),
+    at which point it exits.  You can start workers before or after
+    queuing tasks.
+
+    Args:
+        n: The number of workers to start.
+        resources: Optional resources required by each worker; every
+            task that the worker runs shares these.
+        driver: The driver to launch the workers with.
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        The identifiers of the new workers.
+    """
+    if n < 1:
+        msg = f"'n' must be at least 1, but was {n}"
+        raise Exception(msg)
+    root = open_root(root)
+    dr = load_driver(driver, root)
+    if resources:
+        resources = dr.resources(root).validate_resources(resources)
+    worker_ids = [secrets.token_hex(8) for _ in range(n)]
+    for worker_id in worker_ids:
+        root.path_worker_claimed(worker_id).mkdir(parents=True)
+    dr.submit_workers(worker_ids, resources, root)
+    ui.alert_success(f"Started {n} worker{'s' if n > 1 else ''}")
+    return worker_ids
+
+
+def worker_run(
+    worker_id: str,
+    *,
+    idle: float = 60,
+    poll: float = 1,
+    root: OptionalRoot = None,
+) -> int:
+    """Run queued tasks.
+
+    This is the loop run by each worker, and is not usually called
+    directly.  We claim and run tasks from the queue, in no
+    particular order, until the queue has been empty for `idle`
+    seconds.
+
+    Args:
+        worker_id: The worker identifier.
+        idle: The time, in seconds, to wait for more tasks to be
+            queued once the queue is empty, before exiting.
+        poll: The time, in seconds, between checks of an empty queue.
+        root: The root, or if not given search from the current directory.
+
+    Returns:
+        The number of tasks run.
+    """
+    root = open_root(root)
+    path_claimed = root.path_worker_claimed(worker_id)
+    path_claimed.mkdir(parents=True, exist_ok=True)
+    n = 0
+    last = time.monotonic()
+    candidates: list[str] = []
+    while True:
+        task_id = _worker_claim(worker_id, candidates, root)
+        if task_id is None:
+            if time.monotonic() - last >= idle:
+                break
+            time.sleep(poll)
+            continue
+        _worker_eval(task_id, root)
+        (path_claimed / task_id).unlink()
+        n += 1
+        last = time.monotonic()
+    print(f"Worker '{worker_id}' ran {n} tasks, queue is empty")
+    return n
+
+
+# Each worker lists the queue only when it runs out of candidates,
+# rather than before every claim, as listing a large directory over
+# the network is slow.  We try candidates in a random order so that
+# workers that listed the queue at the same time don't all compete
+# for the same task.
+def _worker_claim(
+    worker_id: str, candidates: list[str], root: Root
+) -> str | None:
+    path_queue = root.path_worker_queue()
+    path_claimed = root.path_worker_claimed(worker_id)
+    for _ in range(2):
+        if not candidates:
+            candidates.extend(_worker_queue_list(root))
+            random.shuffle(candidates)
+        while candidates:
+            task_id = candidates.pop()
+            try:
+                os.rename(path_queue / task_id, path_claimed / task_id)
+            except FileNotFoundError:
+                # Claimed by another worker, or cancelled
+                continue
+            return task_id
+    return None
+
+
+def _worker_queue_list(root: Root) -> list[str]:
+    try:
+        return os.listdir(root.path_worker_queue())
+    except FileNotFoundError:
+        return []
+
+
+def _worker_eval(task_id: str, root: Root) -> None:
+    print(f"Running task '{task_id}'")
+    try:
+        task_eval(task_id, capture=True, root=root)
+    except Exception:
+        print(f"Error running task '{task_id}'", file=sys.stderr)
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    worker_run(sys.argv[2], root=sys.argv[1])
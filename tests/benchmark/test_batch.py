@@ -0,0 +1,72 @@
+import time
+from unittest import mock
+
+import pytest
+
+from hipercow import root
+from hipercow.dide import batch_linux
+from hipercow.dide.configuration import dide_configuration
+from hipercow.dide.driver import LinuxWindowsDriver
+from hipercow.dide.mounts import Mount
+from hipercow.resources import TaskResources
+
+N_TASKS = 10_000
+
+
+def _config(tmp_path):
+    path = tmp_path / "my/project"
+    root.init(path)
+    r = root.open_root(path)
+    m = Mount(
+        host="wpia-hn", remote="cluster-storage/project/bob", local=tmp_path
+    )
+    config = dide_configuration(
+        r, mounts=[m], python_version=None, check_credentials=False
+    )
+    return r, config
+
+
+def _report(label, elapsed, n):
+    print(f"{label}: {1e6 * elapsed / n:.1f}us per task ({n} tasks)")
+
+
+@pytest.mark.benchmark
+def test_benchmark_render_batch_script(tmp_path):
+    _, config = _config(tmp_path)
+    template = batch_linux.TASK_RUN_SH
+
+    t0 = time.perf_counter()
+    for _ in range(N_TASKS):
+        template.substitute(batch_linux._template_data_core_linux(config))
+    t_uncached = time.perf_counter() - t0
+
+    core = batch_linux._template_data_core_linux(config)
+    t0 = time.perf_counter()
+    for _ in range(N_TASKS):
+        template.substitute(core)
+    t_cached = time.perf_counter() - t0
+
+    _report("render, static fields recomputed", t_uncached, N_TASKS)
+    _report("render, static fields cached", t_cached, N_TASKS)
+    assert t_cached < t_uncached
+
+
+@pytest.mark.benchmark
+def test_benchmark_submit_many(tmp_path, mocker):
+    r, config = _config(tmp_path)
+    cl = mock.MagicMock()
+    cl.submit.return_value = "1234"
+    mocker.patch("hipercow.dide.driver._web_client", return_value=cl)
+    dr = LinuxWindowsDriver(config)
+    task_ids = [f"{i:032x}" for i in range(N_TASKS)]
+    for task_id in task_ids:
+        r.path_task(task_id).mkdir(parents=True)
+    resources = TaskResources(queue="LinuxNodes")
+
+    t0 = time.perf_counter()
+    dr.submit_many(task_ids, resources, r)
+    elapsed = time.perf_counter() - t0
+
+    _report("submit_many, excluding the portal", elapsed, N_TASKS)
+    assert cl.submit.call_count == N_TASKS
+    assert len(list(r.path_base().glob("runners/*/task_run.sh"))) == 1
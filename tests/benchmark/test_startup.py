@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+
+# The modules that 'hipercow task eval' loads on a cluster node: the
+# cli, and the task evaluation itself.
+TASK_EVAL_IMPORTS = "import hipercow.cli, hipercow.task_eval"
+
+# Microseconds; this is about twice what we see on a laptop, and well
+# under the second or so it took when the cli imported everything.
+TASK_EVAL_BUDGET = 750_000
+
+
+def _import_time(code: str) -> int:
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like 'import time: <self> | <cumulative> | <name>',
+    # where names of modules imported by other modules are indented,
+    # so the total time is the sum over the unindented names.
+    total = 0
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total
+
+
+@pytest.mark.benchmark
+def test_benchmark_task_eval_startup():
+    elapsed = min(_import_time(TASK_EVAL_IMPORTS) for _ in range(3))
+    print(f"task eval startup: {elapsed / 1000:.0f}ms importing")
+    assert elapsed < TASK_EVAL_BUDGET
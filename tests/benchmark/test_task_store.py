@@ -0,0 +1,184 @@
+"""Benchmarks for reading and writing tasks in a root.
+
+Roots are generated using the same functions that hipercow uses to
+write tasks, with a mix of statuses.  Set `HIPERCOW_BENCHMARK_TASKS`
+to a comma-separated list of sizes to run at (default 10000), e.g.,
+`10000,100000,1000000`; the larger roots take a long time to create.
+
+Set `HIPERCOW_BENCHMARK_LATENCY` to a time in seconds to add to each
+filesystem call within the root, to get a feel for performance on a
+network share (where each call is a round trip to the server); a
+millisecond is typical for SMB.
+"""
+
+import io
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+import pytest
+
+from hipercow import root, task
+from hipercow.bundle import bundle_create, bundle_status
+from hipercow.task import (
+    TaskData,
+    TaskStatus,
+    set_task_status,
+    task_data_write,
+    task_list,
+    task_recent_rebuild,
+    task_status_many,
+)
+
+
+def _sizes() -> list[int]:
+    value = os.environ.get("HIPERCOW_BENCHMARK_TASKS", "10000")
+    return [int(x) for x in value.split(",")]
+
+
+def _latency() -> float:
+    return float(os.environ.get("HIPERCOW_BENCHMARK_LATENCY", "0"))
+
+
+# Roughly what a root looks like part way through a large bundle.
+STATUS_CYCLE = [
+    TaskStatus.SUCCESS,
+    TaskStatus.SUCCESS,
+    TaskStatus.SUCCESS,
+    TaskStatus.FAILURE,
+    TaskStatus.RUNNING,
+    TaskStatus.SUBMITTED,
+    TaskStatus.SUBMITTED,
+    None,
+]
+
+BUNDLE = "benchmark"
+
+
+def _report(label, elapsed, n):
+    print(f"{label}: {elapsed:.2f}s, {1e6 * elapsed / n:.1f}us per task")
+
+
+def _task_data(task_id: str) -> TaskData:
+    return TaskData(
+        task_id=task_id,
+        method="shell",
+        data={"cmd": ["echo", task_id]},
+        path=".",
+        environment="empty",
+        resources=None,
+        envvars={},
+    )
+
+
+# Statuses that we have already read are remembered for the lifetime
+# of the process, so clear these to time a fresh 'hipercow' command.
+def _forget_statuses() -> None:
+    task._TERMINAL_STATUS_CACHE.clear()
+    task._TERMINAL_STATUS_LOADED.clear()
+
+
+@contextmanager
+def _simulate_latency(path: Path, latency: float):
+    if latency <= 0:
+        yield
+        return
+    prefix = str(path)
+
+    def slow(fn):
+        @wraps(fn)
+        def wrapper(p, *args, **kwargs):
+            if os.fspath(p).startswith(prefix):
+                time.sleep(latency)
+            return fn(p, *args, **kwargs)
+
+        return wrapper
+
+    patch = {
+        (os, "stat"): slow(os.stat),
+        (os, "scandir"): slow(os.scandir),
+        (os, "listdir"): slow(os.listdir),
+        (os, "mkdir"): slow(os.mkdir),
+        (io, "open"): slow(io.open),
+    }
+    orig = {k: getattr(*k) for k in patch}
+    try:
+        for (module, name), fn in patch.items():
+            setattr(module, name, fn)
+        yield
+    finally:
+        for (module, name), fn in orig.items():
+            setattr(module, name, fn)
+
+
+@pytest.fixture(scope="module", params=_sizes(), ids=lambda n: f"n{n}")
+def store(request, tmp_path_factory):
+    n = request.param
+    path = tmp_path_factory.mktemp(f"store-{n}")
+    root.init(path)
+    r = root.open_root(path)
+    task_ids = [f"{i:032x}" for i in range(n)]
+    t0 = time.perf_counter()
+    with _simulate_latency(path, _latency()):
+        for i, task_id in enumerate(task_ids):
+            task_data_write(_task_data(task_id), r)
+            status = STATUS_CYCLE[i % len(STATUS_CYCLE)]
+            if status is not None:
+                set_task_status(task_id, status, None, r)
+    _report("create", time.perf_counter() - t0, n)
+    bundle_create(task_ids, BUNDLE, validate=False, root=r)
+    return r, task_ids
+
+
+def _time(label, store, fn):
+    r, task_ids = store
+    _forget_statuses()
+    with _simulate_latency(r.path, _latency()):
+        t0 = time.perf_counter()
+        res = fn(r)
+        elapsed = time.perf_counter() - t0
+    _report(label, elapsed, len(task_ids))
+    return res
+
+
+@pytest.mark.benchmark
+def test_benchmark_task_list(store):
+    res = _time("task_list", store, lambda r: task_list(root=r))
+    assert len(res) == len(store[1])
+
+
+@pytest.mark.benchmark
+def test_benchmark_task_list_without_index(store):
+    r, task_ids = store
+    path_index = r.path_task_index()
+    path_index.rename(path_index.with_suffix(".bak"))
+    try:
+        res = _time("task_list, no index", store, lambda r: task_list(root=r))
+    finally:
+        path_index.with_suffix(".bak").rename(path_index)
+    assert len(res) == len(task_ids)
+
+
+@pytest.mark.benchmark
+def test_benchmark_task_status(store):
+    task_ids = store[1]
+    res = _time(
+        "task_status_many", store, lambda r: task_status_many(task_ids, r)
+    )
+    expected = [TaskStatus.CREATED if s is None else s for s in STATUS_CYCLE]
+    assert res[: len(expected)] == expected[: len(res)]
+
+
+@pytest.mark.benchmark
+def test_benchmark_bundle_status(store):
+    res = _time("bundle_status", store, lambda r: bundle_status(BUNDLE, r))
+    assert len(res) == len(store[1])
+
+
+@pytest.mark.benchmark
+def test_benchmark_task_recent_rebuild(store):
+    _time("task_recent_rebuild", store, lambda r: task_recent_rebuild(root=r))
+    r, task_ids = store
+    assert r.path_recent().read_text().split() == task_ids
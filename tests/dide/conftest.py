@@ -0,0 +1,23 @@
+import pytest
+
+from hipercow.dide import driver, mounts
+
+
+# The DIDE driver keeps logged-in web clients for the lifetime of the
+# process, which would leak mocked clients between tests.
+@pytest.fixture(autouse=True)
+def clear_web_clients():
+    driver._web_client.cache_clear()
+    yield
+    driver._web_client.cache_clear()
+
+
+# Similarly, detected mounts are cached in the process and on disk,
+# so we keep these away from the user's cache.
+@pytest.fixture(autouse=True)
+def isolate_mounts_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "cache"))
+    mounts._MOUNTS_CACHE.clear()
+    yield
+    mounts._MOUNTS_CACHE.clear()
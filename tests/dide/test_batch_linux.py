@@ -1,9 +1,7 @@
 from hipercow import root
-from hipercow import task_create as tc
 from hipercow.dide import batch_linux
 from hipercow.dide.configuration import dide_configuration
 from hipercow.dide.mounts import Mount
-from hipercow.util import transient_working_directory
 
 
 def test_can_create_batch_data(tmp_path):
@@ -15,10 +13,8 @@ def test_can_create_batch_data(tmp_path):
         r, mounts=[m], python_version=None, check_credentials=False
     )
 
-    res = batch_linux._template_data_task_run_linux("abcde", config)
-    assert res["task_id"] == "abcde"
-    assert res["task_id_1"] == "ab"
-    assert res["task_id_2"] == "cde"
+    res = batch_linux._template_data_task_run_linux(config)
+    assert "task_id" not in res
     assert res["hipercow_root_path"] == "/mnt/homes/bob/my/project/"
 
 
@@ -33,13 +29,23 @@ def test_can_write_batch(tmp_path):
         r, mounts=[m], python_version=None, check_credentials=False
     )
 
-    with transient_working_directory(path):
-        tid = tc.task_create_shell(["echo", "hello world"], root=r)
-
-    run_sh = batch_linux.write_batch_task_run_linux(tid, config, r)
-    path_rel = f"hipercow/py/tasks/{tid[:2]}/{tid[2:]}/task_run.sh"
+    run_sh = batch_linux.write_batch_task_run_linux(config, r)
+    runners = list(r.path_base().glob("runners/*/task_run.sh"))
+    assert len(runners) == 1
+    path_rel = runners[0].relative_to(r.path).as_posix()
     assert run_sh == f"/mnt/cluster/project/bob/my/project/{path_rel}"
-    assert (r.path / path_rel).exists()
+    with (r.path / path_rel).open() as f:
+        contents = f.read()
+    assert "hipercow task eval --capture $TASK_ID" in contents
+    assert "hipercow/py/tasks/${TASK_ID:0:2}/${TASK_ID:2}/" in contents
+
+    # The script is reused, as long as the configuration is unchanged
+    mtime = runners[0].stat().st_mtime_ns
+    assert batch_linux.write_batch_task_run_linux(config, r) == run_sh
+    assert runners[0].stat().st_mtime_ns == mtime
+    config.python_version = "3.12"
+    assert batch_linux.write_batch_task_run_linux(config, r) != run_sh
+    assert len(list(r.path_base().glob("runners/*/task_run.sh"))) == 2
 
 
 def test_can_create_provision_data(tmp_path):
@@ -72,3 +78,21 @@ def test_can_write_provision_batch(tmp_path):
     path_rel = "hipercow/py/env/myenv/provision/abcdef/run.sh"
     assert run_sh == f"/mnt/vimc-cc2/bob/my/project/{path_rel}"
     assert (r.path / path_rel).exists()
+
+
+def test_can_write_worker_batch(tmp_path):
+    path = tmp_path / "my/project"
+    root.init(path)
+    r = root.open_root(path)
+    m = Mount(
+        host="wpia-hn", remote="cluster-storage/project/bob", local=tmp_path
+    )
+    config = dide_configuration(
+        r, mounts=[m], python_version=None, check_credentials=False
+    )
+
+    run_sh = batch_linux.write_batch_worker_run_linux("abcdef", config, r)
+    path_rel = "hipercow/py/workers/abcdef/worker_run.sh"
+    assert run_sh == f"/mnt/cluster/project/bob/my/project/{path_rel}"
+    with (r.path / path_rel).open() as f:
+        assert "hipercow worker run abcdef" in f.read()
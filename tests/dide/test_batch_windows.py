@@ -1,9 +1,9 @@
+from pathlib import PureWindowsPath
+
 from hipercow import root
-from hipercow import task_create as tc
 from hipercow.dide import batch_windows
 from hipercow.dide.configuration import dide_configuration
 from hipercow.dide.mounts import Mount
-from hipercow.util import transient_working_directory
 
 
 def test_can_create_batch_data(tmp_path):
@@ -15,10 +15,8 @@ def test_can_create_batch_data(tmp_path):
         r, mounts=[m], python_version=None, check_credentials=False
     )
 
-    res = batch_windows._template_data_task_run_win("abcde", config)
-    assert res["task_id"] == "abcde"
-    assert res["task_id_1"] == "ab"
-    assert res["task_id_2"] == "cde"
+    res = batch_windows._template_data_task_run_win(config)
+    assert "task_id" not in res
     assert res["hipercow_root_drive"] == "V:"
     assert res["hipercow_root_path"] == "\\my\\project"
     assert (
@@ -36,13 +34,16 @@ def test_can_write_batch(tmp_path):
         r, mounts=[m], python_version=None, check_credentials=False
     )
 
-    with transient_working_directory(path):
-        tid = tc.task_create_shell(["echo", "hello world"], root=r)
-
-    unc = batch_windows.write_batch_task_run_win(tid, config, r)
-    path_rel = f"hipercow\\py\\tasks\\{tid[:2]}\\{tid[2:]}\\task_run.bat"
+    unc = batch_windows.write_batch_task_run_win(config, r)
+    runners = list(r.path_base().glob("runners/*/task_run.bat"))
+    assert len(runners) == 1
+    path_rel = str(PureWindowsPath(runners[0].relative_to(r.path)))
     assert unc == f"\\\\wpia-hn\\didehomes\\bob\\my\\project\\{path_rel}"
-    assert (r.path / path_rel.replace("\\", "/")).exists()
+    assert batch_windows.write_batch_task_run_win(config, r) == unc
+    with runners[0].open() as f:
+        contents = f.read()
+    assert "hipercow task eval --capture %TASK_ID%" in contents
+    assert "hipercow\\py\\tasks\\%TASK_ID:~0,2%\\%TASK_ID:~2%" in contents
 
 
 def test_can_create_provision_data(tmp_path):
@@ -78,3 +79,19 @@ def test_can_write_provision_batch(tmp_path):
     path_rel = "hipercow\\py\\env\\myenv\\provision\\abcdef\\run.bat"
     assert unc == f"\\\\wpia-hn\\didehomes\\bob\\my\\project\\{path_rel}"
     assert (r.path / path_rel.replace("\\", "/")).exists()
+
+
+def test_can_write_worker_batch(tmp_path):
+    path = tmp_path / "my/project"
+    root.init(path)
+    r = root.open_root(path)
+    m = Mount(host="wpia-hn", remote="didehomes/bob", local=tmp_path)
+    config = dide_configuration(
+        r, mounts=[m], python_version=None, check_credentials=False
+    )
+
+    unc = batch_windows.write_batch_worker_run_win("abcdef", config, r)
+    path_rel = "hipercow\\py\\workers\\abcdef\\worker_run.bat"
+    assert unc == f"\\\\wpia-hn\\didehomes\\bob\\my\\project\\{path_rel}"
+    with (r.path / path_rel.replace("\\", "/")).open() as f:
+        assert "hipercow worker run abcdef" in f.read()
@@ -16,8 +16,10 @@ from hipercow.dide.bootstrap import (
     bootstrap,
 )
 from hipercow.dide.mounts import Mount
-from hipercow.dide.web import DideWebClient
+from hipercow.dide.web import DideStatusPoller, DideTaskStatus, DideWebClient
+from hipercow.poll import AdaptivePoll
 from hipercow.resources import TaskResources
+from hipercow.task import TaskStatus
 from hipercow.util import file_create
 
 
@@ -113,6 +115,65 @@ def test_can_wait_on_successful_tasks(tmp_path, capsys):
     assert "3.12: success" in out
 
 
+def test_waiting_tasks_share_status_requests(tmp_path, capsys):
+    client = mock.MagicMock(spec=DideWebClient)
+    client.status_user.return_value = [
+        DideTaskStatus("1", "", TaskStatus.SUCCESS, *([None] * 6)),
+        DideTaskStatus("2", "", TaskStatus.SUCCESS, *([None] * 6)),
+    ]
+    poller = DideStatusPoller(client, interval=60)
+    mount = Mount(host="wpia-hn.hpc", remote="hipercow", local=tmp_path)
+    bootstrap_id = "abcdef"
+    tasks = [
+        BootstrapTask(
+            mount, bootstrap_id, client, "1", "3.11", "windows", poller=poller
+        ),
+        BootstrapTask(
+            mount, bootstrap_id, client, "2", "3.12", "windows", poller=poller
+        ),
+    ]
+    _bootstrap_wait(tasks)
+    out = capsys.readouterr().out
+    assert "3.11: success" in out
+    assert "3.12: success" in out
+    assert client.status_user.call_count == 1
+    assert client.status_job.call_count == 0
+
+
+def test_wait_on_tasks_together(tmp_path, capsys, mocker):
+    def listing(*status):
+        return [
+            DideTaskStatus(str(i), "", s, *([None] * 6))
+            for i, s in enumerate(status)
+        ]
+
+    client = mock.MagicMock(spec=DideWebClient)
+    client.status_user.side_effect = [
+        listing(TaskStatus.SUBMITTED, TaskStatus.SUBMITTED),
+        listing(TaskStatus.SUBMITTED, TaskStatus.SUBMITTED),
+        listing(TaskStatus.RUNNING, TaskStatus.SUCCESS),
+        listing(TaskStatus.SUCCESS, TaskStatus.SUCCESS),
+    ]
+    mock_sleep = mocker.patch("time.sleep")
+    poller = DideStatusPoller(client, interval=60)
+    mount = Mount(host="wpia-hn.hpc", remote="hipercow", local=tmp_path)
+    tasks = [
+        BootstrapTask(
+            mount, "abcdef", client, str(i), v, "windows", poller=poller
+        )
+        for i, v in enumerate(["3.11", "3.12"])
+    ]
+    _bootstrap_wait(tasks, AdaptivePoll(initial=1, factor=2))
+    out = capsys.readouterr().out
+    assert "3.11: success" in out
+    assert "3.12: success" in out
+    # One request per check for both tasks:
+    assert client.status_user.call_count == 4
+    assert client.status_job.call_count == 0
+    # Backing off while both tasks wait in the queue
+    assert mock_sleep.mock_calls == [mock.call(1), mock.call(2), mock.call(1)]
+
+
 def test_can_error_on_failed_tasks(tmp_path, capsys):
     client = mock.MagicMock(spec=DideWebClient)
     client.status_job.side_effect = ["success", "failure"]
@@ -160,13 +221,34 @@ def test_can_launch_bootstrap(mocker):
     mount = mock_mount.return_value
 
     assert mock_submit.mock_calls[0] == mock.call(
-        client, mount, mock.ANY, "3.10", "windows", "hipercow", ""
+        client,
+        mount,
+        mock.ANY,
+        "3.10",
+        "windows",
+        "hipercow",
+        "",
+        poller=mock.ANY,
     )
+    pollers = {id(c.kwargs["poller"]) for c in mock_submit.mock_calls}
+    assert len(pollers) == 1
     assert mock_wait.call_count == 1
     assert len(mock_wait.mock_calls[0].args[0]) == 8
     assert mock_wait.mock_calls[0].args[0][3] == mock_submit.return_value
 
 
+def test_single_bootstrap_task_does_not_list_all_jobs(mocker):
+    mock_submit = mock.MagicMock()
+    mocker.patch("hipercow.dide.bootstrap._web_client")
+    mocker.patch("hipercow.dide.bootstrap._bootstrap_mount")
+    mocker.patch("hipercow.dide.bootstrap._bootstrap_check_pipx_pyz")
+    mocker.patch("hipercow.dide.bootstrap._bootstrap_submit", mock_submit)
+    mocker.patch("hipercow.dide.bootstrap._bootstrap_wait")
+    bootstrap(None, python_versions=["3.11"], platforms=["linux"])
+    assert mock_submit.call_count == 1
+    assert mock_submit.mock_calls[0].kwargs["poller"] is None
+
+
 def test_error_if_no_pipx_pyz(tmp_path):
     with pytest.raises(Exception, match=r"Expected 'pipx.pyz' to be found"):
         _bootstrap_check_pipx_pyz(tmp_path)
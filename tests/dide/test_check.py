@@ -115,9 +115,10 @@ def test_failed_connection_test(mocker, capsys):
 
 
 def test_successful_path_mapping(mocker, capsys):
-    mocker.patch("hipercow.dide.check.detect_mounts")
+    mock_detect = mocker.patch("hipercow.dide.check.detect_mounts")
     mocker.patch("hipercow.dide.check.remap_path")
     assert _dide_check_path(Path.cwd())
+    assert mock_detect.call_args == mocker.call(refresh=True)
 
     out = capsys.readouterr().out
     assert "Path looks like it is on a network share" in out
@@ -1,16 +1,30 @@
+import time
 from unittest import mock
 
+import pytest
+
 from hipercow import root
+from hipercow.bundle import bundle_cancel, bundle_load
 from hipercow.configure import configure
+from hipercow.dide import auth
 from hipercow.dide.configuration import dide_configuration
+from hipercow.dide.driver import _web_client
 from hipercow.dide.mounts import Mount
-from hipercow.dide.web import Credentials, DideWebClient
+from hipercow.dide.web import Credentials, DideNodeLoad, DideWebClient
 from hipercow.driver import list_drivers, load_driver, show_configuration
 from hipercow.environment import environment_new
 from hipercow.provision import provision
 from hipercow.resources import TaskResources
-from hipercow.task import task_log
+from hipercow.task import (
+    TaskStatus,
+    _task_index_read,
+    task_driver,
+    task_log,
+    task_recent,
+    task_status_many,
+)
 from hipercow.task_create import task_create_shell
+from hipercow.task_create_bulk import bulk_create_shell
 from hipercow.util import file_create, transient_working_directory
 
 
@@ -56,13 +70,156 @@ def test_creating_task_triggers_submission(tmp_path, mocker):
         tid = task_create_shell(["echo", "hello world"], root=r)
 
     assert mock_web_client.call_count == 1
-    assert mock_web_client.call_args == mock.call(mock_creds)
+    assert mock_web_client.call_args == mock.call(
+        mock_creds, fetch_credentials=mock.ANY
+    )
     cl = mock_web_client.return_value
     assert cl.login.call_count == 1
     assert cl.submit.call_count == 1
-    # testing arguments here would be possibly useful, but we hit
+    # testing the path here would be possibly useful, but we hit
     # issues with pathname normalisation very quickly.
-    assert (r.path_task(tid) / "task_run.bat").exists()
+    assert cl.submit.mock_calls[0][2]["args"] == [tid]
+    assert len(list(r.path_base().glob("runners/*/task_run.bat"))) == 1
+
+
+def test_bulk_creation_submits_with_one_client(tmp_path, mocker):
+    path = tmp_path / "a" / "b"
+    root.init(path)
+    r = root.open_root(path)
+    mock_mounts = [Mount(host="projects", remote="other", local=tmp_path)]
+    mock_creds = Credentials("bob", "secret")
+    mock_web_client = mock.MagicMock(spec=DideWebClient)
+
+    mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
+    mocker.patch(
+        "hipercow.dide.driver.fetch_credentials", return_value=mock_creds
+    )
+    mocker.patch("hipercow.dide.driver.DideWebClient", mock_web_client)
+    mock_web_client.return_value.submit.side_effect = ["1", "2", "3"]
+
+    configure(
+        "dide-windows", python_version=None, root=r, check_credentials=False
+    )
+    with transient_working_directory(path):
+        nm = bulk_create_shell(["echo", "@a"], {"a": ["x", "y", "z"]}, root=r)
+
+    assert mock_web_client.call_count == 1
+    cl = mock_web_client.return_value
+    assert cl.login.call_count == 1
+    assert cl.submit.call_count == 3
+    ids = bundle_load(nm, root=r).task_ids
+    # A single script runs all tasks in the bundle
+    assert len(list(r.path_base().glob("runners/*/task_run.bat"))) == 1
+    assert len({x[1][0] for x in cl.submit.mock_calls}) == 1
+    for tid, dide_id in zip(ids, ["1", "2", "3"], strict=True):
+        assert not (r.path_task(tid) / "task_run.bat").exists()
+        with (r.path_task(tid) / "dide_id").open() as f:
+            assert f.read() == dide_id
+
+
+def test_tasks_are_marked_submitted_as_they_are_submitted(tmp_path, mocker):
+    path = tmp_path / "a" / "b"
+    root.init(path)
+    r = root.open_root(path)
+    mock_mounts = [Mount(host="projects", remote="other", local=tmp_path)]
+    mock_web_client = mock.MagicMock(spec=DideWebClient)
+
+    mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
+    mocker.patch(
+        "hipercow.dide.driver.fetch_credentials",
+        return_value=Credentials("bob", "secret"),
+    )
+    mocker.patch("hipercow.dide.driver.DideWebClient", mock_web_client)
+    mock_web_client.return_value.submit.side_effect = [
+        "1",
+        "2",
+        Exception("portal went away"),
+    ]
+
+    configure(
+        "dide-windows", python_version=None, root=r, check_credentials=False
+    )
+    with transient_working_directory(path):
+        with pytest.raises(Exception, match="portal went away"):
+            bulk_create_shell(["echo", "@a"], {"a": ["x", "y", "z"]}, root=r)
+
+    ids = task_recent(root=r)
+    assert task_status_many(ids, r) == [
+        TaskStatus.SUBMITTED,
+        TaskStatus.SUBMITTED,
+        TaskStatus.CREATED,
+    ]
+    assert task_driver(ids[0], r) == "dide-windows"
+    assert _task_index_read(r)[ids[1]] == TaskStatus.SUBMITTED
+
+
+def test_bulk_cancel_sends_chunked_requests(tmp_path, mocker):
+    path = tmp_path / "a" / "b"
+    root.init(path)
+    r = root.open_root(path)
+    mock_mounts = [Mount(host="projects", remote="other", local=tmp_path)]
+    mock_creds = Credentials("bob", "secret")
+    mock_web_client = mock.MagicMock(spec=DideWebClient)
+
+    mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
+    mocker.patch(
+        "hipercow.dide.driver.fetch_credentials", return_value=mock_creds
+    )
+    mocker.patch("hipercow.dide.driver.DideWebClient", mock_web_client)
+    mocker.patch("hipercow.dide.driver._CANCEL_CHUNK_SIZE", 2)
+    cl = mock_web_client.return_value
+    cl.submit.side_effect = ["1", "2", "3"]
+    cl.cancel.side_effect = [{"1": "OK", "2": "WRONG_STATE"}, {"3": "OK"}]
+
+    configure(
+        "dide-windows", python_version=None, root=r, check_credentials=False
+    )
+    with transient_working_directory(path):
+        nm = bulk_create_shell(["echo", "@a"], {"a": ["x", "y", "z"]}, root=r)
+
+    assert bundle_cancel(nm, root=r) == [True, False, True]
+    assert cl.cancel.mock_calls == [
+        mock.call(["1", "2"]),
+        mock.call(["3"]),
+    ]
+    ids = bundle_load(nm, root=r).task_ids
+    assert task_status_many(ids, r) == [
+        TaskStatus.CANCELLED,
+        TaskStatus.SUBMITTED,
+        TaskStatus.CANCELLED,
+    ]
+
+
+def test_reuse_web_client_within_process(mocker):
+    creds = Credentials("bob", "secret")
+    mock_fetch = mocker.patch(
+        "hipercow.dide.driver.fetch_credentials", return_value=creds
+    )
+    mock_web_client = mocker.patch(
+        "hipercow.dide.driver.DideWebClient",
+        side_effect=lambda *_args, **_kw: mock.MagicMock(spec=DideWebClient),
+    )
+    cl1 = _web_client()
+    assert _web_client() is cl1
+    assert mock_web_client.call_count == 1
+    assert mock_web_client.call_args == mock.call(
+        creds, fetch_credentials=mock_fetch
+    )
+    assert cl1.login.call_count == 1
+    # Credentials are looked up once only
+    assert mock_fetch.call_count == 1
+
+    # Until we authenticate again:
+    mocker.patch("keyring.set_password")
+    mocker.patch("hipercow.dide.auth.check_access")
+    mocker.patch("hipercow.dide.auth._default_username", return_value="bob")
+    mocker.patch("hipercow.dide.auth._get_username", return_value="alice")
+    mocker.patch("hipercow.dide.auth._get_password", return_value="pw")
+    auth.authenticate()
+    cl2 = _web_client()
+    assert cl2 is not cl1
+    assert mock_web_client.call_count == 2
+    assert mock_fetch.call_count == 2
 
 
 def test_creating_task_with_resources(tmp_path, mocker):
@@ -90,14 +247,16 @@ def test_creating_task_with_resources(tmp_path, mocker):
         )
 
     assert mock_web_client.call_count == 1
-    assert mock_web_client.call_args == mock.call(mock_creds)
+    assert mock_web_client.call_args == mock.call(
+        mock_creds, fetch_credentials=mock.ANY
+    )
     cl = mock_web_client.return_value
     assert cl.login.call_count == 1
     assert cl.submit.call_count == 1
     assert cl.submit.mock_calls[0][2]["resources"] == TaskResources(
         queue="AllNodes", cores=4
     )
-    assert (r.path_task(tid) / "task_run.bat").exists()
+    assert cl.submit.mock_calls[0][2]["args"] == [tid]
 
 
 def test_provision_using_driver(tmp_path, mocker):
@@ -130,11 +289,15 @@ def test_resources_using_driver(tmp_path, mocker):
     mock_provision = mock.MagicMock()
     mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
     mocker.patch("hipercow.dide.driver._dide_provision_win", mock_provision)
+    mock_client = mocker.patch(
+        "hipercow.dide.driver._web_client", side_effect=Exception("offline")
+    )
     configure(
         "dide-windows", python_version=None, check_credentials=False, root=r
     )
     dr = load_driver(None, r)
-    resources = dr.resources()
+    resources = dr.resources(r)
+    assert mock_client.call_count == 1
     assert resources.queues.default == "AllNodes"
     assert resources.max_cores == 32
     assert resources.max_memory == 512
@@ -183,3 +346,58 @@ def test_get_outer_logs_from_web_client(tmp_path, mocker):
     assert res == mock_web_client.log.return_value
     assert mock_web_client.log.call_count == 1
     assert mock_web_client.log.mock_calls[0] == mock.call("1234")
+
+
+def test_linux_max_cores_are_fixed(tmp_path, mocker):
+    path = tmp_path / "a" / "b"
+    root.init(path)
+    r = root.open_root(path)
+    mock_mounts = [Mount(host="projects", remote="other", local=tmp_path)]
+    mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
+    mock_client = mocker.patch("hipercow.dide.driver._web_client")
+    configure(
+        "dide-linux", python_version=None, check_credentials=False, root=r
+    )
+    assert load_driver(None, r).resources(r).max_cores == 32
+    assert mock_client.call_count == 0
+
+
+def test_max_cores_come_from_portal_and_are_cached(tmp_path, mocker):
+    path = tmp_path / "a" / "b"
+    root.init(path)
+    r = root.open_root(path)
+    mock_mounts = [Mount(host="projects", remote="other", local=tmp_path)]
+    mocker.patch("hipercow.dide.driver.detect_mounts", return_value=mock_mounts)
+    cl = mock.MagicMock(spec=DideWebClient)
+    cl.load_nodes.return_value = [
+        DideNodeLoad("a", 0, 16, 16),
+        DideNodeLoad("b", 4, 60, 64),
+    ]
+    mock_client = mocker.patch(
+        "hipercow.dide.driver._web_client", return_value=cl
+    )
+    configure(
+        "dide-windows", python_version=None, check_credentials=False, root=r
+    )
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert mock_client.call_count == 1
+    assert r.path_configuration_cache("dide-windows-resources").exists()
+    assert list_drivers(r) == ["dide-windows"]
+
+    # Once the cache expires, we ask again, but fall back on the
+    # previous answer if the portal can't be reached:
+    mocker.patch("time.time", return_value=time.time() + 2 * 24 * 60 * 60)
+    mock_client.side_effect = Exception("offline")
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert mock_client.call_count == 2
+    # ...and we remember that answer, rather than trying again each
+    # time, as we do for an empty listing:
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert mock_client.call_count == 2
+    mocker.patch("time.time", return_value=time.time() + 4 * 24 * 60 * 60)
+    mock_client.side_effect = None
+    cl.load_nodes.return_value = []
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert load_driver(None, r).resources(r).max_cores == 64
+    assert mock_client.call_count == 3
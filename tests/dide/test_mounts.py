@@ -1,3 +1,4 @@
+import time
 from pathlib import Path
 from subprocess import CompletedProcess
 from unittest import mock
@@ -133,26 +134,128 @@ def test_throw_if_error_in_windows_mount_point():
 
 
 def test_use_windows_detection_on_windows(mocker):
-    mock_detect_windows = mock.Mock()
-    mock_detect_unix = mock.Mock()
+    mock_detect_windows = mock.Mock(return_value=[])
+    mock_detect_linux = mock.Mock(return_value=[])
+    mock_detect_unix = mock.Mock(return_value=[])
     mocker.patch("platform.system", return_value="Windows")
     mocker.patch(
         "hipercow.dide.mounts._detect_mounts_windows", mock_detect_windows
     )
+    mocker.patch("hipercow.dide.mounts._detect_mounts_linux", mock_detect_linux)
     mocker.patch("hipercow.dide.mounts._detect_mounts_unix", mock_detect_unix)
     mounts.detect_mounts()
     assert mock_detect_windows.call_count == 1
+    assert mock_detect_linux.call_count == 0
     assert mock_detect_unix.call_count == 0
 
 
 def test_use_windows_detection_on_unix(mocker):
-    mock_detect_windows = mock.Mock()
-    mock_detect_unix = mock.Mock()
+    mock_detect_windows = mock.Mock(return_value=[])
+    mock_detect_linux = mock.Mock(return_value=[])
+    mock_detect_unix = mock.Mock(return_value=[])
     mocker.patch("platform.system", return_value="Linux")
     mocker.patch(
         "hipercow.dide.mounts._detect_mounts_windows", mock_detect_windows
     )
+    mocker.patch("hipercow.dide.mounts._detect_mounts_linux", mock_detect_linux)
     mocker.patch("hipercow.dide.mounts._detect_mounts_unix", mock_detect_unix)
     mounts.detect_mounts()
     assert mock_detect_windows.call_count == 0
+    assert mock_detect_linux.call_count == 1
+    assert mock_detect_unix.call_count == 0
+    mocker.patch("platform.system", return_value="Darwin")
+    mounts.detect_mounts()
     assert mock_detect_unix.call_count == 1
+    assert mock_detect_unix.call_args == mock.call("Darwin")
+
+
+def test_can_parse_linux_mountinfo():
+    data = (
+        "22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw\n"
+        "40 22 0:35 / /home/bob/net/home rw,relatime shared:2 - cifs "
+        "//qdrive.dide.ic.ac.uk/homes/bob rw,vers=3.1.1\n"
+        "41 22 0:36 / /home/bob/net/my\\040project rw - cifs "
+        "//wpia-hn/cluster-storage/my\\040project rw\n"
+        "43 22 0:38 / /home/bob/net/proj rw - cifs "
+        "//bob@projects.dide.ic.ac.uk/other rw\n"
+        "42 22 0:37 / /mnt/other rw - nfs4 server:/export rw\n"
+    )
+    res = mounts._parse_linux_mountinfo(data)
+    assert res == [
+        mounts.Mount(
+            host="qdrive", remote="homes/bob", local=Path("/home/bob/net/home")
+        ),
+        mounts.Mount(
+            host="wpia-hn",
+            remote="cluster-storage/my project",
+            local=Path("/home/bob/net/my project"),
+        ),
+        mounts.Mount(
+            host="projects", remote="other", local=Path("/home/bob/net/proj")
+        ),
+    ]
+
+
+def test_fall_back_on_mount_without_mountinfo(mocker):
+    mocker.patch("pathlib.Path.open", side_effect=FileNotFoundError)
+    mock_detect_unix = mocker.patch(
+        "hipercow.dide.mounts._detect_mounts_unix", return_value=[]
+    )
+    assert mounts._detect_mounts_linux() == []
+    assert mock_detect_unix.call_args == mock.call("Linux")
+
+
+def test_mounts_are_cached(mocker):
+    m = mounts.Mount(host="projects", remote="other", local=Path("/local"))
+    mock_detect = mocker.patch(
+        "hipercow.dide.mounts._detect_mounts_linux", return_value=[m]
+    )
+    mocker.patch("platform.system", return_value="Linux")
+    assert mounts.detect_mounts() == [m]
+    assert mounts.detect_mounts() == [m]
+    assert mock_detect.call_count == 1
+
+    # A new process finds the mounts on disk
+    mounts._MOUNTS_CACHE.clear()
+    assert mounts.detect_mounts() == [m]
+    assert mock_detect.call_count == 1
+
+    # Until they expire
+    mocker.patch("time.time", return_value=time.time() + 3600)
+    assert mounts.detect_mounts() == [m]
+    assert mock_detect.call_count == 2
+
+    assert mounts.detect_mounts(refresh=True) == [m]
+    assert mock_detect.call_count == 3
+
+
+def test_mounts_cache_is_per_machine(mocker):
+    m1 = mounts.Mount(host="projects", remote="a", local=Path("/local"))
+    m2 = mounts.Mount(host="projects", remote="b", local=Path("/local"))
+    mock_detect = mocker.patch(
+        "hipercow.dide.mounts._detect_mounts_linux", side_effect=[[m1], [m2]]
+    )
+    mocker.patch("platform.system", return_value="Linux")
+    mocker.patch("platform.node", return_value="host1")
+    assert mounts.detect_mounts() == [m1]
+    # Another machine sharing the same home directory:
+    mounts._MOUNTS_CACHE.clear()
+    mocker.patch("platform.node", return_value="host2")
+    assert mounts.detect_mounts() == [m2]
+    assert mock_detect.call_count == 2
+    assert mounts._path_mounts_cache("linux-host1").exists()
+    assert mounts._path_mounts_cache("linux-host2").exists()
+
+
+def test_failure_to_remap_clears_mounts_cache(mocker):
+    m = mounts.Mount(host="projects", remote="other", local=Path("/local"))
+    mock_detect = mocker.patch(
+        "hipercow.dide.mounts._detect_mounts_linux", return_value=[m]
+    )
+    mocker.patch("platform.system", return_value="Linux")
+    mounts.remap_path(Path("/local/a"), mounts.detect_mounts())
+    with pytest.raises(Exception, match="Can't map local directory"):
+        mounts.remap_path(Path("/other"), mounts.detect_mounts())
+    assert mock_detect.call_count == 1
+    mounts.detect_mounts()
+    assert mock_detect.call_count == 2
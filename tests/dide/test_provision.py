@@ -10,7 +10,8 @@ from hipercow.dide import mounts
 from hipercow.dide.batch_windows import _dide_provision_win
 from hipercow.dide.configuration import dide_configuration
 from hipercow.dide.provision import ProvisionWaitWrapper
-from hipercow.dide.web import DideWebClient
+from hipercow.dide.web import DideStatusPoller, DideTaskStatus, DideWebClient
+from hipercow.poll import AdaptivePoll
 from hipercow.resources import TaskResources
 from hipercow.task import TaskStatus
 from hipercow.util import transient_working_directory
@@ -28,7 +29,7 @@ def test_can_provision_with_dide_win(tmp_path, mocker):
     )
 
     mock_client = mock.MagicMock(spec=DideWebClient)
-    mocker.patch("hipercow.dide.batch_windows.taskwait")
+    mocker.patch("hipercow.dide.batch_windows.taskwait_poll")
     mocker.patch(
         "hipercow.dide.configuration.remap_path", return_value=path_map
     )
@@ -46,11 +47,11 @@ def test_can_provision_with_dide_win(tmp_path, mocker):
         resources=resources,
     )
 
-    assert hipercow.dide.batch_windows.taskwait.call_count == 1
-    assert hipercow.dide.batch_windows.taskwait.mock_calls[0] == mock.call(
-        mock.ANY
+    assert hipercow.dide.batch_windows.taskwait_poll.call_count == 1
+    assert hipercow.dide.batch_windows.taskwait_poll.mock_calls[0] == mock.call(
+        mock.ANY, AdaptivePoll()
     )
-    task = hipercow.dide.batch_windows.taskwait.mock_calls[0].args[0]
+    task = hipercow.dide.batch_windows.taskwait_poll.mock_calls[0].args[0]
     assert isinstance(task, ProvisionWaitWrapper)
     assert task.client == mock_client
     assert task.dide_id == mock_client.submit.return_value
@@ -65,6 +66,20 @@ def test_can_get_status_from_wait_wrapper():
     assert client.status_job.call_count == 2
 
 
+def test_wait_wrapper_can_use_shared_poller():
+    client = mock.MagicMock(spec=DideWebClient)
+    client.status_user.return_value = [
+        DideTaskStatus("1234", "", TaskStatus.RUNNING, *([None] * 6))
+    ]
+    poller = DideStatusPoller(client)
+    task = ProvisionWaitWrapper(
+        mock.ANY, "myenv", "abcdef", client, "1234", poller=poller
+    )
+    assert task.status() == "running"
+    assert client.status_user.call_count == 1
+    assert client.status_job.call_count == 0
+
+
 def test_wait_wrapper_can_get_log(tmp_path):
     root.init(tmp_path)
     r = root.open_root(tmp_path)
@@ -95,7 +110,9 @@ def test_throw_after_failed_provision_with_dide_win(tmp_path, mocker, capsys):
     mock_client = mock.MagicMock(spec=DideWebClient)
     mock_client.log.return_value = "more logs"
     result = Result("failure", 100, 123)
-    mocker.patch("hipercow.dide.batch_windows.taskwait", return_value=result)
+    mocker.patch(
+        "hipercow.dide.batch_windows.taskwait_poll", return_value=result
+    )
     mocker.patch(
         "hipercow.dide.configuration.remap_path", return_value=path_map
     )
@@ -116,4 +133,4 @@ def test_throw_after_failed_provision_with_dide_win(tmp_path, mocker, capsys):
     assert mock_client.log.mock_calls[0] == mock.call(
         mock_client.submit.return_value
     )
-    assert hipercow.dide.batch_windows.taskwait.call_count == 1
+    assert hipercow.dide.batch_windows.taskwait_poll.call_count == 1
@@ -1,6 +1,9 @@
 import datetime
 import json
 import math
+import platform
+from pathlib import Path
+from unittest import mock
 
 import pytest
 import responses
@@ -9,6 +12,7 @@ from hipercow.__about__ import __version__ as hipercow_version
 from hipercow.dide import web
 from hipercow.resources import TaskResources
 from hipercow.task import TaskStatus
+from hipercow.util import transient_envvars
 
 
 def create_client(*, logged_in=True):
@@ -279,6 +283,182 @@ def test_login_if_using_authenticated_endpoints():
     assert cl.logged_in()
 
 
+@responses.activate
+def test_login_again_if_session_expires():
+    login = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/index.php",
+        body="",
+        status=200,
+    )
+    expired = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        status=403,
+    )
+    # Registered responses for the same url are used in turn
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        body="foo\nbar\n",
+        status=200,
+    )
+    cl = create_client()
+    assert cl.headnodes() == ["foo", "bar"]
+    assert expired.call_count == 1
+    assert login.call_count == 1
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_fetch_credentials_again_if_session_expires():
+    login = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/index.php",
+        body="",
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        status=403,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        body="foo\n",
+        status=200,
+    )
+    fetch = mock.Mock(return_value=web.Credentials("bob", "new"))
+    cl = web.DideWebClient(
+        web.Credentials("bob", "old"), fetch_credentials=fetch
+    )
+    cl._client._has_logged_in = True
+    assert cl.headnodes() == ["foo"]
+    assert fetch.call_count == 1
+    assert login.call_count == 1
+    assert "pw=" + web.encode64("new").replace("=", "%3D") in (
+        login.calls[0].request.body
+    )
+
+
+@responses.activate
+def test_only_login_again_once_if_session_expires():
+    login = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/index.php",
+        body="",
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        status=401,
+    )
+    cl = create_client()
+    with pytest.raises(Exception, match="401"):
+        cl.headnodes()
+    assert login.call_count == 1
+
+
+def test_session_cache_is_disabled_by_default():
+    with transient_envvars({"HIPERCOW_DIDE_SESSION_CACHE": None}):
+        assert web._session_cache_path("bob") is None
+    with transient_envvars(
+        {"HIPERCOW_DIDE_SESSION_CACHE": "1", "XDG_CACHE_HOME": "/cache"}
+    ):
+        assert web._session_cache_path("bob") == Path(
+            "/cache/hipercow/dide-session-bob.json"
+        )
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="posix only")
+@responses.activate
+def test_can_reuse_session_from_cache(tmp_path):
+    login = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/index.php",
+        body="",
+        status=200,
+        headers={"Set-Cookie": "PHPSESSID=abc123; Path=/"},
+    )
+    responses.add(
+        responses.GET,
+        "https://mrcdata.dide.ic.ac.uk/hpc/logout.php",
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        body="wpia-hn\n",
+        status=200,
+    )
+    env = {"HIPERCOW_DIDE_SESSION_CACHE": "1", "XDG_CACHE_HOME": str(tmp_path)}
+    path = tmp_path / "hipercow" / "dide-session-bob.json"
+    with transient_envvars(env):
+        cl1 = web.DideWebClient(web.Credentials("bob", "secret"))
+        cl1.login()
+        assert login.call_count == 1
+        assert path.exists()
+        assert path.stat().st_mode & 0o777 == 0o600
+
+        cl2 = web.DideWebClient(web.Credentials("bob", "secret"))
+        cl2.login()
+        assert login.call_count == 1
+        assert cl2.logged_in()
+        assert cl2._client.cookies.get("PHPSESSID") == "abc123"
+
+        # Nothing about the password is saved with the session
+        assert "secret" not in path.read_text()
+
+        # Checking access always logs in
+        web.check_access(web.Credentials("bob", "secret"))
+        assert login.call_count == 2
+
+        cl2.logout()
+        assert not path.exists()
+
+
+@responses.activate
+def test_discard_cached_session_if_rejected(tmp_path):
+    login = responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/index.php",
+        body="",
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        status=403,
+    )
+    responses.add(
+        responses.POST,
+        "https://mrcdata.dide.ic.ac.uk/hpc/_listheadnodes.php",
+        body="foo\n",
+        status=200,
+    )
+    env = {"HIPERCOW_DIDE_SESSION_CACHE": "1", "XDG_CACHE_HOME": str(tmp_path)}
+    with transient_envvars(env):
+        cl = web.DideWebClient(web.Credentials("bob", "secret"))
+        path = cl._client._session_cache
+        cl._client.cookies.set("PHPSESSID", "old", domain="", path="/")
+        cl._client._session_save()
+        assert path.exists()
+        assert cl.headnodes() == ["foo"]
+        assert login.call_count == 1
+
+
+def test_ignore_corrupt_session_cache(tmp_path):
+    env = {"HIPERCOW_DIDE_SESSION_CACHE": "1", "XDG_CACHE_HOME": str(tmp_path)}
+    with transient_envvars(env):
+        cl = web.DideHTTPClient(web.Credentials("bob", "secret"))
+        cl._session_cache.parent.mkdir(parents=True)
+        with cl._session_cache.open("w") as f:
+            f.write("{")
+        assert not cl._session_restore()
+
+
 def test_raise_if_no_access(mocker):
     mocker.patch("hipercow.dide.web.DideWebClient.__init__", return_value=None)
     mocker.patch(
@@ -361,3 +541,58 @@ def test_can_set_workdir():
         path, "job", "windows", resources=resources, workdir=None
     )
     assert data == data_cmp | {"wd": web.encode64(workdir)}
+
+
+def test_status_poller_shares_listing_between_jobs(mocker):
+    client = mock.MagicMock(spec=web.DideWebClient)
+    client.status_user.return_value = [
+        web.DideTaskStatus("1", "", TaskStatus.RUNNING, *([None] * 6)),
+        web.DideTaskStatus("2", "", TaskStatus.SUCCESS, *([None] * 6)),
+    ]
+    client.status_job.return_value = TaskStatus.SUBMITTED
+    mock_time = mocker.patch("time.monotonic", return_value=100)
+    poller = web.DideStatusPoller(client, interval=5)
+    assert poller.status("1") == TaskStatus.RUNNING
+    assert poller.status("2") == TaskStatus.SUCCESS
+    assert client.status_user.call_count == 1
+
+    # Not in the listing, so asked for separately
+    assert poller.status("3") == TaskStatus.SUBMITTED
+    assert client.status_job.mock_calls == [mock.call("3")]
+    assert client.status_user.call_count == 1
+
+    mock_time.return_value = 105
+    assert poller.status("1") == TaskStatus.RUNNING
+    assert client.status_user.call_count == 2
+
+
+def test_can_parse_empty_status_for_user():
+    assert web._client_parse_status_user("") == []
+    assert web._client_parse_status_user("\n") == []
+
+
+def test_can_pass_arguments_to_batch_script():
+    path = r"\\server\share\task_run.bat"
+    resources = TaskResources(queue="AllNodes")
+    data = web._client_body_submit(
+        path, "name", "wpia-hn", resources=resources, workdir=None, args=["abc"]
+    )
+    assert data["jobs"] == web.encode64(f"call {path} abc")
+    assert web._call_quote_batch_path("/a b/x.sh", "bash", ["1"]) == (
+        'bash "/a b/x.sh" 1'
+    )
+
+
+def test_can_parse_node_load():
+    txt = (
+        "Node\tFree\tUsed\tTotal\n"
+        "wpia-001\t10\t22\t32\n"
+        "wpia-002\t0\t64\t64\n"
+        "WPIA-HN\t8\t0\t8\n"
+    )
+    res = web._client_parse_load_nodes(txt)
+    assert res == [
+        web.DideNodeLoad("wpia-001", 10, 22, 32),
+        web.DideNodeLoad("wpia-002", 0, 64, 64),
+    ]
+    assert web._client_parse_load_nodes("") == []
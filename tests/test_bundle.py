@@ -1,15 +1,28 @@
+import shutil
+
 import pytest
 
+import hipercow.bundle
 from hipercow import root
 from hipercow.bundle import (
+    bundle_cancel,
     bundle_create,
     bundle_delete,
     bundle_list,
     bundle_load,
+    bundle_report,
     bundle_status,
     bundle_status_reduce,
+    bundle_wait,
+)
+from hipercow.configure import configure
+from hipercow.example import ExampleDriver  # noqa: F401
+from hipercow.task import (
+    TaskStatus,
+    TaskTimes,
+    set_task_status,
+    task_status_many,
 )
-from hipercow.task import TaskStatus
 from hipercow.task_create import _new_task_id, task_create_shell
 from hipercow.util import transient_working_directory
 
@@ -61,6 +74,24 @@ def test_get_bundle_status(tmp_path):
     assert bundle_status_reduce(nm, root=r) == TaskStatus.CREATED
 
 
+def test_can_cancel_bundle(tmp_path, capsys):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(3)]
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+    nm = bundle_create(ids, root=r)
+    capsys.readouterr()
+    assert bundle_cancel(nm, root=r) == [False, True, True]
+    assert f"Cancelled 2/3 tasks in bundle '{nm}'" in capsys.readouterr().out
+    assert bundle_status(nm, root=r) == [
+        TaskStatus.SUCCESS,
+        TaskStatus.CANCELLED,
+        TaskStatus.CANCELLED,
+    ]
+
+
 def test_can_overwrite_bundle(tmp_path):
     root.init(tmp_path)
     r = root.open_root(tmp_path)
@@ -84,3 +115,132 @@ def test_can_skip_validation(tmp_path):
         bundle_create(ids, root=r)
     nm = bundle_create(ids, validate=False, root=r)
     assert bundle_load(nm, root=r).task_ids == ids
+
+
+def test_can_wait_on_bundle(tmp_path, mocker, capsys):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(3)]
+    nm = bundle_create(ids, root=r)
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+
+    def finish(_):
+        for i in ids[1:]:
+            set_task_status(i, TaskStatus.SUCCESS, None, r)
+
+    mocker.patch("time.sleep", side_effect=finish)
+    spy = mocker.spy(hipercow.bundle, "task_status_many")
+    capsys.readouterr()
+    assert bundle_wait(nm, root=r, progress=False)
+    assert "All 3 tasks in bundle" in capsys.readouterr().out
+    # Only the two unfinished tasks are checked again:
+    assert spy.call_count == 2
+    assert spy.mock_calls[1].args[0] == ids[1:]
+
+
+def test_wait_on_bundle_can_fail_early(tmp_path, mocker, capsys):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(3)]
+    nm = bundle_create(ids, root=r)
+    set_task_status(ids[0], TaskStatus.FAILURE, None, r)
+    mock_sleep = mocker.patch("time.sleep")
+    capsys.readouterr()
+    assert not bundle_wait(nm, root=r, progress=False)
+    assert mock_sleep.call_count == 0
+    assert "1/3 tasks in bundle" in capsys.readouterr().out
+
+    with pytest.raises(TimeoutError, match="Timed out waiting for bundle"):
+        bundle_wait(nm, root=r, fail_early=False, timeout=0, progress=False)
+    assert task_status_many(ids, r)[1:] == [TaskStatus.SUBMITTED] * 2
+
+
+def test_wait_on_bundle_counts_missing_tasks_as_failed(
+    tmp_path, mocker, capsys
+):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(2)]
+    nm = bundle_create(ids, root=r)
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+    shutil.rmtree(r.path_task(ids[1]))
+    mock_sleep = mocker.patch("time.sleep")
+    capsys.readouterr()
+    assert not bundle_wait(nm, root=r, fail_early=False, progress=False)
+    assert mock_sleep.call_count == 0
+    assert "1/2 tasks in bundle" in capsys.readouterr().out
+
+
+def test_refuse_to_wait_on_bundle_with_created_tasks(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(2)]
+    nm = bundle_create(ids, root=r)
+    with pytest.raises(Exception, match="contains 2 tasks that have not"):
+        bundle_wait(nm, root=r)
+
+
+def _write_times(task_id, r, created, started=None, finished=None):
+    times = TaskTimes(created=created, started=started, finished=finished)
+    with r.path_task_times(task_id).open("w") as f:
+        f.write(times.model_dump_json())
+
+
+def _create_bundle_with_times(r):
+    with transient_working_directory(r.path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(6)]
+    for i in ids[:4]:
+        _write_times(i, r, 100, 110, 120)
+        set_task_status(i, TaskStatus.SUCCESS, None, r)
+    _write_times(ids[4], r, 100, 115, 165)
+    set_task_status(ids[4], TaskStatus.FAILURE, None, r)
+    _write_times(ids[5], r, 100, 120)
+    set_task_status(ids[5], TaskStatus.RUNNING, None, r)
+    return ids, bundle_create(ids, "mybundle", root=r)
+
+
+def test_can_report_on_bundle(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    ids, nm = _create_bundle_with_times(r)
+    res = bundle_report(nm, root=r, intervals=2)
+    assert res.name == nm
+    assert res.tasks == 6
+    assert res.status == {"success": 4, "failure": 1, "running": 1}
+    assert res.failure_rate == 0.2
+    assert res.queue_wait.n == 6
+    assert res.queue_wait.mean == 12.5
+    assert res.queue_wait.max == 20
+    assert res.run_time.n == 5
+    assert res.run_time.p50 == 10
+    assert res.run_time.max == 50
+    assert [x.finished for x in res.throughput] == [4, 1]
+    assert res.throughput[0].start == 0
+    assert res.throughput[1].end == 65
+    assert [x.task_id for x in res.stragglers] == [ids[5], ids[4]]
+    assert [x.status for x in res.stragglers] == ["running", "failure"]
+    assert res.stragglers[1].run_time == 50
+
+
+def test_can_report_on_bundle_that_has_not_started(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], root=r) for _ in range(3)]
+    nm = bundle_create(ids, root=r)
+    res = bundle_report(nm, root=r)
+    assert res.status == {"created": 3}
+    assert res.failure_rate is None
+    assert res.queue_wait is None
+    assert res.run_time is None
+    assert res.throughput == []
+    assert res.stragglers == []
+    with pytest.raises(Exception, match="'intervals' must be at least 1"):
+        bundle_report(nm, root=r, intervals=0)
@@ -1,5 +1,8 @@
+import json
 import platform
 import re
+import subprocess
+import sys
 import time
 from pathlib import Path
 from unittest import mock
@@ -7,12 +10,19 @@ from unittest import mock
 import click
 import pytest
 from click.testing import CliRunner
+from prompt_toolkit.history import FileHistory
 
 from hipercow import cli, root, task
 from hipercow.bundle import bundle_load
 from hipercow.driver import list_drivers
+from hipercow.poll import AdaptivePoll
 from hipercow.resources import TaskResources
-from hipercow.task import TaskStatus, set_task_status, task_data_read
+from hipercow.task import (
+    TaskStatus,
+    TaskTimes,
+    set_task_status,
+    task_data_read,
+)
 from hipercow.task_create import task_create_shell
 from hipercow.util import transient_envvars
 from tests.helpers import AnyInstanceOf
@@ -115,45 +125,60 @@ def test_can_list_tasks(tmp_path):
         assert res.output.strip() == ""
 
 
+def test_can_rebuild_task_index(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        ids = [task_create_shell(["true"], root=r) for _ in range(2)]
+        r.path_task_index().unlink()
+
+        res = runner.invoke(cli.cli_task_index_rebuild, [])
+        assert res.exit_code == 0
+        assert "Rebuilt task index with 2 tasks" in res.stdout
+        assert set(task.task_list(root=r)) == set(ids)
+        assert r.path_task_index().exists()
+
+
 def test_can_call_cli_dide_authenticate(mocker):
-    mocker.patch("hipercow.cli.dide_auth.check")
-    mocker.patch("hipercow.cli.dide_auth.clear")
-    mocker.patch("hipercow.cli.dide_auth.authenticate")
+    mock_check = mocker.patch("hipercow.dide.auth.check")
+    mock_clear = mocker.patch("hipercow.dide.auth.clear")
+    mock_authenticate = mocker.patch("hipercow.dide.auth.authenticate")
 
     runner = CliRunner()
 
     res = runner.invoke(cli.cli_dide_authenticate, [])
     assert res.exit_code == 0
     assert res.output.strip() == ""
-    assert cli.dide_auth.check.call_count == 0
-    assert cli.dide_auth.clear.call_count == 0
-    assert cli.dide_auth.authenticate.call_count == 1
+    assert mock_check.call_count == 0
+    assert mock_clear.call_count == 0
+    assert mock_authenticate.call_count == 1
 
     res = runner.invoke(cli.cli_dide_authenticate, ["clear"])
     assert res.exit_code == 0
     assert res.output.strip() == ""
-    assert cli.dide_auth.check.call_count == 0
-    assert cli.dide_auth.clear.call_count == 1
-    assert cli.dide_auth.authenticate.call_count == 1
+    assert mock_check.call_count == 0
+    assert mock_clear.call_count == 1
+    assert mock_authenticate.call_count == 1
 
     res = runner.invoke(cli.cli_dide_authenticate, ["check"])
     assert res.exit_code == 0
     assert res.output.strip() == ""
-    assert cli.dide_auth.check.call_count == 1
-    assert cli.dide_auth.clear.call_count == 1
-    assert cli.dide_auth.authenticate.call_count == 1
+    assert mock_check.call_count == 1
+    assert mock_clear.call_count == 1
+    assert mock_authenticate.call_count == 1
 
     res = runner.invoke(cli.cli_dide_authenticate, ["other"])
     assert res.exit_code == 1
     assert "No such action 'other'" in str(res.exception)
-    assert cli.dide_auth.check.call_count == 1
-    assert cli.dide_auth.clear.call_count == 1
-    assert cli.dide_auth.authenticate.call_count == 1
+    assert mock_check.call_count == 1
+    assert mock_clear.call_count == 1
+    assert mock_authenticate.call_count == 1
 
 
 def test_can_run_dide_check(tmp_path, mocker):
     mock_check = mock.Mock()
-    mocker.patch("hipercow.cli.dide_check", mock_check)
+    mocker.patch("hipercow.dide.check.dide_check", mock_check)
     runner = CliRunner()
     with runner.isolated_filesystem(temp_dir=tmp_path):
         res = runner.invoke(cli.cli_dide_check, [])
@@ -227,7 +252,7 @@ def test_can_provision_environment(tmp_path, mocker):
         runner.invoke(cli.cli_environment_new, [])
 
         mock_provision = mock.MagicMock()
-        mocker.patch("hipercow.cli.provision", mock_provision)
+        mocker.patch("hipercow.provision.provision", mock_provision)
 
         res = runner.invoke(cli.cli_environment_provision, [])
         assert res.exit_code == 0
@@ -286,11 +311,19 @@ def test_can_wait_on_task(tmp_path, mocker):
             timeout=None,
             show_log=True,
             progress=True,
+            watch=True,
         )
 
         res = runner.invoke(
             cli.cli_task_wait,
-            [task_id, "--poll=0.1", "--no-show-log", "--timeout", "200"],
+            [
+                task_id,
+                "--poll=0.1",
+                "--no-show-log",
+                "--timeout",
+                "200",
+                "--no-watch",
+            ],
         )
         assert res.exit_code == 0
         assert cli.task_wait.call_count == 2
@@ -300,6 +333,7 @@ def test_can_wait_on_task(tmp_path, mocker):
             timeout=200,
             show_log=False,
             progress=True,
+            watch=False,
         )
 
 
@@ -309,7 +343,7 @@ def test_can_build_environment(tmp_path, mocker):
         runner.invoke(cli.init, ".")
 
         mock_provision = mock.MagicMock()
-        mocker.patch("hipercow.cli.provision_run", mock_provision)
+        mocker.patch("hipercow.provision.provision_run", mock_provision)
 
         res = runner.invoke(
             cli.cli_environment_provision_run, ["example", "abcdef"]
@@ -400,14 +434,14 @@ def test_can_rebuild_recent_list(tmp_path):
 
 
 def test_can_call_cli_dide_bootstrap(mocker):
-    mocker.patch("hipercow.cli.dide_bootstrap")
+    mock_bootstrap = mocker.patch("hipercow.dide.bootstrap.bootstrap")
     runner = CliRunner()
 
     res = runner.invoke(cli.cli_dide_bootstrap, [])
     assert res.exit_code == 0
     assert res.output.strip() == ""
-    assert cli.dide_bootstrap.call_count == 1
-    assert cli.dide_bootstrap.mock_calls[0] == mock.call(
+    assert mock_bootstrap.call_count == 1
+    assert mock_bootstrap.mock_calls[0] == mock.call(
         None, force=False, verbose=True, python_versions=[], platforms=[]
     )
 
@@ -416,8 +450,8 @@ def test_can_call_cli_dide_bootstrap(mocker):
     )
     assert res.exit_code == 0
     assert res.output.strip() == ""
-    assert cli.dide_bootstrap.call_count == 2
-    assert cli.dide_bootstrap.mock_calls[1] == mock.call(
+    assert mock_bootstrap.call_count == 2
+    assert mock_bootstrap.mock_calls[1] == mock.call(
         "myfile", force=True, verbose=True, python_versions=[], platforms=[]
     )
 
@@ -507,7 +541,7 @@ def test_can_set_python_version(tmp_path):
 def test_can_launch_repl(tmp_path, mocker):
     runner = CliRunner()
     mock_repl = mock.MagicMock()
-    mocker.patch("hipercow.cli.repl", mock_repl)
+    mocker.patch("click_repl.repl", mock_repl)
     with runner.isolated_filesystem(temp_dir=tmp_path):
         res = runner.invoke(cli.cli_repl, [])
         assert res.exit_code == 0
@@ -525,7 +559,7 @@ def test_can_launch_repl(tmp_path, mocker):
             AnyInstanceOf(click.Context),
             prompt_kwargs={
                 "message": "hipercow> ",
-                "history": AnyInstanceOf(cli.FileHistory),
+                "history": AnyInstanceOf(FileHistory),
             },
         )
 
@@ -534,7 +568,7 @@ def test_can_handle_exception_in_repl(mocker, capsys):
     ctx = mock.Mock()
     args = mock.Mock()
     mock_repl = mock.MagicMock(side_effect=[Exception("some error"), None])
-    mocker.patch("hipercow.cli.repl", mock_repl)
+    mocker.patch("click_repl.repl", mock_repl)
 
     assert cli._repl_call(ctx, args)
     out = capsys.readouterr().out
@@ -639,6 +673,15 @@ def test_can_get_bundle_status(tmp_path):
             for id, status in zip(bundle.task_ids, status, strict=False)
         )
 
+        res = runner.invoke(
+            cli.cli_bundle_status, ["mybundle", "--workers", "2"]
+        )
+        assert res.exit_code == 0
+        assert res.output == "".join(
+            f"{id}: {status}\n"
+            for id, status in zip(bundle.task_ids, status, strict=False)
+        )
+
         res = runner.invoke(
             cli.cli_bundle_status, ["mybundle", "--summary", "group"]
         )
@@ -719,6 +762,33 @@ def test_can_create_commands_from_csv(tmp_path):
         assert output[1:] == ["  1: echo 1-1", "  2: echo 1-2", "  3: echo 2-2"]
 
 
+def test_can_create_tasks_from_csv(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        with open("data.csv", "w") as f:
+            f.write("a,b\n1,1\n1,2\n2,2")
+        args = ["--data=data.csv", "--name", "mybundle", "echo", "@{a}-@{b}"]
+        res = runner.invoke(cli.cli_create_bulk, args)
+        assert res.exit_code == 0
+        assert res.output.splitlines()[-1] == "mybundle"
+        ids = bundle_load("mybundle", root=r).task_ids
+        cmds = [task_data_read(i, r).data["cmd"] for i in ids]
+        assert cmds == [["echo", "1-1"], ["echo", "1-2"], ["echo", "2-2"]]
+
+        res = runner.invoke(cli.cli_create_bulk, ["--resume", *args])
+        assert res.exit_code == 1
+        assert "No partially created bundle 'mybundle'" in str(res.exception)
+
+        args = ["--resume", "--data=a=1,2", "echo", "@a"]
+        res = runner.invoke(cli.cli_create_bulk, args)
+        assert res.exit_code == 1
+        assert "can only be used when creating tasks from a csv" in str(
+            res.exception
+        )
+
+
 def test_require_at_least_one_data_argument():
     runner = CliRunner()
     res = runner.invoke(
@@ -754,3 +824,137 @@ def test_can_drop_non_breaking_spaces_from_cmd():
     assert cli._clean_cmd(("a", "b")) == ["a", "b"]
     assert cli._clean_cmd(("a", "b\xa0c")) == ["a", "b", "c"]
     assert cli._clean_cmd(("a", "b\xa0c\xa0d")) == ["a", "b", "c", "d"]
+
+
+def test_can_cancel_tasks_and_bundles(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        runner.invoke(cli.cli_driver_configure, ["example"])
+        tid = task_create_shell(["true"], root=r)
+        res = runner.invoke(cli.cli_task_cancel, [tid])
+        assert res.exit_code == 0
+        assert res.output.endswith(f"{tid}: cancelled\n")
+        res = runner.invoke(cli.cli_task_cancel, [tid])
+        assert res.exit_code == 0
+        assert res.output == f"{tid}: not cancelled\n"
+
+        res = runner.invoke(
+            cli.cli_create_bulk,
+            ["--name", "b", "--data", "a=1..3", "echo", "@a"],
+        )
+        assert res.exit_code == 0
+        res = runner.invoke(cli.cli_bundle_cancel, ["b"])
+        assert res.exit_code == 0
+        assert "Cancelled 3/3 tasks in bundle 'b'" in res.output
+        assert (
+            task.task_status_many(bundle_load("b", root=r).task_ids, r)
+            == [TaskStatus.CANCELLED] * 3
+        )
+
+
+def test_can_wait_on_bundle(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        runner.invoke(cli.cli_driver_configure, ["example"])
+        res = runner.invoke(
+            cli.cli_create_bulk,
+            ["--name", "b", "--data", "a=1..3", "echo", "@a"],
+        )
+        for i in bundle_load("b", root=r).task_ids:
+            set_task_status(i, TaskStatus.SUCCESS, None, r)
+        res = runner.invoke(cli.cli_bundle_wait, ["b", "--no-progress"])
+        assert res.exit_code == 0
+        assert "All 3 tasks in bundle 'b' succeeded" in res.output
+
+
+def test_can_wait_with_adaptive_poll(tmp_path, mocker):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        task_id = task_create_shell(["true"], root=r)
+        mocker.patch("hipercow.cli.task_wait")
+        res = runner.invoke(cli.cli_task_wait, [task_id, "--poll", "adaptive"])
+        assert res.exit_code == 0
+        assert cli.task_wait.mock_calls[0].kwargs["poll"] == AdaptivePoll()
+
+        res = runner.invoke(cli.cli_task_wait, [task_id, "--poll", "often"])
+        assert res.exit_code == 2
+        assert "Expected a number or 'adaptive'" in res.output
+
+
+def test_can_queue_tasks_and_start_workers(tmp_path, mocker):
+    mock_start = mocker.patch(
+        "hipercow.worker.worker_start", return_value=["a"]
+    )
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        res = runner.invoke(cli.cli_task_create, ["--worker", "true"])
+        assert res.exit_code == 0
+        tid = res.stdout.strip()
+        assert task.task_status(tid, r) == TaskStatus.SUBMITTED
+        assert (r.path_worker_queue() / tid).exists()
+
+        res = runner.invoke(cli.cli_worker_start, ["--n", "2"])
+        assert res.exit_code == 0
+        assert res.output == "a\n"
+        assert mock_start.call_args == mock.call(2, resources=None)
+
+
+# Run in a fresh interpreter, as by now this one has imported
+# everything.  The budget on the time taken is checked by the
+# benchmarks (see tests/benchmark/test_startup.py).
+def test_task_eval_does_not_import_slow_modules():
+    slow = ["click_repl", "keyring", "prompt_toolkit", "requests"]
+    code = (
+        "import sys, hipercow.cli, hipercow.task_eval; "
+        f"print(','.join(x for x in {slow!r} if x in sys.modules))"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert res.stdout.strip() == ""
+
+
+def test_can_report_on_bundle(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        root.init(".")
+        r = root.open_root()
+        res = runner.invoke(
+            cli.cli_create_bulk,
+            ["--name", "mybundle", "--data", "a=1..3", "echo", "@a"],
+        )
+        assert res.exit_code == 0
+        ids = bundle_load("mybundle", root=r).task_ids
+        for i, run_time in zip(ids, [10, 10, 600], strict=False):
+            times = TaskTimes(created=0, started=5, finished=5 + run_time)
+            with r.path_task_times(i).open("w") as f:
+                f.write(times.model_dump_json())
+            set_task_status(i, TaskStatus.SUCCESS, None, r)
+
+        res = runner.invoke(cli.cli_bundle_report, ["mybundle"])
+        assert res.exit_code == 0
+        lines = res.output.splitlines()
+        assert lines[0] == "Bundle 'mybundle': 3 tasks"
+        assert lines[1] == "  success: 3"
+        assert lines[2] == "Failure rate: 0.0%"
+        assert lines[3].split() == ["n", "mean", "p50", "p95", "max"]
+        assert lines[4].split() == ["queue", "wait", "3", *["5.0s"] * 4]
+        run_time = ["3.4m", "10.0s", "10.0m", "10.0m"]
+        assert lines[5].split() == ["run", "time", "3", *run_time]
+        assert "  0.0s - 1.0m: 2" in lines
+        assert lines[-2] == "Stragglers:"
+        assert lines[-1] == f"  {ids[2]}: 10.0m (success)"
+
+        res = runner.invoke(cli.cli_bundle_report, ["mybundle", "--json"])
+        assert res.exit_code == 0
+        data = json.loads(res.output)
+        assert data["tasks"] == 3
+        assert data["stragglers"][0]["task_id"] == ids[2]
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pytest
 
 from hipercow import root
@@ -119,7 +122,21 @@ def test_can_read_logs_with_example_driver(tmp_path):
 
 def test_that_example_driver_has_reasonable_resources(tmp_path):
     dr = ExampleDriver(root.init(tmp_path))
-    resources = dr.resources()
+    resources = dr.resources(root.open_root(tmp_path))
     assert resources.queues.valid == {"default"}
     assert resources.max_cores == 1
     assert resources.max_memory == 32
+
+
+# Run in a fresh interpreter, as by now this one has imported all the
+# drivers already.
+def test_builtin_drivers_are_imported_when_used():
+    code = (
+        "import sys; from hipercow.driver import _DRIVERS, _get_driver; "
+        "assert not _DRIVERS; "
+        "print(_get_driver('local').name, 'hipercow.local' in sys.modules)"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert res.stdout.strip() == "local True"
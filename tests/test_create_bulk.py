@@ -1,14 +1,27 @@
+import os
+
 import pytest
 
+import hipercow.task_create_bulk
 from hipercow import root
-from hipercow.bundle import bundle_load
-from hipercow.task import task_info
+from hipercow.bundle import bundle_list, bundle_load
+from hipercow.configure import configure
+from hipercow.example import ExampleDriver
+from hipercow.task import (
+    TaskStatus,
+    task_driver,
+    task_info,
+    task_list,
+    task_recent,
+    task_status_many,
+)
 from hipercow.task_create_bulk import (
     _bulk_data_combine,
     _template_identifiers,
     _TemplateAt,
     bulk_create_shell,
     bulk_create_shell_commands,
+    bulk_create_shell_stream,
 )
 from hipercow.util import transient_working_directory
 
@@ -96,3 +109,189 @@ def test_can_extract_identrifiers_with_backport():
     assert _template_identifiers(obj) == ["a", "b"]
     obj = _TemplateAt("hello @{a} @b world @a")
     assert _template_identifiers(obj) == ["a", "b"]
+
+
+def test_bulk_create_submits_tasks_together(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    mock_submit = mocker.patch("hipercow.example.ExampleDriver.submit")
+    data = {"a": ["1", "2", "3"]}
+    with transient_working_directory(tmp_path):
+        nm = bulk_create_shell(["echo", "@a"], data, root=r)
+    ids = bundle_load(nm, root=r).task_ids
+    assert task_recent(root=r) == ids
+    assert mock_submit.call_count == 3
+    assert [c.args[0] for c in mock_submit.mock_calls] == ids
+    for i in ids:
+        assert task_info(i, root=r).status == TaskStatus.SUBMITTED
+        assert task_driver(i, r) == "example"
+
+
+def test_bulk_create_writes_index_once_per_step(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    path_index = r.path_task_index()
+    spy = mocker.patch("os.open", wraps=os.open)
+    with transient_working_directory(tmp_path):
+        nm = bulk_create_shell(["echo", "@a"], {"a": ["1", "2", "3"]}, root=r)
+    # Once when creating the tasks, and once when submitting them
+    assert [c.args[0] for c in spy.mock_calls].count(path_index) == 2
+    ids = bundle_load(nm, root=r).task_ids
+    assert task_list(root=r, with_status=TaskStatus.SUBMITTED) == ids
+
+
+def test_bulk_create_requires_nonempty_template(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with pytest.raises(Exception, match="'cmd_template' cannot be empty"):
+        bulk_create_shell([], {"a": ["1"]}, root=r)
+
+
+def _rows(n, *, fail_after=None):
+    for i in range(n):
+        if i == fail_after:
+            msg = "interrupted"
+            raise Exception(msg)
+        yield {"a": str(i)}
+
+
+def _cmds(task_ids, r):
+    return [task_info(i, r).data.data["cmd"] for i in task_ids]
+
+
+def test_can_stream_bulk_creation_in_chunks(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    spy = mocker.spy(hipercow.task_create_bulk, "_task_create_many")
+    with transient_working_directory(tmp_path):
+        nm = bulk_create_shell_stream(
+            ["echo", "@a"], _rows(5), name="b", chunk_size=2, root=r
+        )
+    assert nm == "b"
+    assert spy.call_count == 3
+    task_ids = bundle_load(nm, r).task_ids
+    assert _cmds(task_ids, r) == [["echo", str(i)] for i in range(5)]
+    assert not r.path_bundle_partial(nm).exists()
+
+
+def test_can_resume_interrupted_bulk_creation(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    cmd = ["echo", "@a"]
+    with transient_working_directory(tmp_path):
+        with pytest.raises(Exception, match="interrupted"):
+            bulk_create_shell_stream(
+                cmd, _rows(5, fail_after=3), name="b", chunk_size=2, root=r
+            )
+        assert bundle_list(r) == []
+        assert r.path_bundle_partial("b").exists()
+
+        with pytest.raises(Exception, match="was partially created"):
+            bulk_create_shell_stream(cmd, _rows(5), name="b", root=r)
+        with pytest.raises(Exception, match="with a different command"):
+            bulk_create_shell_stream(
+                ["echo", "x", "@a"], _rows(5), name="b", resume=True, root=r
+            )
+        with pytest.raises(Exception, match="has fewer rows \\(1\\)"):
+            bulk_create_shell_stream(
+                cmd, _rows(1), name="b", resume=True, root=r
+            )
+
+        nm = bulk_create_shell_stream(
+            cmd, _rows(5), name="b", chunk_size=2, resume=True, root=r
+        )
+    task_ids = bundle_load(nm, r).task_ids
+    assert _cmds(task_ids, r) == [["echo", str(i)] for i in range(5)]
+    assert not r.path_bundle_partial(nm).exists()
+
+
+def test_resume_submits_tasks_created_before_interruption(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    mock_submit = mocker.patch.object(
+        ExampleDriver,
+        "submit",
+        side_effect=[None, None, None, Exception("interrupted")],
+    )
+    cmd = ["echo", "@a"]
+    with transient_working_directory(tmp_path):
+        with pytest.raises(Exception, match="interrupted"):
+            bulk_create_shell_stream(
+                cmd, _rows(5), name="b", chunk_size=2, root=r
+            )
+        # All four tasks were recorded before being submitted
+        with r.path_bundle_partial("b").open() as f:
+            recorded = [x.strip() for x in f.readlines()[1:]]
+        assert len(recorded) == 4
+        assert task_status_many(recorded, r) == [
+            TaskStatus.SUBMITTED,
+            TaskStatus.SUBMITTED,
+            TaskStatus.SUBMITTED,
+            TaskStatus.CREATED,
+        ]
+
+        mock_submit.side_effect = None
+        nm = bulk_create_shell_stream(
+            cmd, _rows(5), name="b", chunk_size=2, resume=True, root=r
+        )
+    task_ids = bundle_load(nm, r).task_ids
+    assert task_ids[:4] == recorded
+    assert _cmds(task_ids, r) == [["echo", str(i)] for i in range(5)]
+    # Each task was submitted exactly once, and none were created twice
+    assert mock_submit.call_count == 6
+    assert [c.args[0] for c in mock_submit.mock_calls[4:]] == task_ids[3:]
+    assert sorted(task_list(root=r)) == sorted(task_ids)
+    assert set(task_status_many(task_ids, r)) == {TaskStatus.SUBMITTED}
+
+
+def test_resume_requires_same_options(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    cmd = ["echo", "@a"]
+    with transient_working_directory(tmp_path):
+        with pytest.raises(Exception, match="interrupted"):
+            bulk_create_shell_stream(
+                cmd, _rows(5, fail_after=3), name="b", chunk_size=2, root=r
+            )
+        with pytest.raises(Exception, match=r"different options: worker$"):
+            bulk_create_shell_stream(
+                cmd, _rows(5), name="b", resume=True, worker=True, root=r
+            )
+        with pytest.raises(
+            Exception, match="different options: environment, envvars"
+        ):
+            bulk_create_shell_stream(
+                cmd,
+                _rows(5),
+                name="b",
+                resume=True,
+                environment="other",
+                envvars={"A": "1"},
+                root=r,
+            )
+
+
+def test_validate_streamed_bulk_creation(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        with pytest.raises(Exception, match="'cmd_template' cannot be empty"):
+            bulk_create_shell_stream([], _rows(2), root=r)
+        with pytest.raises(Exception, match="'chunk_size' must be at least"):
+            bulk_create_shell_stream(["echo", "@a"], _rows(2), chunk_size=0)
+        with pytest.raises(Exception, match="without its name"):
+            bulk_create_shell_stream(["echo", "@a"], _rows(2), resume=True)
+        with pytest.raises(Exception, match="No partially created bundle"):
+            bulk_create_shell_stream(
+                ["echo", "@a"], _rows(2), name="b", resume=True, root=r
+            )
+        with pytest.raises(Exception, match="No data provided"):
+            bulk_create_shell_stream(["echo", "@a"], [], root=r)
+        with pytest.raises(Exception, match="not present in data: b"):
+            bulk_create_shell_stream(["echo", "@a", "@b"], _rows(2), root=r)
+        data = [{"a": "1"}, {"b": "2"}]
+        with pytest.raises(Exception, match="Inconsistent keys"):
+            bulk_create_shell_stream(["echo", "@a"], data, root=r)
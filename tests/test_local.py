@@ -0,0 +1,156 @@
+import os
+import sys
+from itertools import pairwise
+
+import pytest
+
+from hipercow import root
+from hipercow.configure import configure
+from hipercow.driver import load_driver
+from hipercow.local import (
+    LocalDriver,
+    _local_lock,
+    _local_queue_list,
+    _local_run,
+    _local_task_cores,
+    _local_unlock,
+    local_configuration,
+)
+from hipercow.resources import TaskResources
+from hipercow.task import (
+    TaskStatus,
+    task_cancel,
+    task_info,
+    task_status,
+    task_status_many,
+    task_wait,
+)
+from hipercow.task_create import task_create_shell
+from hipercow.util import transient_working_directory
+
+
+def _sleep(t):
+    return [sys.executable, "-c", f"import time; time.sleep({t})"]
+
+
+def test_can_configure_local_driver(tmp_path):
+    assert local_configuration().cores == (os.cpu_count() or 1)
+    assert local_configuration(cores=3).cores == 3
+    with pytest.raises(Exception, match="'cores' must be at least 1"):
+        local_configuration(cores=-1)
+    with pytest.raises(Exception, match="is not the same as the local"):
+        local_configuration(
+            python_version="3.10" if sys.version_info[:2] != (3, 10) else "3.11"
+        )
+
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=2, root=r)
+    dr = load_driver("local", r)
+    assert isinstance(dr, LocalDriver)
+    assert dr.config.cores == 2
+    resources = dr.resources(r)
+    assert resources.max_cores == 2
+    with pytest.raises(ValueError, match="too many cores"):
+        resources.validate_resources(TaskResources(cores=3))
+
+
+def test_can_run_tasks_in_background(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=2, root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["echo", f"{i}"], root=r) for i in range(3)]
+    for i in ids:
+        assert task_wait(i, root=r, timeout=60, progress=False)
+    assert task_info(ids[1], root=r).status == TaskStatus.SUCCESS
+    with r.path_task_log(ids[1]).open() as f:
+        assert f.read().strip() == "1"
+
+
+def test_tasks_are_packed_by_cores(tmp_path, mocker):
+    mocker.patch("hipercow.local._local_runner_start")
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=2, root=r)
+    big = TaskResources(cores=2)
+    with transient_working_directory(tmp_path):
+        ids = [
+            task_create_shell(_sleep(0.3), resources=big, root=r),
+            task_create_shell(_sleep(0.3), resources=big, root=r),
+        ]
+    assert _local_task_cores(ids[0], 2, r) == 2
+    assert _local_task_cores(ids[0], 1, r) == 1
+    _local_run(2, r)
+    assert task_status_many(ids, r) == [TaskStatus.SUCCESS] * 2
+    t1 = task_info(ids[0], r).times
+    t2 = task_info(ids[1], r).times
+    assert t2.started >= t1.finished
+
+
+def test_tasks_share_cores(tmp_path, mocker):
+    mocker.patch("hipercow.local._local_runner_start")
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=2, root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(_sleep(0.3), root=r) for _ in range(2)]
+    _local_run(2, r)
+    t1 = task_info(ids[0], r).times
+    t2 = task_info(ids[1], r).times
+    assert t2.started < t1.finished
+
+
+def test_skip_cancelled_tasks(tmp_path, mocker, capfd):
+    mock_start = mocker.patch("hipercow.local._local_runner_start")
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=1, root=r)
+    with transient_working_directory(tmp_path):
+        ids = [
+            task_create_shell(_sleep(10), root=r),
+            task_create_shell(["echo", "hello"], root=r),
+        ]
+    assert mock_start.call_count == 2
+    assert mock_start.call_args == mocker.call(1, r)
+    assert task_cancel(ids[0], r)
+    _local_run(1, r)
+    assert task_status_many(ids, r) == [
+        TaskStatus.CANCELLED,
+        TaskStatus.SUCCESS,
+    ]
+    assert "Error running task" not in capfd.readouterr().err
+
+
+def test_separate_submissions_share_one_runner(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=1, root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(_sleep(0.3), root=r) for _ in range(3)]
+    for i in ids:
+        assert task_wait(i, root=r, timeout=60, progress=False)
+    times = [task_info(i, r).times for i in ids]
+    times = sorted((t.started, t.finished) for t in times)
+    for (_, finished), (started, _) in pairwise(times):
+        assert started >= finished
+
+
+def test_runner_is_only_started_if_not_running(tmp_path, mocker):
+    mock_start = mocker.patch("hipercow.local._local_runner_start")
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=1, root=r)
+    lock = _local_lock(r)
+    assert lock is not None
+    # A second runner exits straight away, leaving the queue alone
+    _local_run(1, r)
+    with transient_working_directory(tmp_path):
+        tid = task_create_shell(["echo", "hello"], root=r)
+    assert mock_start.call_count == 0
+    assert len(_local_queue_list(r)) == 1
+    _local_unlock(lock)
+
+    _local_run(1, r)
+    assert task_status(tid, r) == TaskStatus.SUCCESS
+    assert _local_queue_list(r) == []
@@ -0,0 +1,56 @@
+from unittest import mock
+
+import pytest
+import taskwait
+
+from hipercow.poll import AdaptivePoll, parse_poll, taskwait_poll
+
+
+class FakeTask(taskwait.Task):
+    def __init__(self, status):
+        self.status_waiting = {"created", "submitted"}
+        self.status_running = {"running"}
+        self._status = iter(status)
+
+    def status(self):
+        return next(self._status)
+
+    def log(self):
+        return None
+
+    def has_log(self):
+        return False
+
+
+def test_can_parse_poll():
+    assert parse_poll("adaptive") == AdaptivePoll()
+    assert parse_poll("0.5") == 0.5
+    assert parse_poll(2) == 2
+    with pytest.raises(Exception, match="Expected a number or 'adaptive'"):
+        parse_poll("often")
+
+
+def test_fixed_poll_sleeps_between_checks(mocker):
+    mock_sleep = mocker.patch("time.sleep")
+    task = FakeTask(["submitted", "running", "success"])
+    res = taskwait_poll(task, 0.5, progress=False)
+    assert res.status == "success"
+    assert mock_sleep.mock_calls == [mock.call(0.5), mock.call(0.5)]
+
+
+def test_adaptive_poll_backs_off_while_waiting(mocker):
+    mock_sleep = mocker.patch("time.sleep")
+    status = ["submitted"] * 6 + ["running"] * 3 + ["success"]
+    poll = AdaptivePoll(initial=1, factor=2, maximum=10)
+    res = taskwait_poll(FakeTask(status), poll, progress=False)
+    assert res.status == "success"
+    delay = [c.args[0] for c in mock_sleep.mock_calls]
+    assert delay == [1, 2, 4, 8, 10, 10, 1, 1, 1]
+
+
+def test_can_poll_with_watcher():
+    watcher = mock.Mock()
+    task = FakeTask(["submitted", "success"])
+    res = taskwait_poll(task, 3, watcher=watcher, progress=False)
+    assert res.status == "success"
+    assert watcher.wait.mock_calls == [mock.call(3)]
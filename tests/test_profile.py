@@ -0,0 +1,107 @@
+import io
+
+import pytest
+
+from hipercow import profile, root
+from hipercow import task_create as tc
+from hipercow.profile import (
+    SpanSummary,
+    profile_report,
+    profile_summary,
+    span,
+)
+from hipercow.task_eval import task_eval
+from hipercow.util import transient_envvars, transient_working_directory
+
+
+@pytest.fixture(autouse=True)
+def clear_spans(mocker):
+    mocker.patch.dict(profile._SPANS, clear=True)
+    mocker.patch.object(profile, "_REPORT_REGISTERED", new=False)
+    return mocker.patch("atexit.register")
+
+
+def test_spans_are_not_recorded_by_default(clear_spans):
+    with transient_envvars({"HIPERCOW_PROFILE": None}):
+        with span("a"):
+            pass
+    assert profile_summary() == []
+    assert clear_spans.call_count == 0
+
+
+def test_can_record_spans(clear_spans):
+    with transient_envvars({"HIPERCOW_PROFILE": "1"}):
+        for _ in range(3):
+            with span("a"):
+                pass
+        with pytest.raises(Exception, match="some error"):
+            with span("b"):
+                msg = "some error"
+                raise Exception(msg)
+    res = profile_summary()
+    assert [(x.name, x.count) for x in res] == [("a", 3), ("b", 1)]
+    assert clear_spans.call_count == 1
+    assert clear_spans.mock_calls[0].args == (profile_report,)
+
+
+def test_nested_spans_register_report_once(clear_spans):
+    with transient_envvars({"HIPERCOW_PROFILE": "1"}):
+        with span("a"):
+            with span("b"):
+                pass
+        with span("a"):
+            pass
+    assert [(x.name, x.count) for x in profile_summary()] == [
+        ("b", 1),
+        ("a", 2),
+    ]
+    assert clear_spans.call_count == 1
+
+
+def test_can_summarise_times():
+    times = [float(i) for i in range(20, 0, -1)]
+    res = SpanSummary.from_times("a", times)
+    assert res == SpanSummary("a", 20, 210, 10, 19)
+    assert SpanSummary.from_times("a", [2]) == SpanSummary("a", 1, 2, 2, 2)
+
+
+def test_can_print_report():
+    out = io.StringIO()
+    profile_report(out)
+    assert out.getvalue() == ""
+    profile._SPANS["task_create.submit"] = [0.0015, 2.5]
+    profile_report(out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].split() == ["span", "count", "total", "p50", "p95"]
+    assert lines[1].split() == [
+        "task_create.submit",
+        "2",
+        "2.50s",
+        "1.5ms",
+        "2.50s",
+    ]
+
+
+def test_report_goes_to_stderr(capsys):
+    profile._SPANS["a"] = [0.1]
+    profile_report()
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "100.0ms" in captured.err
+
+
+def test_times_task_creation_and_evaluation(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_envvars({"HIPERCOW_PROFILE": "1"}):
+        with transient_working_directory(tmp_path):
+            tid = tc.task_create_shell(["true"], root=r)
+        task_eval(tid, capture=True, root=r)
+    assert [x.name for x in profile_summary()] == [
+        "task_create.environment_check",
+        "task_create.write",
+        "task_eval.claim",
+        "task_eval.run",
+        "task_eval.finish",
+    ]
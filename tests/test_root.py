@@ -14,6 +14,7 @@ def test_create_root(tmp_path):
     r = root.open_root(path)
     assert isinstance(r, root.Root)
     assert r.path == path
+    assert r.path_task_index().is_file()
 
 
 def test_notify_if_root_exists(tmp_path, capsys):
@@ -1,20 +1,31 @@
+import os
+import platform
 import time
 from unittest import mock
 
 import pytest
 
-from hipercow import root
+from hipercow import root, task
 from hipercow import task_create as tc
+from hipercow.configure import configure
+from hipercow.driver import HipercowDriver
+from hipercow.example import ExampleDriver
 from hipercow.task import (
+    _TERMINAL_STATUS_LOADED,
     TaskStatus,
     TaskWaitWrapper,
     _read_task_times,
+    _task_index_read,
+    _terminal_status_cache,
     check_task_id,
     is_valid_task_id,
     set_task_status,
+    task_cancel,
+    task_cancel_many,
     task_data_read,
     task_driver,
     task_exists,
+    task_index_rebuild,
     task_info,
     task_last,
     task_list,
@@ -22,10 +33,15 @@ from hipercow.task import (
     task_recent,
     task_recent_rebuild,
     task_status,
+    task_status_many,
     task_wait,
 )
 from hipercow.task_eval import task_eval
-from hipercow.util import transient_working_directory
+from hipercow.util import (
+    file_create,
+    transient_envvars,
+    transient_working_directory,
+)
 
 
 def test_can_check_if_tasks_are_runnable():
@@ -67,6 +83,119 @@ def test_that_missing_tasks_error_on_log_read(tmp_path):
         task_log(task_id, root=r)
 
 
+def test_can_get_status_of_many_tasks(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(3)]
+    set_task_status(ids[1], TaskStatus.RUNNING, None, r)
+    set_task_status(ids[2], TaskStatus.RUNNING, None, r)
+    set_task_status(ids[2], TaskStatus.FAILURE, None, r)
+    missing = "a" * 32
+    assert task_status_many([*ids, missing], r) == [
+        TaskStatus.CREATED,
+        TaskStatus.RUNNING,
+        TaskStatus.FAILURE,
+        TaskStatus.MISSING,
+    ]
+    assert task_status_many([], r) == []
+    with pytest.raises(Exception, match="does not look like a valid task"):
+        task_status_many([ids[0], "a"], r)
+
+
+def test_can_read_status_of_many_tasks_concurrently(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(20)]
+    expected = []
+    for i, tid in enumerate(ids):
+        if i % 3 == 1:
+            set_task_status(tid, TaskStatus.RUNNING, None, r)
+            expected.append(TaskStatus.RUNNING)
+        elif i % 3 == 2:
+            set_task_status(tid, TaskStatus.FAILURE, None, r)
+            expected.append(TaskStatus.FAILURE)
+        else:
+            expected.append(TaskStatus.CREATED)
+    assert task_status_many(ids, r, workers=4) == expected
+    assert task_status_many(ids, r, workers=1) == expected
+    with transient_envvars({"HIPERCOW_STATUS_WORKERS": "2"}):
+        assert task_status_many(ids, r) == expected
+
+
+def test_require_positive_status_workers(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with pytest.raises(Exception, match="'workers' must be at least 1"):
+        task_status_many([], r, workers=0)
+
+
+def test_terminal_status_is_cached(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(2)]
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+    assert _terminal_status_cache(r) == {ids[0]: TaskStatus.SUCCESS}
+    mock_listdir = mocker.patch("os.listdir", wraps=os.listdir)
+    assert task_status(ids[0], r) == TaskStatus.SUCCESS
+    assert mock_listdir.call_count == 0
+    assert task_status(ids[1], r) == TaskStatus.CREATED
+    assert mock_listdir.call_count == 1
+
+
+def test_terminal_status_is_cached_when_read(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["true"], root=r)
+    file_create(r.path_task(tid) / "status-failure")
+    assert _terminal_status_cache(r) == {}
+    assert task_status(tid, r) == TaskStatus.FAILURE
+    assert _terminal_status_cache(r) == {tid: TaskStatus.FAILURE}
+
+
+def test_terminal_status_cache_is_seeded_from_index(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(3)]
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+    set_task_status(ids[1], TaskStatus.FAILURE, None, r)
+    task_index_rebuild(root=r)
+    # Simulate a fresh process, which has not seen these statuses
+    _terminal_status_cache(r).clear()
+    _TERMINAL_STATUS_LOADED.discard(r.path)
+    mock_listdir = mocker.patch("os.listdir", wraps=os.listdir)
+    assert task_status_many(ids, r) == [
+        TaskStatus.SUCCESS,
+        TaskStatus.FAILURE,
+        TaskStatus.CREATED,
+    ]
+    assert mock_listdir.call_count == 1
+
+
+def test_terminal_status_read_from_disk_is_recorded_in_index(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(3)]
+    # As if run on the cluster, which does not write to the index
+    set_task_status(ids[0], TaskStatus.SUCCESS, None, r)
+    set_task_status(ids[1], TaskStatus.FAILURE, None, r)
+    expected = [TaskStatus.SUCCESS, TaskStatus.FAILURE, TaskStatus.CREATED]
+    mock_listdir = mocker.patch("os.listdir", wraps=os.listdir)
+    for n in [3, 1]:
+        # Simulate a fresh process each time
+        _terminal_status_cache(r).clear()
+        _TERMINAL_STATUS_LOADED.discard(r.path)
+        mock_listdir.reset_mock()
+        assert task_status_many(ids, r) == expected
+        assert mock_listdir.call_count == n
+    assert _task_index_read(r) == dict(zip(ids, expected, strict=True))
+
+
 def test_can_convert_to_nice_string():
     assert str(TaskStatus.CREATED) == "created"
 
@@ -106,6 +235,22 @@ def test_that_can_read_info_for_completed_task(tmp_path):
     assert isinstance(info.times.created, float)
     assert isinstance(info.times.started, float)
     assert isinstance(info.times.finished, float)
+    if platform.system() != "Windows":
+        assert info.times.usage is not None
+        assert info.times.usage.cpu_user >= 0
+        assert info.times.usage.rss_sampled is None
+
+
+def test_can_read_times_written_without_usage(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "hello world"], root=r)
+    with r.path_task_times(tid).open("w") as f:
+        f.write('{"created": 1.0, "started": 2.0, "finished": 3.0}')
+    times = _read_task_times(tid, r)
+    assert times.finished == 3.0
+    assert times.usage is None
 
 
 def test_can_list_tasks(tmp_path):
@@ -280,3 +425,158 @@ def test_can_validate_task_id():
     assert check_task_id("3852ea7fe8adab595cc5084d29be0bf7") is None
     with pytest.raises(Exception, match="does not look like a valid task"):
         check_task_id("3852ea7fe8adab595cc5084d29be")
+
+
+def test_index_tracks_task_creation_and_submission(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    assert _task_index_read(r) == {}
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(3)]
+    set_task_status(ids[1], TaskStatus.SUBMITTED, None, r, index=True)
+    set_task_status(ids[2], TaskStatus.CANCELLED, None, r, index=True)
+    assert _task_index_read(r) == {
+        ids[0]: TaskStatus.CREATED,
+        ids[1]: TaskStatus.SUBMITTED,
+        ids[2]: TaskStatus.CANCELLED,
+    }
+    assert task_list(root=r) == ids
+
+
+def test_running_tasks_do_not_write_to_index(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["true"], root=r)
+    contents = r.path_task_index().read_text()
+    with transient_working_directory(tmp_path):
+        task_eval(tid, capture=False, root=r)
+    assert r.path_task_index().read_text() == contents
+    assert _task_index_read(r) == {tid: TaskStatus.CREATED}
+    assert task_list(root=r, with_status=TaskStatus.SUCCESS) == [tid]
+
+
+def test_filtered_list_reads_finished_tasks_once(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(3)]
+        for i in ids:
+            task_eval(i, capture=False, root=r)
+    mock_listdir = mocker.patch("os.listdir", wraps=os.listdir)
+    for n in [3, 0]:
+        # Simulate a fresh process each time
+        _terminal_status_cache(r).clear()
+        _TERMINAL_STATUS_LOADED.discard(r.path)
+        mock_listdir.reset_mock()
+        assert task_list(root=r, with_status=TaskStatus.SUCCESS) == ids
+        assert mock_listdir.call_count == n
+
+
+def test_index_keeps_most_advanced_status(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["true"], root=r)
+    set_task_status(tid, TaskStatus.CANCELLED, None, r, index=True)
+    set_task_status(tid, TaskStatus.SUBMITTED, "example", r, index=True)
+    assert _task_index_read(r) == {tid: TaskStatus.CANCELLED}
+
+
+def test_index_skips_corrupt_lines(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(2)]
+    with r.path_task_index().open("a") as f:
+        f.write(f"{ids[0]}{ids[1]} success\n")
+        f.write(f"{ids[0]} suc\n")
+    assert _task_index_read(r) == {
+        ids[0]: TaskStatus.CREATED,
+        ids[1]: TaskStatus.CREATED,
+    }
+
+
+def test_index_checks_non_terminal_status_on_disk(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [tc.task_create_shell(["true"], root=r) for _ in range(2)]
+    # Simulate a status update that the index did not hear about:
+    file_create(r.path_task(ids[0]) / "status-running")
+    assert task_list(root=r, with_status=TaskStatus.RUNNING) == [ids[0]]
+    assert task_list(root=r, with_status=TaskStatus.CREATED) == [ids[1]]
+
+
+def test_can_rebuild_missing_index(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = []
+        for i in range(3):
+            if i > 0:
+                time.sleep(0.01)
+            ids.append(tc.task_create_shell(["true"], root=r))
+    set_task_status(ids[2], TaskStatus.FAILURE, None, r)
+    r.path_task_index().unlink()
+
+    assert _task_index_read(r) is None
+    assert set(task_list(root=r)) == set(ids)
+    # Without an index, we don't start one:
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["true"], root=r)
+    assert _task_index_read(r) is None
+
+    task_index_rebuild(root=r)
+    assert _task_index_read(r) == {
+        ids[0]: TaskStatus.CREATED,
+        ids[1]: TaskStatus.CREATED,
+        ids[2]: TaskStatus.FAILURE,
+        tid: TaskStatus.CREATED,
+    }
+    assert task_list(root=r) == [*ids, tid]
+
+
+def test_can_cancel_submitted_tasks(tmp_path, capsys, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid1 = tc.task_create_shell(["echo", "1"], root=r)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        tid2 = tc.task_create_shell(["echo", "2"], root=r)
+        tid3 = tc.task_create_shell(["echo", "3"], root=r)
+        tid4 = tc.task_create_shell(["echo", "4"], root=r)
+    set_task_status(tid3, TaskStatus.RUNNING, None, r)
+    set_task_status(tid4, TaskStatus.SUCCESS, None, r)
+    capsys.readouterr()
+
+    mock_queue_remove = mocker.spy(task, "_task_queue_remove")
+    res = task_cancel_many([tid1, tid2, tid3, tid4], r)
+    assert res == [False, True, True, False]
+    # Tasks with a driver are never in the worker queue
+    mock_queue_remove.assert_not_called()
+    assert task_status_many([tid1, tid2, tid3, tid4], r) == [
+        TaskStatus.CREATED,
+        TaskStatus.CANCELLED,
+        TaskStatus.CANCELLED,
+        TaskStatus.SUCCESS,
+    ]
+    out = capsys.readouterr().out
+    assert f"cancelling '{tid2}'" in out
+    assert f"cancelling '{tid3}'" in out
+    assert _task_index_read(r)[tid2] == TaskStatus.CANCELLED
+
+    assert not task_cancel(tid2, r)
+
+
+def test_cancel_requires_driver_support(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "1"], root=r)
+    mocker.patch.object(ExampleDriver, "cancel", HipercowDriver.cancel)
+    with pytest.raises(Exception, match="does not support cancelling"):
+        task_cancel(tid, r)
+    assert task_status(tid, r) == TaskStatus.SUBMITTED
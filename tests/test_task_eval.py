@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 
 from hipercow import root
@@ -52,3 +54,44 @@ def test_return_information_about_failure_to_find_path(tmp_path):
     path = r.path_task_log(tid)
     assert path.exists()
     assert task_status(tid, r) == TaskStatus.FAILURE
+
+
+def test_cant_run_claimed_task(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "hello world"], root=r)
+    with r.path_task_claim(tid).open("w") as f:
+        f.write("host other pid 1234\n")
+    msg = f"Can't run '{tid}', which has been claimed by host other pid 1234"
+    with pytest.raises(Exception, match=msg):
+        task_eval(tid, capture=False, root=r)
+    assert task_status(tid, r) == TaskStatus.CREATED
+
+
+def test_only_one_concurrent_evaluator_runs_task(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "hello world"], root=r)
+    n = 8
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def run():
+        barrier.wait()
+        try:
+            task_eval(tid, capture=True, root=r)
+        except Exception as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == n - 1
+    assert task_status(tid, r) == TaskStatus.SUCCESS
+    assert task_log(tid, root=r) == "hello world\n"
+    with r.path_task_claim(tid).open() as f:
+        assert f.read().startswith("host ")
@@ -0,0 +1,62 @@
+import platform
+import subprocess
+import sys
+
+import pytest
+
+from hipercow.usage import (
+    UsageMonitor,
+    _proc_ppid,
+    _rss_descendants,
+    usage_interval,
+)
+from hipercow.util import transient_envvars
+
+# Allocate (and touch) about 100MB, then wait so we can sample it
+ALLOCATE = "import time; x = bytearray(100_000_000); time.sleep(0.5)"
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="needs getrusage")
+def test_can_measure_usage_of_child_processes():
+    with UsageMonitor() as m:
+        subprocess.run([sys.executable, "-c", ALLOCATE], check=True)
+    assert m.usage is not None
+    assert m.usage.cpu_user + m.usage.cpu_system > 0
+    assert m.usage.rss_sampled is None
+    # Only known if this is the largest child we have seen so far
+    if m.usage.max_rss is not None:
+        assert m.usage.max_rss >= 100_000_000
+
+
+@pytest.mark.skipif(platform.system() != "Linux", reason="needs /proc")
+def test_can_sample_memory_of_child_processes():
+    with UsageMonitor(0.05) as m:
+        subprocess.run([sys.executable, "-c", ALLOCATE], check=True)
+    assert m.usage is not None
+    assert m.usage.rss_sampled >= 100_000_000
+
+
+@pytest.mark.skipif(platform.system() != "Linux", reason="needs /proc")
+def test_can_find_memory_of_descendants():
+    assert _rss_descendants(1_000_000_000) == 0
+    cmd = [sys.executable, "-c", "import time; time.sleep(10)"]
+    with subprocess.Popen(cmd) as p:
+        assert _rss_descendants(p.pid) == 0
+        assert _rss_descendants(0) > 0
+        p.kill()
+
+
+def test_can_parse_parent_process_id(tmp_path):
+    (tmp_path / "stat").write_text("123 (my (odd) name) S 45 123 123 0 -1\n")
+    assert _proc_ppid(tmp_path) == 45
+    assert _proc_ppid(tmp_path / "missing") is None
+
+
+def test_can_read_usage_interval():
+    with transient_envvars({"HIPERCOW_USAGE_INTERVAL": None}):
+        assert usage_interval() is None
+    with transient_envvars({"HIPERCOW_USAGE_INTERVAL": "0.5"}):
+        assert usage_interval() == 0.5
+    with transient_envvars({"HIPERCOW_USAGE_INTERVAL": "often"}):
+        with pytest.raises(Exception, match="Expected a number"):
+            usage_interval()
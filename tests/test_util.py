@@ -8,8 +8,11 @@ import pytest
 from hipercow.util import (
     check_python_version,
     expand_grid,
+    file_write_atomic,
     find_file_descend,
     loop_while,
+    percentile,
+    runner_id,
     subprocess_run,
     transient_envvars,
     transient_working_directory,
@@ -138,3 +141,28 @@ def test_expand_grid():
         {"a": 2, "b": 4},
         {"a": 2, "b": 5},
     ]
+
+
+def test_percentile_uses_nearest_rank():
+    x = [1.0, 2.0, 3.0, 4.0]
+    assert percentile(x, 0.5) == 2.0
+    assert percentile(x, 0.95) == 4.0
+    assert percentile(x, 0) == 1.0
+    assert percentile([5.0], 0.5) == 5.0
+
+
+def test_can_write_file_atomically(tmp_path):
+    path = tmp_path / "a.txt"
+    file_write_atomic(path, "hello\n")
+    assert path.read_text() == "hello\n"
+    file_write_atomic(path, "again\n")
+    assert path.read_text() == "again\n"
+    assert os.listdir(tmp_path) == ["a.txt"]
+
+
+def test_runner_id_ignores_date():
+    a = runner_id({"date": "2024-01-01", "python": "3.11", "root": "x"})
+    b = runner_id({"root": "x", "python": "3.11", "date": "2025-06-30"})
+    assert a == b
+    assert len(a) == 16
+    assert runner_id({"python": "3.12", "root": "x"}) != a
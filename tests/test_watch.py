@@ -0,0 +1,118 @@
+import os
+import platform
+import threading
+import time
+
+import pytest
+
+from hipercow import root
+from hipercow import task_create as tc
+from hipercow.task import TaskStatus, set_task_status, task_wait
+from hipercow.util import file_create, transient_working_directory
+from hipercow.watch import (
+    _InotifyWatcher,
+    _mount_fstype,
+    _ScanWatcher,
+    directory_watcher,
+)
+
+
+def _create_later(path, delay=0.1):
+    t = threading.Timer(delay, file_create, [path])
+    t.start()
+    return t
+
+
+def test_can_find_filesystem_type_for_path():
+    mounts = (
+        "/dev/vda / ext4 rw 0 0\n"
+        "//host/share /home/me/net/my\\040share cifs rw 0 0\n"
+        "tmpfs /scratch tmpfs rw 0 0\n"
+    )
+    assert _mount_fstype("/home/me/a", mounts) == "ext4"
+    assert _mount_fstype("/home/me/net/my share", mounts) == "cifs"
+    assert _mount_fstype("/home/me/net/my share/b", mounts) == "cifs"
+    assert _mount_fstype("/home/me/net/my shared", mounts) == "ext4"
+    assert _mount_fstype("/scratch/x", mounts) == "tmpfs"
+    assert _mount_fstype("/scratch", mounts) == "tmpfs"
+    assert _mount_fstype("/x", "") is None
+
+
+def test_do_not_watch_network_filesystems(tmp_path, mocker):
+    mocker.patch("hipercow.watch._filesystem_type", return_value="cifs")
+    assert directory_watcher(tmp_path) is None
+    mocker.patch("hipercow.watch._filesystem_type", return_value=None)
+    assert directory_watcher(tmp_path) is None
+
+
+def test_use_scan_on_local_filesystems_without_inotify(tmp_path, mocker):
+    mocker.patch("hipercow.watch._filesystem_type", return_value="ext4")
+    mocker.patch(
+        "hipercow.watch._InotifyWatcher", side_effect=OSError("no inotify")
+    )
+    with directory_watcher(tmp_path) as w:
+        assert isinstance(w, _ScanWatcher)
+
+
+def test_task_wait_lists_directory_once_per_check_on_network(tmp_path, mocker):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "hello world"], root=r)
+    set_task_status(tid, TaskStatus.SUBMITTED, None, r)
+    mocker.patch("hipercow.watch._filesystem_type", return_value="cifs")
+    mock_scandir = mocker.patch("os.scandir", wraps=os.scandir)
+    mock_listdir = mocker.patch("os.listdir", wraps=os.listdir)
+    t = threading.Timer(
+        0.1, set_task_status, [tid, TaskStatus.SUCCESS, None, r]
+    )
+    t.start()
+    assert task_wait(tid, root=r, poll=0.05, show_log=False, progress=False)
+    t.join()
+    assert mock_scandir.call_count == 0
+    assert mock_listdir.call_count > 1
+
+
+@pytest.mark.skipif(platform.system() != "Linux", reason="needs inotify")
+def test_inotify_watcher_wakes_on_new_file(tmp_path):
+    with directory_watcher(tmp_path, "status-") as w:
+        assert isinstance(w, _InotifyWatcher)
+        assert not w.wait(0)
+        file_create(tmp_path / "other")
+        assert not w.wait(0.05)
+        t = _create_later(tmp_path / "status-success")
+        t0 = time.monotonic()
+        assert w.wait(10)
+        assert time.monotonic() - t0 < 5
+        t.join()
+    with pytest.raises(Exception, match="Watcher has been closed"):
+        w.wait(0)
+
+
+def test_scan_watcher_wakes_on_new_file(tmp_path):
+    file_create(tmp_path / "status-submitted")
+    w = _ScanWatcher(tmp_path, "status-", 0.01)
+    assert not w.wait(0)
+    file_create(tmp_path / "other")
+    assert not w.wait(0.05)
+    t = _create_later(tmp_path / "status-success")
+    t0 = time.monotonic()
+    assert w.wait(10)
+    assert time.monotonic() - t0 < 5
+    t.join()
+
+
+def test_task_wait_wakes_when_status_changes(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = tc.task_create_shell(["echo", "hello world"], root=r)
+    set_task_status(tid, TaskStatus.SUBMITTED, None, r)
+    t = threading.Timer(
+        0.1, set_task_status, [tid, TaskStatus.SUCCESS, None, r]
+    )
+    t.start()
+    t0 = time.monotonic()
+    assert task_wait(tid, root=r, poll=30, show_log=False, progress=False)
+    assert time.monotonic() - t0 < 10
+    t.join()
@@ -0,0 +1,106 @@
+import pytest
+
+from hipercow import root
+from hipercow.bundle import bundle_load
+from hipercow.configure import configure
+from hipercow.example import ExampleDriver  # noqa: F401
+from hipercow.local import LocalDriver  # noqa: F401
+from hipercow.resources import TaskResources
+from hipercow.task import (
+    TaskStatus,
+    task_cancel,
+    task_driver,
+    task_status,
+    task_status_many,
+    task_wait,
+)
+from hipercow.task_create import task_create_shell
+from hipercow.task_create_bulk import bulk_create_shell
+from hipercow.util import transient_working_directory
+from hipercow.worker import _worker_claim, worker_run, worker_start
+
+
+def test_can_queue_tasks_for_workers(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with transient_working_directory(tmp_path):
+        tid = task_create_shell(["echo", "hello"], worker=True, root=r)
+    assert task_status(tid, r) == TaskStatus.SUBMITTED
+    assert task_driver(tid, r) is None
+    assert (r.path_worker_queue() / tid).exists()
+
+    res = TaskResources(cores=1)
+    with transient_working_directory(tmp_path):
+        with pytest.raises(Exception, match="Can't specify resources"):
+            task_create_shell(["true"], worker=True, resources=res, root=r)
+
+
+def test_worker_runs_queued_tasks(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        name = bulk_create_shell(
+            ["echo", "@x"], {"x": ["a", "b", "c"]}, worker=True, root=r
+        )
+    ids = bundle_load(name, r).task_ids
+    assert worker_run("w1", idle=0, root=r) == 3
+    assert task_status_many(ids, r) == [TaskStatus.SUCCESS] * 3
+    assert not list(r.path_worker_queue().iterdir())
+    assert not list(r.path_worker_claimed("w1").iterdir())
+    assert worker_run("w1", idle=0, root=r) == 0
+
+
+def test_only_one_worker_can_claim_a_task(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        tid = task_create_shell(["echo", "hello"], worker=True, root=r)
+    r.path_worker_claimed("w1").mkdir(parents=True)
+    r.path_worker_claimed("w2").mkdir(parents=True)
+    # Both workers have seen the task in the queue, but only the first
+    # to rename it gets it.
+    c1 = [tid]
+    c2 = [tid]
+    assert _worker_claim("w1", c1, r) == tid
+    assert _worker_claim("w2", c2, r) is None
+    assert c1 == []
+    assert c2 == []
+    assert (r.path_worker_claimed("w1") / tid).exists()
+
+
+def test_can_cancel_queued_task(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], worker=True, root=r) for _ in "ab"]
+    assert task_cancel(ids[0], r)
+    assert not task_cancel(ids[0], r)
+    assert worker_run("w1", idle=0, root=r) == 1
+    assert task_status_many(ids, r) == [
+        TaskStatus.CANCELLED,
+        TaskStatus.SUCCESS,
+    ]
+
+
+def test_can_start_workers_with_local_driver(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("local", cores=1, root=r)
+    with transient_working_directory(tmp_path):
+        ids = [task_create_shell(["true"], worker=True, root=r) for _ in "ab"]
+    worker_ids = worker_start(2, root=r)
+    assert len(worker_ids) == 2
+    assert r.path_worker_claimed(worker_ids[0]).is_dir()
+    for i in ids:
+        assert task_wait(i, root=r, timeout=60, progress=False)
+
+
+def test_workers_need_driver_support(tmp_path):
+    root.init(tmp_path)
+    r = root.open_root(tmp_path)
+    configure("example", root=r)
+    with pytest.raises(Exception, match="does not support workers"):
+        worker_start(1, root=r)
+    with pytest.raises(Exception, match="'n' must be at least 1"):
+        worker_start(0, root=r)